@@ -0,0 +1,155 @@
+from collections import deque
+from typing import Dict, Optional, Set, Tuple
+from src.models.robot import Robot, RobotStatus, CHARGED
+from src.models.events import EventType, RobotEvent
+
+class Charger:
+    def __init__(self, vertex_idx: int, capacity: int = 1, charge_rate: float = 1.0):
+        self.vertex_idx = vertex_idx
+        self.capacity = max(1, capacity)
+        self.charge_rate = charge_rate
+        self.charging: Set[Robot] = set()
+        self.queue: deque = deque()
+        self.inbound: Set[Robot] = set()  # Robots routed here that haven't arrived yet
+        # Charging ticks owed to queued and inbound robots, estimated from their battery when they joined
+        self.queued_work = 0.0
+        self._work: Dict[int, float] = {}  # robot_id: its part of queued_work
+
+    def has_free_slot(self) -> bool:
+        return len(self.charging) < self.capacity
+
+    def _work_for(self, robot: Robot) -> float:
+        return max(0.0, CHARGED - robot.battery) / self.charge_rate
+
+    def _add_work(self, robot: Robot):
+        work = self._work[robot.id] = self._work_for(robot)
+        self.queued_work += work
+
+    def _remove_work(self, robot: Robot):
+        self.queued_work -= self._work.pop(robot.id, 0.0)
+
+    def add_inbound(self, robot: Robot):
+        if robot not in self.inbound:
+            self.inbound.add(robot)
+            self._add_work(robot)
+
+    def discard_inbound(self, robot: Robot):
+        if robot in self.inbound:
+            self.inbound.discard(robot)
+            self._remove_work(robot)
+
+    def enqueue(self, robot: Robot):
+        self.queue.append(robot)
+        self._add_work(robot)
+
+    def dequeue(self) -> Robot:
+        robot = self.queue.popleft()
+        self._remove_work(robot)
+        return robot
+
+    def expected_wait(self, exclude: Optional[Robot] = None) -> float:
+        """Ticks until a slot frees up for a robot joining now, assuming slots share the work"""
+        if not self.queue and len(self.charging) + len(self.inbound) < self.capacity:
+            return 0.0
+        # Only the charging robots are summed, there are at most capacity of them
+        work = self.queued_work + sum(self._work_for(r) for r in self.charging if r is not exclude)
+        if exclude is not None:
+            work -= self._work.get(exclude.id, 0.0)
+        return work / self.capacity
+
+class ChargingManager:
+    """Charger slots, per-charger queues and wait-aware charger selection"""
+    def __init__(self, fleet_manager):
+        self.fleet_manager = fleet_manager
+        self.chargers: Dict[int, Charger] = {}
+        self.reservations: Dict[int, Tuple[Robot, Charger]] = {}  # robot_id: (robot, charger it is heading to)
+        self._level = None
+        fleet_manager.event_bus.subscribe(self._on_task_assigned, [EventType.TASK_ASSIGNED])
+
+    def reset(self):
+        nav_graph = self.fleet_manager.nav_graph
+        self.chargers = {idx: Charger(idx, v.charger_capacity, v.charge_rate)
+                         for idx, v in enumerate(nav_graph.vertices) if v.is_charger}
+        self.reservations.clear()
+        self._level = (nav_graph.current_level, len(nav_graph.vertices))
+
+    def _sync_level(self):
+        nav_graph = self.fleet_manager.nav_graph
+        if self._level != (nav_graph.current_level, len(nav_graph.vertices)):
+            self.reset()
+
+    def has_free_slot(self, vertex_idx: int) -> bool:
+        self._sync_level()
+        charger = self.chargers.get(vertex_idx)
+        return charger is not None and charger.has_free_slot()
+
+    def choose_charger(self, robot: Robot) -> Optional[int]:
+        """Charger with the lowest travel plus expected wait time that the robot can reach"""
+        self._sync_level()
+        nav_graph = self.fleet_manager.nav_graph
+        best = None
+        best_time = float('inf')
+        for charger in self.chargers.values():
+            # Lanes are undirected, so the charger's distance list gives the robot's distance to it
+            hops = nav_graph.path_lengths_from(charger.vertex_idx)[robot.current_vertex_idx]
+            if hops == float('inf') or robot.energy_for_hops(hops) > robot.battery:
+                continue
+            travel = hops / robot.speed
+            total = travel + max(0.0, charger.expected_wait(robot) - travel)
+            if total < best_time:
+                best, best_time = charger, total
+        if best is None:
+            # Nothing is affordable: try the nearest one, it still counts towards that charger's load
+            best = self.chargers.get(nav_graph.nearest_charger[robot.current_vertex_idx])
+            if best is None:
+                return None
+        self._release_reservation(robot.id)
+        best.add_inbound(robot)
+        self.reservations[robot.id] = (robot, best)
+        return best.vertex_idx
+
+    def _release_reservation(self, robot_id: int):
+        robot, charger = self.reservations.pop(robot_id, (None, None))
+        if charger is not None:
+            charger.discard_inbound(robot)
+
+    def _on_task_assigned(self, event: RobotEvent):
+        # A robot sent somewhere else no longer counts towards its charger's queue
+        reservation = self.reservations.get(event.robot_id)
+        if reservation is not None and reservation[1].vertex_idx != event.data['vertex']:
+            self._release_reservation(event.robot_id)
+
+    def admit(self, robot: Robot, vertex_idx: int) -> bool:
+        """Take a slot for a robot that reached a charger; False if it had to queue"""
+        self._sync_level()
+        self._release_reservation(robot.id)
+        charger = self.chargers.get(vertex_idx)
+        if charger is None or charger.has_free_slot():
+            if charger is not None:
+                charger.charging.add(robot)
+            return True
+        robot.status = RobotStatus.QUEUED
+        charger.enqueue(robot)
+        robot.emit(EventType.CHARGER_QUEUED, vertex=vertex_idx, position=len(charger.queue))
+        return False
+
+    def charge(self, robot: Robot):
+        """Advance charging for one tick at the robot's charger rate"""
+        charger = self.chargers.get(robot.current_vertex_idx)
+        if charger is None or robot not in charger.charging:
+            robot.update_charging()
+            return
+        robot.update_charging(charger.charge_rate)
+        if robot.status != RobotStatus.CHARGING:
+            charger.charging.discard(robot)
+            self._admit_next(charger)
+
+    def _admit_next(self, charger: Charger):
+        while charger.queue and charger.has_free_slot():
+            robot = charger.dequeue()
+            # Skip robots that are no longer waiting here, e.g. after a level reset
+            if robot.status != RobotStatus.QUEUED or robot.current_vertex_idx != charger.vertex_idx:
+                continue
+            charger.charging.add(robot)
+            robot.status = RobotStatus.CHARGING
+            robot.emit(EventType.CHARGING_STARTED, vertex=charger.vertex_idx)
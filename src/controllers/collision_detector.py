@@ -0,0 +1,93 @@
+from enum import Enum, auto
+from typing import Dict, List, Optional, Tuple
+from src.models.robot import Robot
+from src.utlis.helpers import pairs_within, point_distances
+
+class CollisionKind(Enum):
+    NEAR_MISS = auto()
+    INTERSECTION = auto()
+
+class Collision:
+    def __init__(self, kind: CollisionKind, robot: Robot, other: Robot, yielder: Robot,
+                 distance: float, vertex_idx: int = None):
+        self.kind = kind
+        self.robot = robot
+        self.other = other
+        self.yielder = yielder  # Robot that should stop this tick, None if they are moving apart
+        self.distance = distance
+        self.vertex_idx = vertex_idx
+
+class CollisionDetector:
+    """Finds near-misses and intersection conflicts between moving robots.
+
+    Broad phase: robots are hashed into cells of safety_radius each tick, so
+    only robots in neighbouring cells are compared, all in one NumPy batch.
+    Narrow phase: an exact distance check. Intersection conflicts are found
+    by bucketing robots by the vertex they are driving towards. Both phases
+    are O(N) on average. A robot the traffic manager admitted into a junction
+    is never told to yield to others approaching it.
+    """
+    def __init__(self, safety_radius: float = 0.5, approach_radius: float = 1.0):
+        self.safety_radius = safety_radius
+        self.approach_radius = approach_radius
+
+    def detect(self, robots: List[Robot], nav_graph,
+               junction_holders: Optional[Dict[int, Robot]] = None) -> List[Collision]:
+        collisions = self._near_misses(robots, nav_graph)
+        collisions.extend(self._intersection_conflicts(robots, nav_graph, junction_holders or {}))
+        return collisions
+
+    def _near_misses(self, robots: List[Robot], nav_graph) -> List[Collision]:
+        collisions = []
+        first, second, dists = pairs_within([(robot.x, robot.y) for robot in robots], self.safety_radius)
+        for i, j, distance in zip(first.tolist(), second.tolist(), dists.tolist()):
+            robot, other = robots[i], robots[j]
+            if other.id < robot.id:
+                robot, other = other, robot
+            collisions.append(Collision(CollisionKind.NEAR_MISS, robot, other,
+                                        self._pick_yielder(robot, other, nav_graph), distance))
+        return collisions
+
+    def _intersection_conflicts(self, robots: List[Robot], nav_graph,
+                                junction_holders: Dict[int, Robot]) -> List[Collision]:
+        on_lanes = [robot for robot in robots if robot.current_lane]
+        targets = [nav_graph.vertices[robot.current_lane[1]] for robot in on_lanes]
+        dists = point_distances([(robot.x, robot.y) for robot in on_lanes],
+                                [(target.x, target.y) for target in targets])
+        approaching: Dict[int, List[Tuple[float, Robot]]] = {}
+        for robot, distance in zip(on_lanes, dists.tolist()):
+            if distance <= self.approach_radius:
+                approaching.setdefault(robot.current_lane[1], []).append((distance, robot))
+
+        collisions = []
+        for vertex_idx, entries in approaching.items():
+            if len(entries) < 2:
+                continue
+            # The admitted robot, else the closest one (lowest id on ties), gets the junction
+            holder = junction_holders.get(vertex_idx)
+            entries.sort(key=lambda entry: (entry[1] is not holder, entry[0], entry[1].id))
+            first = entries[0][1]
+            for distance, robot in entries[1:]:
+                collisions.append(Collision(CollisionKind.INTERSECTION, first, robot, robot,
+                                            distance, vertex_idx))
+        return collisions
+
+    def _pick_yielder(self, robot: Robot, other: Robot, nav_graph):
+        """The robot driving into the other one stops; head-on, the higher id stops"""
+        robot_closing = self._heading_towards(robot, other, nav_graph)
+        other_closing = self._heading_towards(other, robot, nav_graph)
+        if robot_closing and other_closing:
+            return other if other.id > robot.id else robot
+        if robot_closing:
+            return robot
+        if other_closing:
+            return other
+        return None
+
+    @staticmethod
+    def _heading_towards(robot: Robot, other: Robot, nav_graph) -> bool:
+        if not robot.current_lane:
+            return False
+        start = nav_graph.vertices[robot.current_lane[0]]
+        end = nav_graph.vertices[robot.current_lane[1]]
+        return (end.x - start.x) * (other.x - robot.x) + (end.y - start.y) * (other.y - robot.y) > 0
@@ -0,0 +1,392 @@
+import argparse
+import asyncio
+import json
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+from src.models.nav_graph import NavGraph
+from src.models.robot import STATE_FIELDS, robot_state
+from src.controllers.fleet_manager import FleetManager
+
+MAX_BODY = 64 * 1024
+STREAM_HIGH_WATER = 64 * 1024  # Bytes buffered for a stream client before its writes are paused
+STREAM_HEARTBEAT = 5.0  # Seconds without a delta before a heartbeat line is written
+STREAM_STALL_TIMEOUT = 30.0  # Seconds a stream client may refuse all data before it is dropped
+
+_REASONS = {200: 'OK', 201: 'Created', 400: 'Bad Request', 404: 'Not Found',
+            405: 'Method Not Allowed', 409: 'Conflict', 413: 'Payload Too Large'}
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+class StreamClient:
+    """One subscriber of the state stream.
+
+    The tick loop never waits for a client. Changes are merged into the
+    client's pending delta, which its own writer task sends when the socket
+    can take it, so a slow client gets fewer, larger deltas and its memory
+    stays bounded by the fleet size.
+    """
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+        self.pending: Dict[int, dict] = {}  # robot_id: fields changed since the last sent delta
+        self.removed: Set[int] = set()  # Robots gone since the last sent delta
+        self.since: Optional[int] = None  # Tick of the last delta sent
+        self.tick = 0
+        self.needs_snapshot = True
+        self.coalesced = 0  # Ticks merged into a later delta because the client was behind
+        self.ready = asyncio.Event()
+        self.ready.set()
+
+    def push(self, tick: int, changes: Dict[int, dict], removed: Set[int]):
+        if self.ready.is_set() and not self.needs_snapshot:
+            self.coalesced += 1
+        for robot_id in removed:
+            self.pending.pop(robot_id, None)
+        self.removed |= removed
+        for robot_id, fields in changes.items():
+            self.removed.discard(robot_id)
+            entry = self.pending.get(robot_id)
+            if entry is None:
+                self.pending[robot_id] = dict(fields)
+            else:
+                entry.update(fields)
+        self.tick = tick
+        self.ready.set()
+
+    def reset(self, tick: int):
+        """Start over with a full snapshot, e.g. after a level change"""
+        self.pending.clear()
+        self.removed.clear()
+        self.needs_snapshot = True
+        self.tick = tick
+        self.ready.set()
+
+class ControlServer:
+    """Local HTTP control API for a fleet manager.
+
+    Commands are JSON requests (see ROUTES) executed between ticks on the
+    event loop, so they never race the simulation. GET /stream answers with
+    line-delimited JSON: one snapshot of every robot, then one delta per
+    tick holding only the robots, and only the fields, that changed, plus
+    the ids of robots that were removed. An idle stream gets a heartbeat
+    line every STREAM_HEARTBEAT seconds so dead clients are noticed.
+    """
+    ROUTES = [
+        ('GET', r'/robots', 'list_robots'),
+        ('POST', r'/robots', 'spawn_robot'),
+        ('GET', r'/robots/(\d+)', 'get_robot'),
+        ('POST', r'/robots/(\d+)/assign', 'assign_robot'),
+        ('POST', r'/robots/(\d+)/cancel', 'cancel_robot'),
+        ('POST', r'/tasks', 'submit_task'),
+        ('POST', r'/tasks/(\d+)/cancel', 'cancel_task'),
+        ('POST', r'/lanes/block', 'block_lane'),
+        ('POST', r'/lanes/unblock', 'unblock_lane'),
+        ('POST', r'/level', 'change_level'),
+        ('GET', r'/stats', 'stats'),
+    ]
+
+    def __init__(self, fleet_manager: FleetManager, host: str = '127.0.0.1', port: int = 8765,
+                 tick_seconds: float = 0.1):
+        self.fleet_manager = fleet_manager
+        self.host = host
+        self.port = port
+        self.tick_seconds = tick_seconds
+        self.tick = 0
+        self.clients: List[StreamClient] = []
+        self._last: Dict[int, tuple] = {}  # robot_id: state sent to clients after the last tick
+        self._routes = [(method, re.compile(pattern + '$'), getattr(self, name))
+                        for method, pattern, name in self.ROUTES]
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._ticker: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]  # Resolves port 0
+        self._ticker = asyncio.create_task(self._tick_loop())
+
+    async def serve_forever(self):
+        await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.stop()
+
+    async def stop(self):
+        if self._ticker is not None:
+            self._ticker.cancel()
+            self._ticker = None
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        for client in self.clients:
+            client.writer.close()
+        self.clients.clear()
+
+    async def _tick_loop(self):
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        while True:
+            self.step()
+            next_tick += self.tick_seconds
+            delay = next_tick - loop.time()
+            if delay < 0:
+                # Running behind; skip the missed ticks instead of bursting to catch up
+                next_tick = loop.time()
+                delay = 0
+            await asyncio.sleep(delay)
+
+    def step(self):
+        """Advance the fleet one tick and queue the changes for every stream client"""
+        self.fleet_manager.update()
+        self.tick += 1
+        changes, removed = self._collect_changes()
+        if changes or removed:
+            for client in self.clients:
+                client.push(self.tick, changes, removed)
+
+    def _collect_changes(self) -> Tuple[Dict[int, dict], Set[int]]:
+        changes = {}
+        states = {}
+        for robot in self.fleet_manager.robots:
+            state = states[robot.id] = robot_state(robot)
+            last = self._last.get(robot.id)
+            if last is None:
+                # New robots are sent in full, including their fixed color
+                fields = dict(zip(STATE_FIELDS, state))
+                fields['color'] = robot.color
+                changes[robot.id] = fields
+            elif last != state:
+                changes[robot.id] = {name: value for name, value, old in zip(STATE_FIELDS, state, last)
+                                     if value != old}
+        removed = self._last.keys() - states.keys()
+        self._last = states
+        return changes, removed
+
+    def snapshot(self) -> dict:
+        return {'type': 'snapshot', 'tick': self.tick, 'level': self.fleet_manager.nav_graph.current_level,
+                'robots': self.fleet_manager.get_all_robots_info()}
+
+    # Stream
+
+    async def _stream(self, writer: asyncio.StreamWriter):
+        writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\n'
+                     b'Cache-Control: no-cache\r\nConnection: close\r\n\r\n')
+        writer.transport.set_write_buffer_limits(high=STREAM_HIGH_WATER)
+        client = StreamClient(writer)
+        self.clients.append(client)
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(client.ready.wait(), STREAM_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    # Nothing changed for a while; writing is the only way to find out the peer is gone
+                    message = {'type': 'heartbeat', 'tick': self.tick}
+                else:
+                    client.ready.clear()
+                    if client.needs_snapshot:
+                        client.needs_snapshot = False
+                        client.pending.clear()
+                        client.removed.clear()
+                        message = self.snapshot()
+                    elif client.pending or client.removed:
+                        message = {'type': 'delta', 'tick': client.tick, 'since': client.since,
+                                   'robots': [dict(fields, id=robot_id) for robot_id, fields in client.pending.items()],
+                                   'removed': sorted(client.removed)}
+                        client.pending = {}
+                        client.removed = set()
+                    else:
+                        continue
+                    client.since = message['tick']
+                writer.write(json.dumps(message, separators=(',', ':')).encode() + b'\n')
+                # Only this client's task waits here; ticks keep merging into pending meanwhile.
+                # A peer that takes nothing for STREAM_STALL_TIMEOUT is treated as dead.
+                await asyncio.wait_for(writer.drain(), STREAM_STALL_TIMEOUT)
+        except (ConnectionError, asyncio.TimeoutError):
+            pass
+        finally:
+            self.clients.remove(client)
+            writer.close()
+
+    # HTTP
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            method, target, body = await self._read_request(reader)
+            path = target.split('?', 1)[0].rstrip('/') or '/'
+            if method == 'GET' and path == '/stream':
+                await self._stream(writer)
+                return
+            status, payload = self._dispatch(method, path, body)
+        except HttpError as error:
+            status, payload = error.status, {'error': str(error)}
+        except (ConnectionError, asyncio.IncompleteReadError):
+            writer.close()
+            return
+        data = json.dumps(payload).encode()
+        writer.write(f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+                     f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+                     f"Connection: close\r\n\r\n".encode() + data)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+        writer.close()
+
+    @staticmethod
+    async def _read_request(reader: asyncio.StreamReader) -> Tuple[str, str, Optional[dict]]:
+        request_line = (await reader.readline()).decode('latin-1').split()
+        if len(request_line) != 3:
+            raise HttpError(400, "Malformed request line")
+        method, target, _ = request_line
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode('latin-1').strip()
+            if not line:
+                break
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get('content-length', 0) or 0)
+        except ValueError:
+            raise HttpError(400, "Content-Length is not a number")
+        if length < 0:
+            raise HttpError(400, "Content-Length is negative")
+        if length > MAX_BODY:
+            raise HttpError(413, "Request body too large")
+        if not length:
+            return method.upper(), target, None
+        try:
+            body = json.loads(await reader.readexactly(length))
+        except ValueError:
+            raise HttpError(400, "Body is not valid JSON")
+        if not isinstance(body, dict):
+            raise HttpError(400, "Body must be a JSON object")
+        return method.upper(), target, body
+
+    def _dispatch(self, method: str, path: str, body: Optional[dict]) -> Tuple[int, dict]:
+        path_found = False
+        for route_method, pattern, handler in self._routes:
+            match = pattern.match(path)
+            if not match:
+                continue
+            path_found = True
+            if route_method == method:
+                return handler(body or {}, *(int(group) for group in match.groups()))
+        if path_found:
+            raise HttpError(405, f"{method} not allowed on {path}")
+        raise HttpError(404, f"No route for {path}")
+
+    @staticmethod
+    def _field(body: dict, name: str, kind=int):
+        value = body.get(name)
+        if kind is list:
+            if not isinstance(value, list) or not value or not all(isinstance(v, int) for v in value):
+                raise HttpError(400, f"'{name}' must be a non-empty list of vertex indices")
+        elif not isinstance(value, kind) or isinstance(value, bool):
+            raise HttpError(400, f"'{name}' must be a {kind.__name__}")
+        return value
+
+    @staticmethod
+    def _result(ok: bool, message: str, **data) -> Tuple[int, dict]:
+        if not ok:
+            raise HttpError(409, message)
+        return 200, dict(data, ok=True)
+
+    def _robot(self, robot_id: int):
+        robot = self.fleet_manager.get_robot(robot_id)
+        if robot is None:
+            raise HttpError(404, f"No robot {robot_id}")
+        return robot
+
+    # Route handlers; each gets the JSON body and the ids captured from the path
+
+    def list_robots(self, body: dict) -> Tuple[int, dict]:
+        return 200, self.snapshot()
+
+    def get_robot(self, body: dict, robot_id: int) -> Tuple[int, dict]:
+        self._robot(robot_id)
+        return 200, self.fleet_manager.get_robot_info(robot_id)
+
+    def spawn_robot(self, body: dict) -> Tuple[int, dict]:
+        robot = self.fleet_manager.spawn_robot(self._field(body, 'vertex'))
+        if robot is None:
+            raise HttpError(409, "Vertex is invalid or occupied")
+        return 201, {'ok': True, 'robot_id': robot.id}
+
+    def assign_robot(self, body: dict, robot_id: int) -> Tuple[int, dict]:
+        self._robot(robot_id)
+        stops = self._field(body, 'stops', list)
+        return self._result(self.fleet_manager.assign_sequence(robot_id, stops),
+                            "Robot can't take this task (busy, occupied or unreachable stop, or low battery)")
+
+    def cancel_robot(self, body: dict, robot_id: int) -> Tuple[int, dict]:
+        self._robot(robot_id)
+        return self._result(self.fleet_manager.cancel_task(robot_id), "Robot has no task that can be cancelled")
+
+    def submit_task(self, body: dict) -> Tuple[int, dict]:
+        stops = self._field(body, 'stops', list)
+        if any(idx < 0 or idx >= len(self.fleet_manager.nav_graph.vertices) for idx in stops):
+            raise HttpError(400, "Stop is not a vertex of the current level")
+        return 201, {'ok': True, 'task_id': self.fleet_manager.dispatcher.submit_sequence(stops)}
+
+    def cancel_task(self, body: dict, task_id: int) -> Tuple[int, dict]:
+        if self.fleet_manager.dispatcher.get_task(task_id) is None:
+            raise HttpError(404, f"No task {task_id}")
+        return self._result(self.fleet_manager.dispatcher.cancel(task_id), "Task is already finished or cancelled")
+
+    def block_lane(self, body: dict) -> Tuple[int, dict]:
+        start_idx, end_idx = self._lane(body)
+        return self._result(self.fleet_manager.block_lane(start_idx, end_idx), "No open lane between these vertices")
+
+    def unblock_lane(self, body: dict) -> Tuple[int, dict]:
+        start_idx, end_idx = self._lane(body)
+        return self._result(self.fleet_manager.unblock_lane(start_idx, end_idx), "Lane is not blocked")
+
+    def _lane(self, body: dict) -> Tuple[int, int]:
+        lane = self._field(body, 'lane', list)
+        if len(lane) != 2:
+            raise HttpError(400, "'lane' must be [start, end]")
+        return lane[0], lane[1]
+
+    def change_level(self, body: dict) -> Tuple[int, dict]:
+        level = self._field(body, 'level', str)
+        nav_graph = self.fleet_manager.nav_graph
+        if level not in nav_graph.levels:
+            raise HttpError(404, f"No level {level}")
+        nav_graph.load_level(level)
+        self.fleet_manager.reset_for_new_level()
+        self._last.clear()
+        for client in self.clients:
+            client.reset(self.tick)
+        return 200, {'ok': True, 'level': level}
+
+    def stats(self, body: dict) -> Tuple[int, dict]:
+        return 200, {'tick': self.tick, 'clients': len(self.clients),
+                     'profiler': self.fleet_manager.get_stats(),
+                     'metrics': self.fleet_manager.metrics.summary()}
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the fleet without the GUI, driven over a local HTTP API")
+    parser.add_argument('--graph', default=str(Path(__file__).resolve().parents[2] / 'data' / 'nav_graph.json'))
+    parser.add_argument('--level', default=None)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--tick', type=float, default=0.1, help="Seconds per fleet tick")
+    args = parser.parse_args()
+
+    nav_graph = NavGraph()
+    nav_graph.load_from_json(args.graph)
+    if args.level:
+        nav_graph.load_level(args.level)
+    server = ControlServer(FleetManager(nav_graph), args.host, args.port, args.tick)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -1,52 +1,134 @@
 import json
 from typing import List, Dict, Optional
-from src.models.robot import Robot, RobotStatus
+from src.models.robot import Robot, RobotStatus, LOW_BATTERY, ENERGY_RESERVE
 from src.models.nav_graph import NavGraph
+from src.models.events import EventBus, EventType, RobotEvent
+from src.models.spatial_index import SpatialGrid
+from src.controllers.task_dispatcher import TaskDispatcher
+from src.controllers.charging_manager import ChargingManager
+from src.controllers.collision_detector import CollisionDetector, CollisionKind
+from src.controllers.traffic_manager import TrafficManager
+from src.controllers.replanner import Replanner
+from src.controllers.metrics import MetricsCollector
+from src.utlis.profiler import TickProfiler
 import time
 import logging
 from enum import Enum
 
+LOG_FORMAT = '%(asctime)s - %(message)s'
+
 class FleetManager:
     def __init__(self, nav_graph: NavGraph):
         self.nav_graph = nav_graph
         self.robots: List[Robot] = []
+        self.robots_by_id: Dict[int, Robot] = {}
+        self.robot_index = SpatialGrid(nav_graph.vertex_index.cell_size)  # Live robot positions keyed by robot id
         self.robot_id_counter = 1
         self.occupied_vertices: Dict[int, List[Robot]] = {}
         self.occupied_lanes: Dict[tuple, Robot] = {}
+        self.traffic_manager = TrafficManager(nav_graph)
+        self.profiler = TickProfiler()  # Phase timings and counters, see get_stats
+        nav_graph.profiler = self.profiler
         
         logging.basicConfig(
             filename='src/logs/fleet_logs.txt',
             level=logging.INFO,
-            format='%(asctime)s - %(message)s'
+            format=LOG_FORMAT
         )
         self.logger = logging.getLogger('FleetManager')
+        self.event_bus = EventBus()
+        self.event_bus.subscribe(self._log_event)
+        self.event_bus.subscribe(self._count_event, [EventType.WAITING, EventType.NEAR_MISS,
+                                                     EventType.INTERSECTION_CONFLICT, EventType.INTERSECTION_QUEUED])
+        self.dispatcher = TaskDispatcher(self)
+        self.charging_manager = ChargingManager(self)
+        self.collision_detector = CollisionDetector()
+        self.replanner = Replanner(self)
+        self.metrics = MetricsCollector(self)
+        self._log_lint()
+    
+    def _log_lint(self):
+        report = self.nav_graph.lint()
+        if len(report['components']) > 1:
+            self.logger.warning("Level %s is split into %d parts of %s vertices", self.nav_graph.current_level,
+                                len(report['components']), report['components'])
+        for problem in ('isolated_vertices', 'duplicate_lanes', 'self_loops', 'vertices_without_charger'):
+            if report[problem]:
+                self.logger.warning("Level %s %s: %s", self.nav_graph.current_level,
+                                    problem.replace('_', ' '), report[problem])
+    
+    def _log_event(self, event: RobotEvent):
+        # Counted, not timed: events fire inside other phases and a timer per event is costly
+        self.profiler.count('log_records')
+        # Passing the event as an argument defers formatting until a handler emits it
+        self.logger.info("%s", event)
+    
+    def _count_event(self, event: RobotEvent):
+        if event.type == EventType.WAITING:
+            self.profiler.count('waits')
+        elif event.type == EventType.INTERSECTION_QUEUED:
+            self.profiler.count('junction_queued')
+        else:
+            self.profiler.count('conflicts')
+    
+    def get_stats(self) -> dict:
+        """Phase timings (ms) and counters collected so far"""
+        return self.profiler.snapshot()
     
     def reset_for_new_level(self):
         """Reset fleet manager state for a new level"""
         self.robots.clear()
+        self.robots_by_id.clear()
+        self.robot_index = SpatialGrid(self.nav_graph.vertex_index.cell_size)
         self.robot_id_counter = 1
         self.occupied_vertices.clear()
         self.occupied_lanes.clear()
+        self.dispatcher.reset()
+        self.charging_manager.reset()
+        self.traffic_manager.reset()
+        self.replanner.reset()
+        self.metrics.reset()
+        self._log_lint()
     
-    def spawn_robot(self, vertex_idx: int) -> bool:
+    def spawn_robot(self, vertex_idx: int) -> Optional[Robot]:
+        """Place a new robot on a free vertex; returns it, or None if the vertex is invalid or taken"""
         if vertex_idx < 0 or vertex_idx >= len(self.nav_graph.vertices):
-            return False
+            return None
             
         if self.is_vertex_occupied(vertex_idx):
-            return False
+            return None
             
         vertex = self.nav_graph.vertices[vertex_idx]
         robot = Robot(self.robot_id_counter, vertex.x, vertex.y)
         robot.current_vertex_idx = vertex_idx
+        robot.bus = self.event_bus
+        robot.charging_manager = self.charging_manager
         self.robots.append(robot)
+        self.robots_by_id[robot.id] = robot
+        self.robot_index.insert(robot.id, robot.x, robot.y)
         self.robot_id_counter += 1
         
         if vertex_idx not in self.occupied_vertices:
             self.occupied_vertices[vertex_idx] = []
         self.occupied_vertices[vertex_idx].append(robot)
         
-        self.logger.info(f"Spawned robot {robot.id} at vertex {vertex_idx} ({vertex.name})")
-        return True
+        robot.emit(EventType.SPAWNED, vertex=vertex_idx, name=vertex.name)
+        return robot
+    
+    def remove_robot(self, robot_id: int) -> Optional[Robot]:
+        """Take an idle robot out of the fleet, e.g. to hand it over to another shard"""
+        robot = self.robots_by_id.get(robot_id)
+        if not robot or robot.status not in (RobotStatus.IDLE, RobotStatus.TASK_COMPLETE):
+            return None
+        self.robots.remove(robot)
+        del self.robots_by_id[robot_id]
+        self.robot_index.remove(robot_id)
+        if robot in self.occupied_vertices.get(robot.current_vertex_idx, ()):
+            self.occupied_vertices[robot.current_vertex_idx].remove(robot)
+        self.dispatcher.reserved.discard(robot_id)
+        robot.bus = None
+        robot.charging_manager = None
+        return robot
     
     def is_vertex_occupied(self, vertex_idx: int) -> bool:
         if vertex_idx not in self.occupied_vertices:
@@ -54,68 +136,241 @@ class FleetManager:
             
         vertex = self.nav_graph.vertices[vertex_idx]
         if vertex.is_charger:
-            return False
+            # Chargers hold as many robots as they have slots, the rest queue
+            return not self.charging_manager.has_free_slot(vertex_idx)
             
         return len(self.occupied_vertices[vertex_idx]) > 0
     
     def assign_task(self, robot_id: int, destination_idx: int) -> bool:
-        robot = next((r for r in self.robots if r.id == robot_id), None)
-        if not robot or robot.current_vertex_idx is None:
+        return self.assign_sequence(robot_id, [destination_idx])
+    
+    def assign_sequence(self, robot_id: int, destinations: List[int], path: Optional[List[int]] = None) -> bool:
+        """Assign an ordered list of stops that the robot drives through without operator input.
+
+        path may carry an already planned route to the first stop, e.g. from NavGraph.find_paths.
+        """
+        robot = self.robots_by_id.get(robot_id)
+        if not robot or robot.current_vertex_idx is None or not destinations:
             return False
             
-        if destination_idx < 0 or destination_idx >= len(self.nav_graph.vertices):
+        if any(idx < 0 or idx >= len(self.nav_graph.vertices) for idx in destinations):
             return False
             
-        dest_vertex = self.nav_graph.vertices[destination_idx]
-        if not dest_vertex.is_charger and self.is_vertex_occupied(destination_idx):
+        # Stops in another connected component are rejected before any search
+        for start_idx, stop_idx in zip([robot.current_vertex_idx] + destinations, destinations):
+            if not self.nav_graph.is_reachable(start_idx, stop_idx):
+                robot.emit(EventType.UNREACHABLE, vertex=stop_idx, start=start_idx)
+                return False
+            
+        # Only the first stop must be free now, later stops are checked on arrival
+        first_idx = destinations[0]
+        dest_vertex = self.nav_graph.vertices[first_idx]
+        if not dest_vertex.is_charger and self.is_vertex_occupied(first_idx):
+            return False
+            
+        if not self.has_energy_for(robot, destinations):
             return False
             
-        success = robot.assign_task(destination_idx, self.nav_graph)
+        success = robot.assign_sequence(destinations, self.nav_graph, path)
         if success:
             robot.status = RobotStatus.MOVING
         return success
     
+    def cancel_task(self, robot_id: int) -> bool:
+        """Stop a robot's current task; robots heading to a charger keep going"""
+        robot = self.robots_by_id.get(robot_id)
+        if not robot:
+            return False
+        return robot.cancel()
+    
+    def task_hops(self, start_idx: int, destinations: List[int]) -> float:
+        """Lanes driven for the task plus the trip to the nearest charger afterwards"""
+        hops = self.nav_graph.route_hops(start_idx, destinations)
+        last_idx = destinations[-1] if destinations else start_idx
+        charger_hops = self.nav_graph.charger_distance[last_idx]
+        # Levels without a reachable charger can only be checked for the task itself
+        if charger_hops != float('inf'):
+            hops += charger_hops
+        return hops
+    
+    def has_energy_for(self, robot: Robot, destinations: List[int]) -> bool:
+        """Check the robot can drive the whole task and still reach a charger afterwards"""
+        if self.nav_graph.vertices[destinations[-1]].is_charger:
+            return True
+        hops = self.task_hops(robot.current_vertex_idx, destinations)
+        if hops == float('inf'):
+            return False
+        if robot.can_afford(hops):
+            return True
+        robot.emit(EventType.INSUFFICIENT_BATTERY, vertex=destinations[-1],
+                   needed=robot.energy_for_hops(hops) + ENERGY_RESERVE, battery=robot.battery)
+        return False
+    
     def update(self):
-        # Initialize occupied_vertices for all vertices in current level
-        self.occupied_vertices = {idx: [] for idx in range(len(self.nav_graph.vertices))}
-        self.occupied_lanes.clear()
+        with self.profiler.phase('tick'):
+            with self.profiler.phase('conflict_check'):
+                self.occupied_lanes.clear()
+                self._check_traffic()
+            with self.profiler.phase('movement'):
+                self._move_robots()
+            with self.profiler.phase('occupancy'):
+                # Rebuild occupied_vertices for all vertices in current level
+                self.occupied_vertices = {idx: [] for idx in range(len(self.nav_graph.vertices))}
+                for robot in self.robots:
+                    if robot.current_vertex_idx is not None:
+                        self.occupied_vertices[robot.current_vertex_idx].append(robot)
+                    self.robot_index.move(robot.id, robot.x, robot.y)
+            with self.profiler.phase('traffic'):
+                self.traffic_manager.update()
+                self.replanner.update()
+            with self.profiler.phase('dispatch'):
+                # Hand queued tasks to robots that became idle
+                self.dispatcher.dispatch()
+            with self.profiler.phase('metrics'):
+                self.metrics.record_tick()
+    
+    def _check_traffic(self):
+        """Decide which moving robots have to wait this tick"""
+        # Robots that waited last tick are re-checked against this tick's traffic
+        was_waiting = set()
+        for robot in self.robots:
+            if robot.status == RobotStatus.WAITING:
+                was_waiting.add(robot.id)
+                robot.status = RobotStatus.MOVING
         
-        # Update robot positions
+        # Handle lane reservations; robots already inside a lane keep it. Only
+        # oncoming traffic is blocked, robots behind each other are spaced by
+        # the collision check and queue at the junction ahead instead
+        moving = [r for r in self.robots if r.status == RobotStatus.MOVING and r.current_lane]
+        for robot in sorted(moving, key=lambda r: -r.progress):
+            lane_key = self.get_lane_key(robot.current_lane)
+            holder = self.occupied_lanes.get(lane_key)
+            # A closed lane stops robots that haven't entered it, the rest drive out
+            closed = lane_key in self.nav_graph.blocked_lanes and not robot.is_committed()
+            if closed or (holder is not None and holder.current_lane != robot.current_lane):
+                robot.status = RobotStatus.WAITING
+                if robot.id not in was_waiting:
+                    robot.emit(EventType.WAITING, lane=lane_key)
+            elif holder is None:
+                self.occupied_lanes[lane_key] = robot
+        
+        # Junction admission: robots about to enter a busy junction queue in front of it
+        for robot in moving:
+            if robot.status != RobotStatus.MOVING:
+                continue
+            junction_idx = self.traffic_manager.junction_to_request(robot)
+            if junction_idx is not None and not self.traffic_manager.request_entry(robot, junction_idx):
+                robot.status = RobotStatus.WAITING
+                if robot.id not in was_waiting:
+                    robot.emit(EventType.INTERSECTION_QUEUED, vertex=junction_idx,
+                               position=self.traffic_manager.queue_position(robot))
+        
+        # Near-misses and crossing traffic that lane keys alone can't see
+        yields = {}
+        for collision in self.collision_detector.detect(moving, self.nav_graph, self.traffic_manager.junction_holders):
+            yielder = collision.yielder
+            if yielder is None or yielder.status == RobotStatus.WAITING or yielder in yields:
+                continue
+            other = collision.other if yielder is collision.robot else collision.robot
+            yields[yielder] = (other, collision)
+        for yielder, stops in self._resolve_yields(yields).items():
+            if not stops:
+                continue
+            yielder.status = RobotStatus.WAITING
+            if yielder.id not in was_waiting:
+                other, collision = yields[yielder]
+                if collision.kind == CollisionKind.INTERSECTION:
+                    yielder.emit(EventType.INTERSECTION_CONFLICT, other_id=other.id, vertex=collision.vertex_idx)
+                else:
+                    yielder.emit(EventType.NEAR_MISS, other_id=other.id, distance=collision.distance)
+    
+    def _move_robots(self):
         for robot in self.robots:
-            if robot.current_vertex_idx >= len(self.nav_graph.vertices):
+            if robot.current_vertex_idx is not None and robot.current_vertex_idx >= len(self.nav_graph.vertices):
+                # Left behind by a level switch; robots change levels through a ShardedFleet
+                robot.emit(EventType.OFF_LEVEL, vertex=robot.current_vertex_idx, level=self.nav_graph.current_level)
                 robot.current_vertex_idx = None
+                robot.current_lane = None
+                robot.destination_vertex_idx = None
+                robot.path = []
+                robot.legs.clear()
                 robot.status = RobotStatus.IDLE
                 continue
                 
             if robot.status == RobotStatus.CHARGING:
-                robot.update_charging()
-            elif robot.status in [RobotStatus.MOVING, RobotStatus.WAITING]:
+                self.charging_manager.charge(robot)
+            elif robot.status == RobotStatus.MOVING:
                 robot.update_position(self.nav_graph)
-            
-            if robot.current_vertex_idx is not None:
-                self.occupied_vertices[robot.current_vertex_idx].append(robot)
-        
-        # Handle lane reservations
-        for robot in self.robots:
-            if robot.status == RobotStatus.MOVING and robot.current_lane:
-                lane_key = self.get_lane_key(robot.current_lane)
-                if lane_key in self.occupied_lanes and self.occupied_lanes[lane_key] != robot:
-                    robot.status = RobotStatus.WAITING
-                    robot.log.append(f"Robot {robot.id} waiting at lane {lane_key}")
-                else:
-                    self.occupied_lanes[lane_key] = robot
-        
-        # Log updates
+            elif (robot.status in [RobotStatus.IDLE, RobotStatus.TASK_COMPLETE]
+                  and robot.battery < LOW_BATTERY and robot.current_vertex_idx is not None
+                  and not robot.charger_unreachable
+                  and self.nav_graph.nearest_charger[robot.current_vertex_idx] is not None):
+                # Idle robots don't wait for a task to discover they are nearly empty
+                robot.seek_charger(self.nav_graph)
+    
+    def block_lane(self, start_idx: int, end_idx: int) -> bool:
+        """Close a lane, e.g. for maintenance; robots routed through it are sent around it"""
+        if not self.nav_graph.block_lane(start_idx, end_idx):
+            return False
+        lane_key = self.get_lane_key((start_idx, end_idx))
+        self.logger.info("Lane %s blocked", lane_key)
+        self.replanner.lane_changed(lane_key, got_worse=True)
+        return True
+    
+    def unblock_lane(self, start_idx: int, end_idx: int) -> bool:
+        if not self.nav_graph.unblock_lane(start_idx, end_idx):
+            return False
+        lane_key = self.get_lane_key((start_idx, end_idx))
+        self.logger.info("Lane %s reopened", lane_key)
+        self.replanner.lane_changed(lane_key, got_worse=False)
         for robot in self.robots:
-            for log_entry in robot.log:
-                self.logger.info(log_entry)
-            robot.log.clear()
+            # A charger may be reachable again
+            robot.charger_unreachable = False
+        return True
+    
+    def _resolve_yields(self, yields: Dict[Robot, tuple]) -> Dict[Robot, bool]:
+        """Decide which yielding robots actually stop this tick.
+
+        A robot only stops for one that is going to move. Stopping for a robot
+        that is itself stopped (or stopping) could deadlock, e.g. two robots
+        swapping places on one lane, so in that case it carries on.
+        """
+        decided: Dict[Robot, bool] = {}
+        for start in yields:
+            chain = []
+            robot = start
+            while robot in yields and robot not in decided and robot not in chain:
+                chain.append(robot)
+                robot = yields[robot][0]
+            if robot in decided:
+                ahead_moves = not decided[robot]
+            elif robot in chain:
+                ahead_moves = True  # Cycle: letting one robot go breaks it
+            else:
+                ahead_moves = robot.status == RobotStatus.MOVING
+            for robot in reversed(chain):
+                decided[robot] = ahead_moves
+                ahead_moves = not ahead_moves
+        return decided
+    
+    def get_robot(self, robot_id: int) -> Optional[Robot]:
+        return self.robots_by_id.get(robot_id)
+    
+    def robots_near(self, x: float, y: float, radius: float) -> List[Robot]:
+        return [self.robots_by_id[robot_id] for robot_id in self.robot_index.query_radius(x, y, radius)]
+    
+    def robots_in_box(self, min_x: float, min_y: float, max_x: float, max_y: float) -> List[Robot]:
+        return [self.robots_by_id[robot_id] for robot_id in self.robot_index.query_box(min_x, min_y, max_x, max_y)]
+    
+    def nearest_robot(self, x: float, y: float, max_distance: float = float('inf')) -> Optional[Robot]:
+        robot_id = self.robot_index.nearest(x, y, max_distance)
+        return self.robots_by_id.get(robot_id) if robot_id is not None else None
     
     def get_lane_key(self, lane: tuple) -> tuple:
         return tuple(sorted(lane))
     
     def get_robot_info(self, robot_id: int) -> dict:
-        robot = next((r for r in self.robots if r.id == robot_id), None)
+        robot = self.robots_by_id.get(robot_id)
         if not robot:
             return {}
             
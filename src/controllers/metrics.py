@@ -0,0 +1,236 @@
+import csv
+import json
+from bisect import bisect_left
+from typing import Dict, List, Optional
+from src.models.robot import RobotStatus
+from src.models.events import EventType, RobotEvent
+
+# Histogram bucket upper bounds, in ticks
+TICK_BUCKETS = [5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+
+class Histogram:
+    """Fixed buckets, so memory stays the same however many samples are added"""
+    def __init__(self, bounds: List[float]):
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)  # Last bucket holds everything above the bounds
+        self.count = 0
+        self.total = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def add(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, p: float) -> Optional[float]:
+        """Upper bound of the bucket holding the p-th percentile"""
+        if not self.count:
+            return None
+        rank = p / 100 * self.count
+        seen = 0
+        for idx, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank and bucket_count:
+                return self.bounds[idx] if idx < len(self.bounds) else self.max
+        return self.max
+
+    def bucket_labels(self) -> List[str]:
+        return [f"<={b}" for b in self.bounds] + [f">{self.bounds[-1]}"]
+
+    def to_dict(self) -> dict:
+        return {
+            'count': self.count,
+            'mean': self.mean(),
+            'min': self.min,
+            'max': self.max,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'buckets': dict(zip(self.bucket_labels(), self.counts)),
+        }
+
+class RobotMetrics:
+    def __init__(self):
+        self.ticks = 0
+        self.status_ticks: Dict[str, int] = {status.name: 0 for status in RobotStatus}
+        self.tasks_completed = 0
+
+    def utilization(self) -> float:
+        """Share of time spent driving to or waiting on the way to a destination"""
+        if not self.ticks:
+            return 0.0
+        return (self.status_ticks['MOVING'] + self.status_ticks['WAITING']) / self.ticks
+
+class MetricsCollector:
+    """Throughput, utilization, wait and lane statistics for one fleet run.
+
+    Time is counted in fleet ticks and converted with tick_seconds (the GUI
+    ticks every 100 ms). Per-robot and per-lane tables are bounded by fleet
+    and graph size, durations go into fixed-bucket histograms.
+    """
+    def __init__(self, fleet_manager, tick_seconds: float = 0.1):
+        self.fleet_manager = fleet_manager
+        self.tick_seconds = tick_seconds
+        self.reset()
+        fleet_manager.event_bus.subscribe(self._on_event, [
+            EventType.LOW_BATTERY, EventType.TASK_ASSIGNED, EventType.ARRIVED,
+            EventType.CHARGING_STARTED, EventType.CHARGER_QUEUED, EventType.TASK_CANCELLED])
+
+    def reset(self):
+        self.ticks = 0
+        self.tasks_completed = 0
+        self.charger_trips = 0
+        self.robots: Dict[int, RobotMetrics] = {}
+        self.lane_ticks: Dict[tuple, int] = {}  # lane_key: robot-ticks spent driving on it
+        self.lane_wait_ticks: Dict[tuple, int] = {}  # lane_key: robot-ticks spent waiting to use it
+        self.task_latency = Histogram(TICK_BUCKETS)  # Assignment to arrival
+        self.wait_durations = Histogram(TICK_BUCKETS)  # Length of each WAITING spell
+        self.charge_durations = Histogram(TICK_BUCKETS)  # Length of each CHARGING spell
+        self._trip_start: Dict[int, int] = {}  # robot_id: tick its current trip was assigned
+        self._seeking = set()  # robot ids that just decided to go charging
+        self._to_charger = set()  # robot ids whose current trip is to a charger
+        self._spell: Dict[int, tuple] = {}  # robot_id: (status, tick it started)
+
+    def _on_event(self, event: RobotEvent):
+        robot_id = event.robot_id
+        if event.type == EventType.LOW_BATTERY:
+            self._seeking.add(robot_id)
+        elif event.type == EventType.TASK_ASSIGNED:
+            self._trip_start[robot_id] = self.ticks
+            # The trip right after a low battery reroute goes to a charger, any other is a task
+            if robot_id in self._seeking:
+                self._seeking.discard(robot_id)
+                self._to_charger.add(robot_id)
+            else:
+                self._to_charger.discard(robot_id)
+        elif event.type == EventType.TASK_CANCELLED:
+            # The robot may still drive to the end of its lane; that is not a completed task
+            self._trip_start.pop(robot_id, None)
+        elif event.type == EventType.ARRIVED:
+            start = self._trip_start.pop(robot_id, None)
+            if robot_id in self._to_charger:
+                self._to_charger.discard(robot_id)
+                self.charger_trips += 1
+            elif start is not None:
+                self.tasks_completed += 1
+                self.task_latency.add(self.ticks - start)
+                self._robot(robot_id).tasks_completed += 1
+        else:
+            # Charging or queueing at a charger ends the trip without an arrival
+            self._trip_start.pop(robot_id, None)
+            self._seeking.discard(robot_id)
+            if robot_id in self._to_charger:
+                self._to_charger.discard(robot_id)
+                self.charger_trips += 1
+
+    def _robot(self, robot_id: int) -> RobotMetrics:
+        metrics = self.robots.get(robot_id)
+        if metrics is None:
+            metrics = self.robots[robot_id] = RobotMetrics()
+        return metrics
+
+    def record_tick(self):
+        """Sample every robot's state once; called at the end of each fleet update"""
+        self.ticks += 1
+        get_lane_key = self.fleet_manager.get_lane_key
+        for robot in self.fleet_manager.robots:
+            metrics = self._robot(robot.id)
+            status = robot.status
+            metrics.ticks += 1
+            metrics.status_ticks[status.name] += 1
+            if robot.current_lane and status in (RobotStatus.MOVING, RobotStatus.WAITING):
+                lane_key = get_lane_key(robot.current_lane)
+                table = self.lane_ticks if status == RobotStatus.MOVING else self.lane_wait_ticks
+                table[lane_key] = table.get(lane_key, 0) + 1
+
+            spell = self._spell.get(robot.id)
+            if spell is None or spell[0] != status:
+                if spell is not None:
+                    self._end_spell(spell[0], self.ticks - spell[1])
+                self._spell[robot.id] = (status, self.ticks)
+
+    def _end_spell(self, status: RobotStatus, duration: int):
+        if status == RobotStatus.WAITING:
+            self.wait_durations.add(duration)
+        elif status == RobotStatus.CHARGING:
+            self.charge_durations.add(duration)
+
+    def elapsed_hours(self) -> float:
+        return self.ticks * self.tick_seconds / 3600
+
+    def tasks_per_hour(self) -> float:
+        hours = self.elapsed_hours()
+        return self.tasks_completed / hours if hours else 0.0
+
+    def lane_heatmap(self, include_waits: bool = False) -> Dict[tuple, float]:
+        """Share of the busiest lane's use for every lane that was used, 0..1"""
+        usage = dict(self.lane_ticks)
+        if include_waits:
+            for lane_key, ticks in self.lane_wait_ticks.items():
+                usage[lane_key] = usage.get(lane_key, 0) + ticks
+        busiest = max(usage.values(), default=0)
+        return {lane_key: ticks / busiest for lane_key, ticks in usage.items()} if busiest else {}
+
+    def summary(self) -> dict:
+        robot_count = len(self.robots)
+        return {
+            'ticks': self.ticks,
+            'elapsed_seconds': self.ticks * self.tick_seconds,
+            'tasks_completed': self.tasks_completed,
+            'charger_trips': self.charger_trips,
+            'tasks_per_hour': self.tasks_per_hour(),
+            'mean_utilization': (sum(m.utilization() for m in self.robots.values()) / robot_count
+                                 if robot_count else 0.0),
+            'waiting_ticks': sum(m.status_ticks['WAITING'] for m in self.robots.values()),
+            'charging_ticks': sum(m.status_ticks['CHARGING'] for m in self.robots.values()),
+        }
+
+    def to_dict(self) -> dict:
+        return {
+            'summary': self.summary(),
+            'robots': {robot_id: {'ticks': m.ticks,
+                                  'utilization': m.utilization(),
+                                  'tasks_completed': m.tasks_completed,
+                                  'status_ticks': dict(m.status_ticks)}
+                       for robot_id, m in self.robots.items()},
+            'lanes': [{'lane': list(lane_key),
+                       'moving_ticks': self.lane_ticks.get(lane_key, 0),
+                       'waiting_ticks': self.lane_wait_ticks.get(lane_key, 0)}
+                      for lane_key in sorted(set(self.lane_ticks) | set(self.lane_wait_ticks))],
+            'histograms': {'task_latency_ticks': self.task_latency.to_dict(),
+                           'wait_duration_ticks': self.wait_durations.to_dict(),
+                           'charge_duration_ticks': self.charge_durations.to_dict()},
+        }
+
+    def export_json(self, path: str):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def export_csv(self, path: str):
+        """One section,name,metric,value row per number, easy to diff or pivot across runs"""
+        data = self.to_dict()
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['section', 'name', 'metric', 'value'])
+            for metric, value in data['summary'].items():
+                writer.writerow(['summary', '', metric, value])
+            for robot_id, robot in data['robots'].items():
+                writer.writerow(['robot', robot_id, 'utilization', robot['utilization']])
+                writer.writerow(['robot', robot_id, 'tasks_completed', robot['tasks_completed']])
+                for status, ticks in robot['status_ticks'].items():
+                    writer.writerow(['robot', robot_id, f"{status.lower()}_ticks", ticks])
+            for lane in data['lanes']:
+                name = f"{lane['lane'][0]}-{lane['lane'][1]}"
+                writer.writerow(['lane', name, 'moving_ticks', lane['moving_ticks']])
+                writer.writerow(['lane', name, 'waiting_ticks', lane['waiting_ticks']])
+            for hist_name, hist in data['histograms'].items():
+                for metric in ('count', 'mean', 'min', 'max', 'p50', 'p90', 'p99'):
+                    writer.writerow(['histogram', hist_name, metric, hist[metric]])
+                for label, count in hist['buckets'].items():
+                    writer.writerow(['histogram', hist_name, label, count])
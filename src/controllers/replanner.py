@@ -0,0 +1,205 @@
+import heapq
+import math
+from typing import Dict, List, Set, Tuple
+from src.models.robot import Robot, RobotStatus
+from src.models.nav_graph import NavGraph
+from src.models.events import EventType
+
+INF = float('inf')
+
+class DStarLite:
+    """Incremental shortest path from a moving start to a fixed goal (D* Lite).
+
+    The search runs backwards from the goal. When a lane's cost changes only
+    the vertices whose distance changed are expanded again, and the start can
+    move along the path between repairs without restarting the search.
+    """
+    def __init__(self, nav_graph: NavGraph, start_idx: int, goal_idx: int):
+        self.nav_graph = nav_graph
+        self.start = start_idx
+        self.goal = goal_idx
+        self.km = 0.0  # Heuristic drift from start moves, keeps old queue keys valid
+        self.g: Dict[int, float] = {}
+        self.rhs: Dict[int, float] = {goal_idx: 0.0}
+        self.open: Dict[int, Tuple[float, float]] = {}  # vertex_idx: its current key in the heap
+        self.heap: List[Tuple[Tuple[float, float], int]] = []
+        # Every lane costs at least 1, so straight-line distance over the longest lane is admissible
+        longest = max((self._distance(lane.start_idx, lane.end_idx) for lane in nav_graph.lanes), default=0.0)
+        self._h_scale = 1.0 / longest if longest > 0 else 0.0
+        self._push(goal_idx)
+
+    def _distance(self, a: int, b: int) -> float:
+        va = self.nav_graph.vertices[a]
+        vb = self.nav_graph.vertices[b]
+        return math.hypot(va.x - vb.x, va.y - vb.y)
+
+    def _heuristic(self, a: int, b: int) -> float:
+        return self._distance(a, b) * self._h_scale
+
+    def _key(self, idx: int) -> Tuple[float, float]:
+        best = min(self.g.get(idx, INF), self.rhs.get(idx, INF))
+        return (best + self._heuristic(self.start, idx) + self.km, best)
+
+    def _push(self, idx: int):
+        key = self._key(idx)
+        self.open[idx] = key
+        heapq.heappush(self.heap, (key, idx))
+
+    def _update_vertex(self, idx: int):
+        if idx != self.goal:
+            self.rhs[idx] = min((self.nav_graph.lane_cost(idx, n) + self.g.get(n, INF)
+                                 for n in self.nav_graph.adjacency[idx]), default=INF)
+        if self.g.get(idx, INF) != self.rhs.get(idx, INF):
+            self._push(idx)
+        else:
+            # Stale heap entries are skipped when popped
+            self.open.pop(idx, None)
+
+    def compute(self):
+        while self.heap:
+            key, idx = self.heap[0]
+            if self.open.get(idx) != key:
+                heapq.heappop(self.heap)
+                continue
+            if key >= self._key(self.start) and self.rhs.get(self.start, INF) == self.g.get(self.start, INF):
+                break
+            heapq.heappop(self.heap)
+            new_key = self._key(idx)
+            if key < new_key:
+                self._push(idx)
+            elif self.g.get(idx, INF) > self.rhs.get(idx, INF):
+                self.g[idx] = self.rhs[idx]
+                del self.open[idx]
+                for neighbor in self.nav_graph.adjacency[idx]:
+                    self._update_vertex(neighbor)
+            else:
+                self.g[idx] = INF
+                del self.open[idx]
+                self._update_vertex(idx)
+                for neighbor in self.nav_graph.adjacency[idx]:
+                    self._update_vertex(neighbor)
+
+    def move_start(self, start_idx: int):
+        if start_idx != self.start:
+            self.km += self._heuristic(self.start, start_idx)
+            self.start = start_idx
+
+    def lane_changed(self, start_idx: int, end_idx: int):
+        """Call after a lane was blocked, reopened or had its cost changed"""
+        self._update_vertex(start_idx)
+        self._update_vertex(end_idx)
+
+    def path(self) -> List[int]:
+        """Current shortest path from start to goal, empty if there is none"""
+        self.compute()
+        if self.g.get(self.start, INF) == INF:
+            return []
+        path = [self.start]
+        current = self.start
+        while current != self.goal:
+            current = min(self.nav_graph.adjacency[current],
+                          key=lambda n: self.nav_graph.lane_cost(current, n) + self.g.get(n, INF))
+            path.append(current)
+            if len(path) > len(self.nav_graph.vertices):
+                return []
+        return path
+
+class Replanner:
+    """Repairs robot routes when lanes are closed, reopened or congested.
+
+    A robot whose route is hit keeps a D* Lite search towards its current
+    stop, so further lane changes only repair that search. Robots whose route
+    doesn't use a lane that got worse are left alone.
+    """
+    def __init__(self, fleet_manager, congestion_ticks: int = 60, congestion_penalty: float = 4.0):
+        self.fleet_manager = fleet_manager
+        self.congestion_ticks = congestion_ticks  # Ticks waiting for oncoming traffic before a lane counts as congested
+        self.congestion_penalty = congestion_penalty  # Extra lanes a detour may add to avoid a congested lane
+        self.planners: Dict[int, DStarLite] = {}  # robot_id: search towards the robot's current stop
+        self.wait_ticks: Dict[int, int] = {}  # robot_id: ticks spent waiting for oncoming traffic
+        self.congested: Set[tuple] = set()
+
+    def reset(self):
+        self.planners.clear()
+        self.wait_ticks.clear()
+        self.congested.clear()
+
+    def lane_changed(self, lane_key: tuple, got_worse: bool):
+        """Repair routes after a lane's cost changed.
+
+        A lane that got worse only matters to robots routed through it. A lane
+        that got better can only shorten routes of robots already detouring.
+        """
+        for planner in self.planners.values():
+            planner.lane_changed(*lane_key)
+        for robot in self.fleet_manager.robots:
+            if robot.status not in (RobotStatus.MOVING, RobotStatus.WAITING) or robot.destination_vertex_idx is None:
+                continue
+            if got_worse:
+                self._drop_planned_legs(robot, lane_key)
+                if self._uses_lane(robot.remaining_route(), lane_key):
+                    self.repair(robot, lane_key)
+            elif robot.id in self.planners:
+                self.repair(robot, lane_key)
+
+    def repair(self, robot: Robot, lane_key: tuple) -> bool:
+        route = robot.remaining_route()
+        if not route:
+            return False
+        planner = self.planners.get(robot.id)
+        if planner is None or planner.goal != robot.destination_vertex_idx:
+            planner = DStarLite(self.fleet_manager.nav_graph, route[0], robot.destination_vertex_idx)
+            self.planners[robot.id] = planner
+        else:
+            planner.move_start(route[0])
+        path = planner.path()
+        self.fleet_manager.profiler.count('routes_repaired')
+        if not path:
+            # Keep the old route; the robot waits at the closed lane until it reopens
+            robot.emit(EventType.NO_ROUTE, vertex=robot.destination_vertex_idx, lane=lane_key)
+            return False
+        if path != route:
+            robot.reroute(path)
+            robot.emit(EventType.REPLANNED, vertex=robot.destination_vertex_idx, lane=lane_key, hops=len(path) - 1)
+        return True
+
+    @staticmethod
+    def _uses_lane(route: List[int], lane_key: tuple) -> bool:
+        return any(NavGraph.lane_key(a, b) == lane_key for a, b in zip(route, route[1:]))
+
+    def _drop_planned_legs(self, robot: Robot, lane_key: tuple):
+        # Later legs planned through the lane are planned again when they come up
+        for leg in robot.legs:
+            if leg[1] is not None and self._uses_lane(leg[1], lane_key):
+                leg[1] = None
+
+    def update(self):
+        """Mark lanes congested after long waits for oncoming traffic, clear them once free"""
+        fleet_manager = self.fleet_manager
+        nav_graph = fleet_manager.nav_graph
+        wait_ticks = {}
+        for robot in fleet_manager.robots:
+            if robot.status != RobotStatus.WAITING or not robot.current_lane or robot.is_committed():
+                continue
+            lane_key = fleet_manager.get_lane_key(robot.current_lane)
+            holder = fleet_manager.occupied_lanes.get(lane_key)
+            if holder is None or holder.current_lane == robot.current_lane:
+                continue
+            wait_ticks[robot.id] = self.wait_ticks.get(robot.id, 0) + 1
+            if wait_ticks[robot.id] >= self.congestion_ticks and lane_key not in self.congested:
+                self.congested.add(lane_key)
+                nav_graph.set_lane_penalty(*lane_key, self.congestion_penalty)
+                self.lane_changed(lane_key, got_worse=True)
+        self.wait_ticks = wait_ticks
+
+        for lane_key in [key for key in self.congested if key not in fleet_manager.occupied_lanes]:
+            self.congested.discard(lane_key)
+            nav_graph.set_lane_penalty(*lane_key, 0)
+            self.lane_changed(lane_key, got_worse=False)
+
+        # Searches for stops a robot is no longer driving to are dropped
+        for robot_id, planner in list(self.planners.items()):
+            robot = fleet_manager.robots_by_id.get(robot_id)
+            if (robot is None or robot.destination_vertex_idx != planner.goal
+                    or robot.status not in (RobotStatus.MOVING, RobotStatus.WAITING)):
+                del self.planners[robot_id]
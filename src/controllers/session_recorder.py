@@ -0,0 +1,306 @@
+import struct
+from typing import BinaryIO, Dict, List, Optional, Tuple
+from src.models.robot import RobotStatus
+
+MAGIC = b'FLEETREC'
+VERSION = 2  # 2 added the removed robot ids to delta frames
+
+# Record kinds, one byte in front of every record
+CMD_LEVEL = 1
+CMD_SPAWN = 2
+CMD_ASSIGN = 3
+CMD_SUBMIT = 4
+CMD_BLOCK = 5
+CMD_UNBLOCK = 6
+CMD_REMOVE = 7
+FRAME_DELTA = 10
+FRAME_KEY = 11
+
+_HEADER = struct.Struct('<HI')  # version, keyframe interval
+_TICK = struct.Struct('<I')
+_COUNT = struct.Struct('<H')
+_INT = struct.Struct('<i')
+_ROBOT = struct.Struct('<IBiddd')  # id, status code, vertex (-1 for none), x, y, battery
+
+STATUS_NAMES = [status.name for status in RobotStatus]
+_STATUS_CODES = {name: code for code, name in enumerate(STATUS_NAMES)}
+
+class RobotFrame:
+    """Recorded state of one robot at one tick"""
+    __slots__ = ('id', 'status', 'vertex', 'x', 'y', 'battery')
+
+    def __init__(self, robot_id: int, status: str, vertex: Optional[int], x: float, y: float, battery: float):
+        self.id = robot_id
+        self.status = status
+        self.vertex = vertex
+        self.x = x
+        self.y = y
+        self.battery = battery
+
+    def key(self) -> tuple:
+        return (self.status, self.vertex, self.x, self.y, self.battery)
+
+def _robot_key(robot) -> tuple:
+    return (robot.status.name, robot.current_vertex_idx, robot.x, robot.y, robot.battery)
+
+class SessionRecorder:
+    """Records a fleet session to a compact binary file.
+
+    Drive the fleet through the recorder, which has the same command methods
+    as the fleet manager, so every external command is written with the tick
+    it was issued at. After each tick only robots whose state changed are
+    written, along with the ids of robots that left the fleet, plus a full
+    keyframe every keyframe_interval ticks for seeking.
+    Recording starts by reloading the current level, so a replay starts from
+    the same empty fleet. Use it as a context manager to close the file even
+    if the session fails.
+    """
+    def __init__(self, fleet_manager, path: str, keyframe_interval: int = 100):
+        if keyframe_interval < 1:
+            raise ValueError("keyframe_interval must be at least 1")
+        self.fleet_manager = fleet_manager
+        self.keyframe_interval = keyframe_interval
+        self.tick = 0
+        self._last: Dict[int, tuple] = {}
+        self._force_keyframe = True
+        self.file: BinaryIO = open(path, 'wb')
+        try:
+            self.file.write(MAGIC + _HEADER.pack(VERSION, keyframe_interval))
+            self.change_level(fleet_manager.nav_graph.current_level)
+        except BaseException:
+            self.file.close()
+            raise
+
+    def _command(self, kind: int, payload: bytes):
+        self.file.write(bytes((kind,)) + _TICK.pack(self.tick) + payload)
+
+    @staticmethod
+    def _pack_ints(values: List[int]) -> bytes:
+        return _COUNT.pack(len(values)) + b''.join(_INT.pack(v) for v in values)
+
+    def change_level(self, level_name: str):
+        name = level_name.encode('utf-8')
+        self._command(CMD_LEVEL, _COUNT.pack(len(name)) + name)
+        self.fleet_manager.nav_graph.load_level(level_name)
+        self.fleet_manager.reset_for_new_level()
+        self._force_keyframe = True
+
+    def spawn_robot(self, vertex_idx: int):
+        self._command(CMD_SPAWN, _INT.pack(vertex_idx))
+        return self.fleet_manager.spawn_robot(vertex_idx)
+
+    def remove_robot(self, robot_id: int):
+        self._command(CMD_REMOVE, _TICK.pack(robot_id))
+        return self.fleet_manager.remove_robot(robot_id)
+
+    def assign_task(self, robot_id: int, destination_idx: int):
+        self._command(CMD_ASSIGN, _TICK.pack(robot_id) + self._pack_ints([destination_idx]))
+        return self.fleet_manager.assign_task(robot_id, destination_idx)
+
+    def assign_sequence(self, robot_id: int, destinations: List[int]):
+        self._command(CMD_ASSIGN, _TICK.pack(robot_id) + self._pack_ints(destinations))
+        return self.fleet_manager.assign_sequence(robot_id, destinations)
+
+    def submit_task(self, stops: List[int]) -> int:
+        self._command(CMD_SUBMIT, self._pack_ints(stops))
+        return self.fleet_manager.dispatcher.submit_sequence(stops)
+
+    def block_lane(self, start_idx: int, end_idx: int) -> bool:
+        self._command(CMD_BLOCK, _INT.pack(start_idx) + _INT.pack(end_idx))
+        return self.fleet_manager.block_lane(start_idx, end_idx)
+
+    def unblock_lane(self, start_idx: int, end_idx: int) -> bool:
+        self._command(CMD_UNBLOCK, _INT.pack(start_idx) + _INT.pack(end_idx))
+        return self.fleet_manager.unblock_lane(start_idx, end_idx)
+
+    def update(self):
+        self.fleet_manager.update()
+        self.tick += 1
+        self._write_frame()
+
+    def _write_frame(self):
+        states = {robot.id: _robot_key(robot) for robot in self.fleet_manager.robots}
+        keyframe = self._force_keyframe or self.tick % self.keyframe_interval == 0
+        if keyframe:
+            changed = states
+        else:
+            changed = {robot_id: state for robot_id, state in states.items() if self._last.get(robot_id) != state}
+            removed = sorted(self._last.keys() - states.keys())
+            if not changed and not removed:
+                return
+        records = [_ROBOT.pack(robot_id, _STATUS_CODES[status], -1 if vertex is None else vertex, x, y, battery)
+                   for robot_id, (status, vertex, x, y, battery) in changed.items()]
+        frame = (bytes((FRAME_KEY if keyframe else FRAME_DELTA,)) + _TICK.pack(self.tick)
+                 + _COUNT.pack(len(records)) + b''.join(records))
+        if not keyframe:
+            # A keyframe lists the whole fleet; a delta has to name the robots that are gone
+            frame += _COUNT.pack(len(removed)) + b''.join(_TICK.pack(robot_id) for robot_id in removed)
+        self.file.write(frame)
+        self._last = states
+        self._force_keyframe = False
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+    def __enter__(self) -> 'SessionRecorder':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+class SessionReplayer:
+    """Reads a recorded session back.
+
+    state_at() rebuilds robot states at any tick from the nearest keyframe, e.g.
+    to draw a session. replay_into() re-drives a fleet manager with the recorded
+    commands and checks the resulting states against the recording.
+    """
+    def __init__(self, path: str):
+        self.commands: Dict[int, List[Tuple[int, tuple]]] = {}  # tick: [(kind, args)]
+        self.frames: List[Tuple[int, bool, List[RobotFrame], List[int]]] = []  # (tick, is_keyframe, robots, removed)
+        self.keyframes: List[int] = []  # Indices into frames
+        self.level: Optional[str] = None
+        self.last_tick = 0
+        with open(path, 'rb') as f:
+            self._parse(f.read())
+
+    def _parse(self, data: bytes):
+        if data[:len(MAGIC)] != MAGIC:
+            raise ValueError("Not a fleet session recording")
+        offset = len(MAGIC)
+        version, self.keyframe_interval = _HEADER.unpack_from(data, offset)
+        if version not in (1, VERSION):
+            raise ValueError(f"Unsupported recording version {version}")
+        offset += _HEADER.size
+
+        def ints():
+            nonlocal offset
+            (count,) = _COUNT.unpack_from(data, offset)
+            offset += _COUNT.size
+            values = list(struct.unpack_from(f'<{count}i', data, offset))
+            offset += 4 * count
+            return values
+
+        while offset < len(data):
+            kind = data[offset]
+            (tick,) = _TICK.unpack_from(data, offset + 1)
+            offset += 1 + _TICK.size
+            self.last_tick = max(self.last_tick, tick)
+            if kind in (FRAME_DELTA, FRAME_KEY):
+                (count,) = _COUNT.unpack_from(data, offset)
+                offset += _COUNT.size
+                robots = []
+                for _ in range(count):
+                    robot_id, status, vertex, x, y, battery = _ROBOT.unpack_from(data, offset)
+                    offset += _ROBOT.size
+                    robots.append(RobotFrame(robot_id, STATUS_NAMES[status], None if vertex < 0 else vertex,
+                                             x, y, battery))
+                removed = []
+                if kind == FRAME_DELTA and version >= 2:
+                    (count,) = _COUNT.unpack_from(data, offset)
+                    offset += _COUNT.size
+                    removed = list(struct.unpack_from(f'<{count}I', data, offset))
+                    offset += _TICK.size * count
+                if kind == FRAME_KEY:
+                    self.keyframes.append(len(self.frames))
+                self.frames.append((tick, kind == FRAME_KEY, robots, removed))
+                continue
+            if kind == CMD_LEVEL:
+                (length,) = _COUNT.unpack_from(data, offset)
+                offset += _COUNT.size
+                args = (data[offset:offset + length].decode('utf-8'),)
+                offset += length
+                if self.level is None:
+                    self.level = args[0]
+            elif kind == CMD_SPAWN:
+                args = _INT.unpack_from(data, offset)
+                offset += _INT.size
+            elif kind == CMD_REMOVE:
+                args = _TICK.unpack_from(data, offset)
+                offset += _TICK.size
+            elif kind == CMD_ASSIGN:
+                (robot_id,) = _TICK.unpack_from(data, offset)
+                offset += _TICK.size
+                args = (robot_id, ints())
+            elif kind == CMD_SUBMIT:
+                args = (ints(),)
+            elif kind in (CMD_BLOCK, CMD_UNBLOCK):
+                args = struct.unpack_from('<ii', data, offset)
+                offset += 8
+            else:
+                raise ValueError(f"Unknown record kind {kind} at byte {offset}")
+            self.commands.setdefault(tick, []).append((kind, args))
+
+    def state_at(self, tick: int) -> Dict[int, RobotFrame]:
+        """Robot states after the given tick, starting from the last keyframe before it"""
+        start = 0
+        for frame_idx in self.keyframes:
+            if self.frames[frame_idx][0] > tick:
+                break
+            start = frame_idx
+        robots: Dict[int, RobotFrame] = {}
+        for frame_tick, is_key, frame_robots, removed in self.frames[start:]:
+            if frame_tick > tick:
+                break
+            if is_key:
+                robots = {}
+            for robot in frame_robots:
+                robots[robot.id] = robot
+            for robot_id in removed:
+                robots.pop(robot_id, None)
+        return robots
+
+    def apply_commands(self, fleet_manager, tick: int):
+        """Issue the commands recorded at this tick against a fleet manager"""
+        for kind, args in self.commands.get(tick, ()):
+            if kind == CMD_LEVEL:
+                fleet_manager.nav_graph.load_level(args[0])
+                fleet_manager.reset_for_new_level()
+            elif kind == CMD_SPAWN:
+                fleet_manager.spawn_robot(*args)
+            elif kind == CMD_REMOVE:
+                fleet_manager.remove_robot(*args)
+            elif kind == CMD_ASSIGN:
+                robot_id, stops = args
+                if len(stops) == 1:
+                    fleet_manager.assign_task(robot_id, stops[0])
+                else:
+                    fleet_manager.assign_sequence(robot_id, stops)
+            elif kind == CMD_SUBMIT:
+                fleet_manager.dispatcher.submit_sequence(args[0])
+            elif kind == CMD_BLOCK:
+                fleet_manager.block_lane(*args)
+            elif kind == CMD_UNBLOCK:
+                fleet_manager.unblock_lane(*args)
+
+    def replay_into(self, fleet_manager, until: Optional[int] = None, verify: bool = True) -> Optional[int]:
+        """Re-run the session on fleet_manager up to tick until (default: the end).
+
+        With verify, returns the first tick whose robot states differ from the
+        recording, or None if the whole replay matched.
+        """
+        until = self.last_tick if until is None else until
+        expected: Dict[int, tuple] = {}
+        frame_idx = 0
+        for tick in range(until):
+            self.apply_commands(fleet_manager, tick)
+            fleet_manager.update()
+            if not verify:
+                continue
+            while frame_idx < len(self.frames) and self.frames[frame_idx][0] <= tick + 1:
+                _, is_key, frame_robots, removed = self.frames[frame_idx]
+                if is_key:
+                    expected = {}
+                for robot in frame_robots:
+                    expected[robot.id] = robot.key()
+                for robot_id in removed:
+                    expected.pop(robot_id, None)
+                frame_idx += 1
+            actual = {robot.id: _robot_key(robot) for robot in fleet_manager.robots}
+            if actual != expected:
+                return tick + 1
+        # Commands issued after the last tick (e.g. a final spawn) are applied too
+        if until == self.last_tick:
+            self.apply_commands(fleet_manager, until)
+        return None
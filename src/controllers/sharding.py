@@ -0,0 +1,407 @@
+import json
+import logging
+import multiprocessing
+from typing import Dict, List, Optional, Tuple, Union
+from src.models.robot import RobotStatus, robot_state
+from src.models.nav_graph import NavGraph
+from src.models.level_router import LevelRouter, Node
+from src.controllers.fleet_manager import FleetManager, LOG_FORMAT
+
+def partition_vertices(vertices: List[list], regions: int) -> List[List[int]]:
+    """Split a level's vertices into equally sized stripes across its longer axis"""
+    if regions <= 1 or len(vertices) <= regions:
+        return [list(range(len(vertices)))]
+    xs = [v[0] for v in vertices]
+    ys = [v[1] for v in vertices]
+    axis = 0 if max(xs) - min(xs) >= max(ys) - min(ys) else 1
+    order = sorted(range(len(vertices)), key=lambda idx: (vertices[idx][axis], idx))
+    size = -(-len(order) // regions)
+    return [sorted(order[start:start + size]) for start in range(0, len(order), size)]
+
+class Shard:
+    """One region of one level, simulated by its own FleetManager in a worker process.
+
+    Vertices are renumbered locally: the region's own vertices come first,
+    followed by the halo, the neighbouring vertices just across the border.
+    Robots drive into the halo and are handed over to the shard owning it.
+    """
+    def __init__(self, name: str, level: str, level_data: dict, owned: List[int]):
+        self.name = name
+        self.level = level
+        owned_set = set(owned)
+        halo = sorted({idx for start, end, _ in level_data['lanes'] for idx in (start, end)
+                       if (start in owned_set) != (end in owned_set) and idx not in owned_set})
+        self.owned = owned_set
+        self.owned_count = len(owned)
+        self.to_global: List[int] = list(owned) + halo
+        self.to_local: Dict[int, int] = {idx: local for local, idx in enumerate(self.to_global)}
+        vertices = []
+        for local, idx in enumerate(self.to_global):
+            x, y, attributes = level_data['vertices'][idx]
+            if local >= self.owned_count:
+                # Robots only pass through the halo, they charge in the shard owning it
+                attributes = dict(attributes, is_charger=False)
+            vertices.append([x, y, attributes])
+        # Lanes with at least one end in the region; lanes between two halo vertices belong elsewhere
+        lanes = [[self.to_local[start], self.to_local[end], attributes]
+                 for start, end, attributes in level_data['lanes']
+                 if (start in owned_set or end in owned_set) and start in self.to_local and end in self.to_local]
+        self.level_data = {'vertices': vertices, 'lanes': lanes}
+        # Each worker logs to its own file; processes appending to one file interleave their lines
+        self.log_path = f"src/logs/fleet_logs_{name.replace('/', '_')}.txt"
+        self.process: Optional[multiprocessing.Process] = None
+        self.conn = None
+
+    def is_halo(self, local_idx: int) -> bool:
+        return local_idx >= self.owned_count
+
+    def has_lane(self, start_idx: int, end_idx: int) -> bool:
+        return (start_idx in self.to_local and end_idx in self.to_local
+                and (start_idx in self.owned or end_idx in self.owned))
+
+class _ShardWorker:
+    """Runs inside the worker process and answers the coordinator's commands"""
+    def __init__(self, name: str, level_data: dict, owned_count: int):
+        nav_graph = NavGraph()
+        nav_graph.levels = {name: level_data}
+        nav_graph.current_level = name
+        nav_graph.load_level(name)
+        self.fleet_manager = FleetManager(nav_graph)
+        self.owned_count = owned_count
+        self.exits: Dict[int, int] = {}  # robot_id: vertex where it leaves the shard
+        self._last: Dict[int, tuple] = {}
+
+    def spawn(self, vertex_idx: int, battery: float, robot_id: int) -> bool:
+        # Ids are handed out by the coordinator so a robot keeps its id (and color) across shards
+        fleet_manager = self.fleet_manager
+        fleet_manager.robot_id_counter = robot_id
+        robot = fleet_manager.spawn_robot(vertex_idx)
+        if robot is None:
+            return False
+        robot.battery = battery
+        return True
+
+    def assign(self, robot_id: int, stops: List[int], path: List[int], exit_idx: Optional[int]) -> bool:
+        """Assign stops; with exit_idx the robot is handed over once it stops there"""
+        if stops and not self.fleet_manager.assign_sequence(robot_id, stops, path):
+            return False
+        if exit_idx is not None:
+            self.exits[robot_id] = exit_idx
+            self.fleet_manager.dispatcher.reserved.add(robot_id)
+        return True
+
+    def cancel(self, robot_id: int) -> bool:
+        self.exits.pop(robot_id, None)
+        self.fleet_manager.dispatcher.reserved.discard(robot_id)
+        return self.fleet_manager.cancel_task(robot_id)
+
+    def submit(self, stops: List[int]) -> int:
+        return self.fleet_manager.dispatcher.submit_sequence(stops)
+
+    def block(self, start_idx: int, end_idx: int) -> bool:
+        return self.fleet_manager.block_lane(start_idx, end_idx)
+
+    def unblock(self, start_idx: int, end_idx: int) -> bool:
+        return self.fleet_manager.unblock_lane(start_idx, end_idx)
+
+    def remove(self, robot_id: int) -> bool:
+        self._last.pop(robot_id, None)
+        self.exits.pop(robot_id, None)
+        return self.fleet_manager.remove_robot(robot_id) is not None
+
+    def step(self, ticks: int) -> dict:
+        """Run some ticks; report changed robots and robots waiting to be handed over"""
+        fleet_manager = self.fleet_manager
+        for _ in range(ticks):
+            fleet_manager.update()
+        handoffs = []
+        interrupted = []
+        for robot_id, exit_idx in list(self.exits.items()):
+            robot = fleet_manager.robots_by_id.get(robot_id)
+            if robot is None or robot.status not in (RobotStatus.IDLE, RobotStatus.TASK_COMPLETE):
+                continue
+            if robot.current_vertex_idx == exit_idx:
+                handoffs.append((robot_id, robot.battery))
+            else:
+                # Stopped short of its exit, e.g. after charging on the way; the rest of its route is dropped
+                del self.exits[robot_id]
+                fleet_manager.dispatcher.reserved.discard(robot_id)
+                interrupted.append(robot_id)
+        changed = {}
+        for robot in fleet_manager.robots:
+            state = robot_state(robot)
+            if self._last.get(robot.id) != state:
+                changed[robot.id] = state
+                self._last[robot.id] = state
+        return {'changed': changed, 'handoffs': handoffs, 'interrupted': interrupted}
+
+    def metrics(self) -> dict:
+        metrics = self.fleet_manager.metrics
+        return dict(metrics.summary(), robots=len(metrics.robots))
+
+def _run_shard(conn, name: str, level_data: dict, owned_count: int, log_path: str):
+    # Replaces any handler inherited from the coordinator, which would write to its log file
+    logging.basicConfig(filename=log_path, level=logging.INFO, format=LOG_FORMAT, force=True)
+    worker = _ShardWorker(name, level_data, owned_count)
+    while True:
+        op, args = conn.recv()
+        if op == 'stop':
+            break
+        conn.send(getattr(worker, op)(*args))
+    conn.close()
+
+class ShardedFleet:
+    """Runs every level, or every region of a large level, in its own process.
+
+    All shards advance in lockstep, one step() at a time, so a step takes as
+    long as the slowest shard instead of the sum of all of them. Routes that
+    leave a shard are split: the robot drives to the border, or to a lift
+    (see LevelRouter) in its own shard, is handed over to the shard on the
+    other side and continues from there. Lift rides take no ticks.
+
+    Traffic rules only hold inside a shard. A lane crossing a region border
+    exists in both neighbouring shards and isn't reserved across them, so
+    borders should run through quiet parts of the map.
+    """
+    def __init__(self, levels: Dict[str, dict], regions: Optional[Dict[str, int]] = None,
+                 tick_seconds: float = 0.1):
+        regions = regions or {}
+        self.tick_seconds = tick_seconds
+        self.shards: List[Shard] = []
+        self.owner: Dict[str, Dict[int, Shard]] = {}  # level: {vertex_idx: shard owning it}
+        # Whole levels, for routes that cross regions or levels
+        self.router = LevelRouter.from_levels(levels)
+        self.nav_graphs: Dict[str, NavGraph] = self.router.graphs
+        for level, level_data in levels.items():
+            self.owner[level] = {}
+            parts = partition_vertices(level_data['vertices'], regions.get(level, 1))
+            for part_idx, owned in enumerate(parts):
+                name = level if len(parts) == 1 else f"{level}/{part_idx}"
+                shard = Shard(name, level, level_data, owned)
+                self.shards.append(shard)
+                for idx in owned:
+                    self.owner[level][idx] = shard
+        self.robot_shard: Dict[int, Shard] = {}
+        self.states: Dict[int, tuple] = {}  # robot_id: last reported state, in level vertex indices
+        self.robot_id_counter = 1
+        self.tick = 0
+        self.handoffs = 0
+        self._targets: Dict[int, Node] = {}  # robot_id: vertex it enters the next shard at
+        self._remaining: Dict[int, List[Node]] = {}  # robot_id: stops still ahead after the next handoff
+        self._exit_trips = set()  # Robots driving to their exit, which their shard will count as a task
+        self._partial_trips = 0  # Drives to an exit that shards counted as finished tasks
+        for shard in self.shards:
+            shard.conn, child_conn = multiprocessing.Pipe()
+            shard.process = multiprocessing.Process(target=_run_shard, daemon=True,
+                                                    args=(child_conn, shard.name, shard.level_data,
+                                                          shard.owned_count, shard.log_path))
+            shard.process.start()
+            child_conn.close()
+
+    @classmethod
+    def from_json(cls, file_path: str, regions: Optional[Dict[str, int]] = None, **kwargs) -> 'ShardedFleet':
+        with open(file_path, 'r') as f:
+            return cls(json.load(f)['levels'], regions, **kwargs)
+
+    def _call(self, shard: Shard, op: str, *args):
+        shard.conn.send((op, args))
+        return shard.conn.recv()
+
+    def _local_stops(self, shard: Shard, stops: List[int]) -> Optional[List[int]]:
+        if any(idx not in shard.to_local for idx in stops):
+            return None
+        return [shard.to_local[idx] for idx in stops]
+
+    def spawn_robot(self, level: str, vertex_idx: int) -> Optional[int]:
+        """Spawn in the shard owning the vertex; returns the new robot's id"""
+        shard = self.owner.get(level, {}).get(vertex_idx)
+        if shard is None:
+            return None
+        robot_id = self.robot_id_counter
+        if not self._call(shard, 'spawn', shard.to_local[vertex_idx], 100, robot_id):
+            return None
+        self.robot_id_counter += 1
+        self.robot_shard[robot_id] = shard
+        x, y, _ = shard.level_data['vertices'][shard.to_local[vertex_idx]]
+        self.states[robot_id] = (x, y, RobotStatus.IDLE.name, 100, vertex_idx, None)
+        return robot_id
+
+    def assign_task(self, robot_id: int, destination: Union[int, Node]) -> bool:
+        return self.assign_sequence(robot_id, [destination])
+
+    def assign_sequence(self, robot_id: int, destinations: List[Union[int, Node]]) -> bool:
+        """Assign stops given as vertex indices on the robot's level or as (level, vertex_idx)"""
+        shard = self.robot_shard.get(robot_id)
+        if shard is None or not destinations:
+            return False
+        start_idx = self.states[robot_id][4]
+        if start_idx is None:
+            return False
+        stops = [stop if isinstance(stop, tuple) else (shard.level, stop) for stop in destinations]
+        # Plan the whole route, then give the robot's shard the part up to where it leaves the shard
+        route: List[Node] = [(shard.level, start_idx)]
+        stop_positions = []
+        for stop in stops:
+            parts = self.router.route(route[-1], stop)
+            if not parts:
+                return False
+            for part_idx, (level, path) in enumerate(parts):
+                # The first vertex of a later part is the far end of a lift ride
+                route.extend((level, idx) for idx in (path[1:] if part_idx == 0 else path))
+            stop_positions.append(len(route) - 1)
+        exit_pos = next((pos for pos, (level, idx) in enumerate(route)
+                         if level != shard.level or idx not in shard.owned), None)
+        if exit_pos is None:
+            exit_idx = None
+            last_pos = len(route) - 1
+        elif route[exit_pos][0] != shard.level:
+            # Leaving by lift: the robot stops at the lift on its own level
+            exit_idx = route[exit_pos - 1][1]
+            last_pos = exit_pos - 1
+        else:
+            # Leaving across a region border: the robot drives onto the first vertex past it
+            exit_idx = route[exit_pos][1]
+            last_pos = exit_pos
+        reached = sum(1 for pos in stop_positions if pos <= last_pos)
+        shard_stops = [idx for _, idx in stops[:reached]]
+        if exit_idx is not None and (not shard_stops or shard_stops[-1] != exit_idx):
+            shard_stops.append(exit_idx)
+        if exit_idx is not None and shard_stops == [start_idx]:
+            shard_stops = []  # Already standing at its exit
+        # The route to the first stop is sent along so the shard doesn't search it again
+        first_leg = [idx for _, idx in route[:min(stop_positions[0], last_pos) + 1]]
+        if not self._call(shard, 'assign', robot_id, self._local_stops(shard, shard_stops),
+                          self._local_stops(shard, first_leg),
+                          None if exit_idx is None else shard.to_local[exit_idx]):
+            return False
+        if exit_idx is not None:
+            remaining = stops[reached:]
+            if remaining and remaining[0] == route[exit_pos]:
+                remaining.pop(0)
+            self._targets[robot_id] = route[exit_pos]
+            self._remaining[robot_id] = remaining
+            if shard_stops:
+                self._exit_trips.add(robot_id)
+            else:
+                self._exit_trips.discard(robot_id)
+        return True
+
+    def cancel_task(self, robot_id: int) -> bool:
+        shard = self.robot_shard.get(robot_id)
+        if shard is None:
+            return False
+        self._targets.pop(robot_id, None)
+        self._remaining.pop(robot_id, None)
+        self._exit_trips.discard(robot_id)
+        return self._call(shard, 'cancel', robot_id)
+
+    def submit_task(self, level: str, stops: List[int]) -> Optional[Tuple[str, int]]:
+        """Queue a task with the dispatcher of the shard owning its first stop.
+
+        Returns (shard name, task id), or None if the stops span several shards.
+        """
+        shard = self.owner.get(level, {}).get(stops[0]) if stops else None
+        if shard is None or any(idx not in shard.owned for idx in stops):
+            return None
+        return shard.name, self._call(shard, 'submit', self._local_stops(shard, stops))
+
+    def block_lane(self, level: str, start_idx: int, end_idx: int) -> bool:
+        if not self.nav_graphs[level].block_lane(start_idx, end_idx):
+            return False
+        for shard in self._lane_shards(level, start_idx, end_idx):
+            self._call(shard, 'block', shard.to_local[start_idx], shard.to_local[end_idx])
+        return True
+
+    def unblock_lane(self, level: str, start_idx: int, end_idx: int) -> bool:
+        if not self.nav_graphs[level].unblock_lane(start_idx, end_idx):
+            return False
+        for shard in self._lane_shards(level, start_idx, end_idx):
+            self._call(shard, 'unblock', shard.to_local[start_idx], shard.to_local[end_idx])
+        return True
+
+    def _lane_shards(self, level: str, start_idx: int, end_idx: int) -> List[Shard]:
+        return [shard for shard in self.shards if shard.level == level and shard.has_lane(start_idx, end_idx)]
+
+    def step(self, ticks: int = 1):
+        """Advance every shard by some ticks in parallel, then hand over robots at borders"""
+        for shard in self.shards:
+            shard.conn.send(('step', (ticks,)))
+        replies = [(shard, shard.conn.recv()) for shard in self.shards]
+        self.tick += ticks
+        for shard, reply in replies:
+            for robot_id, (x, y, status, battery, vertex, destination) in reply['changed'].items():
+                if self.robot_shard.get(robot_id) is shard:
+                    self.states[robot_id] = (x, y, status, battery,
+                                             None if vertex is None else shard.to_global[vertex],
+                                             None if destination is None else shard.to_global[destination])
+            for robot_id in reply['interrupted']:
+                self._targets.pop(robot_id, None)
+                self._remaining.pop(robot_id, None)
+                self._exit_trips.discard(robot_id)
+        for shard, reply in replies:
+            for robot_id, battery in reply['handoffs']:
+                self._hand_over(shard, robot_id, battery)
+
+    def _hand_over(self, shard: Shard, robot_id: int, battery: float):
+        level, vertex_idx = self._targets[robot_id]
+        target = self.owner[level][vertex_idx]
+        # An occupied vertex on the other side is retried after the next step
+        if not self._call(target, 'spawn', target.to_local[vertex_idx], battery, robot_id):
+            return
+        self._call(shard, 'remove', robot_id)
+        self.robot_shard[robot_id] = target
+        self.handoffs += 1
+        del self._targets[robot_id]
+        x, y, _ = target.level_data['vertices'][target.to_local[vertex_idx]]
+        self.states[robot_id] = (x, y, RobotStatus.IDLE.name, battery, vertex_idx, None)
+        remaining = self._remaining.pop(robot_id, [])
+        exit_trip = robot_id in self._exit_trips
+        self._exit_trips.discard(robot_id)
+        if remaining:
+            if exit_trip:
+                self._partial_trips += 1
+            self.assign_sequence(robot_id, remaining)
+
+    def get_all_robots_info(self) -> List[dict]:
+        """Merged robot states of all shards, in the format of FleetManager.get_robot_info"""
+        info = []
+        for robot_id, (x, y, status, battery, vertex, destination) in self.states.items():
+            shard = self.robot_shard[robot_id]
+            info.append({'id': robot_id, 'x': x, 'y': y, 'status': status, 'battery': battery,
+                         'destination': destination, 'current_vertex': vertex,
+                         'level': shard.level, 'shard': shard.name})
+        return info
+
+    def snapshot(self) -> Dict[str, List[dict]]:
+        """Robot states grouped by level, e.g. for drawing one level"""
+        levels = {level: [] for level in self.nav_graphs}
+        for info in self.get_all_robots_info():
+            levels[info['level']].append(info)
+        return levels
+
+    def metrics_summary(self) -> dict:
+        """MetricsCollector summaries of all shards combined into one"""
+        summaries = [self._call(shard, 'metrics') for shard in self.shards]
+        robots = sum(s['robots'] for s in summaries)
+        tasks = sum(s['tasks_completed'] for s in summaries) - self._partial_trips
+        hours = self.tick * self.tick_seconds / 3600
+        return {
+            'ticks': self.tick,
+            'elapsed_seconds': self.tick * self.tick_seconds,
+            'tasks_completed': tasks,
+            'charger_trips': sum(s['charger_trips'] for s in summaries),
+            'tasks_per_hour': tasks / hours if hours else 0.0,
+            'mean_utilization': (sum(s['mean_utilization'] * s['robots'] for s in summaries) / robots
+                                 if robots else 0.0),
+            'waiting_ticks': sum(s['waiting_ticks'] for s in summaries),
+            'charging_ticks': sum(s['charging_ticks'] for s in summaries),
+            'handoffs': self.handoffs,
+            'shards': len(self.shards),
+        }
+
+    def close(self):
+        for shard in self.shards:
+            if shard.process is not None and shard.process.is_alive():
+                shard.conn.send(('stop', ()))
+                shard.process.join(timeout=5)
+            shard.process = None
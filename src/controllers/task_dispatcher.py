@@ -0,0 +1,294 @@
+from enum import Enum, auto
+from typing import Dict, List, Optional, Set, Tuple
+from src.models.robot import Robot, RobotStatus
+from src.models.events import EventType, RobotEvent
+
+UNREACHABLE = float('inf')
+
+class TaskStatus(Enum):
+    PENDING = auto()
+    ASSIGNED = auto()
+    COMPLETED = auto()
+    CANCELLED = auto()
+
+class Task:
+    def __init__(self, task_id: int, stops: List[int]):
+        self.id = task_id
+        self.stops = stops
+        self.destination_idx = stops[0]  # First stop, used for matching
+        self.tail_hops: Optional[float] = None  # Lanes from the first stop to the end plus a charger
+        self.status = TaskStatus.PENDING
+        self.robot_id: Optional[int] = None
+
+def solve_assignment(cost: List[List[float]]) -> List[int]:
+    """Hungarian algorithm for a rows x cols matrix with rows <= cols.
+
+    Returns, for every row, the column assigned to it so that the total
+    cost is minimal.
+    """
+    n = len(cost)
+    m = len(cost[0]) if n else 0
+    if n == 0:
+        return []
+    if n > m:
+        raise ValueError("Assignment matrix must have at least as many columns as rows")
+
+    # Potentials and matching use 1-based indexing, column 0 is a sentinel
+    u = [0.0] * (n + 1)
+    v = [0.0] * (m + 1)
+    match = [0] * (m + 1)  # match[col] = row
+    way = [0] * (m + 1)
+    for row in range(1, n + 1):
+        match[0] = row
+        col0 = 0
+        min_v = [float('inf')] * (m + 1)
+        used = [False] * (m + 1)
+        while True:
+            used[col0] = True
+            row0 = match[col0]
+            delta = float('inf')
+            col1 = 0
+            for col in range(1, m + 1):
+                if not used[col]:
+                    reduced = cost[row0 - 1][col - 1] - u[row0] - v[col]
+                    if reduced < min_v[col]:
+                        min_v[col] = reduced
+                        way[col] = col0
+                    if min_v[col] < delta:
+                        delta = min_v[col]
+                        col1 = col
+            for col in range(m + 1):
+                if used[col]:
+                    u[match[col]] += delta
+                    v[col] -= delta
+                else:
+                    min_v[col] -= delta
+            col0 = col1
+            if match[col0] == 0:
+                break
+        # Flip the augmenting path
+        while col0:
+            col1 = way[col0]
+            match[col0] = match[col1]
+            col0 = col1
+
+    result = [-1] * n
+    for col in range(1, m + 1):
+        if match[col]:
+            result[match[col] - 1] = col - 1
+    return result
+
+class TaskDispatcher:
+    """Queue of pending tasks assigned to idle robots in bulk.
+
+    Each tick the pending tasks are matched to the idle robots so that the
+    total route length is minimal. The matching is only recomputed when the
+    idle robots, the pending tasks or the occupancy of their stops changed
+    since the last tick, and route costs are cached per robot and task so a
+    re-solve only computes the entries of robots that moved and new tasks. A
+    robot is never matched to a task it could not finish and still reach a
+    charger.
+    """
+    def __init__(self, fleet_manager):
+        self.fleet_manager = fleet_manager
+        self.tasks: Dict[int, Task] = {}
+        self.pending: List[Task] = []
+        self.active: Dict[int, Task] = {}  # robot_id: task
+        self.reserved: Set[int] = set()  # Robots the dispatcher must leave alone, e.g. while being handed off
+        self.task_id_counter = 1
+        self._last_idle: Optional[tuple] = None
+        self._dirty = False
+        # robot_id: ((vertex, battery) the row was computed for, {task_id: route cost})
+        self._cost_rows: Dict[int, Tuple[tuple, Dict[int, float]]] = {}
+        self._cost_version = -1  # NavGraph.topology_version the cached costs are for
+        fleet_manager.event_bus.subscribe(self._on_arrived, [EventType.ARRIVED])
+        fleet_manager.event_bus.subscribe(self._on_cancelled, [EventType.TASK_CANCELLED])
+        fleet_manager.event_bus.subscribe(self._on_diverted, [EventType.LOW_BATTERY, EventType.CHARGING_STARTED,
+                                                              EventType.CHARGER_QUEUED])
+
+    def reset(self):
+        """Forget all tasks and cached routes (e.g. after a level change)"""
+        self.tasks.clear()
+        self.pending.clear()
+        self.active.clear()
+        self.reserved.clear()
+        self._last_idle = None
+        self._dirty = False
+        self._cost_rows.clear()
+
+    def submit(self, destination_idx: int) -> int:
+        return self.submit_sequence([destination_idx])
+
+    def submit_sequence(self, stops: List[int]) -> int:
+        """Queue a multi-stop task (e.g. pick -> drop -> park)"""
+        task = Task(self.task_id_counter, list(stops))
+        self.task_id_counter += 1
+        self.tasks[task.id] = task
+        self.pending.append(task)
+        self._dirty = True
+        return task.id
+
+    def submit_batch(self, destinations: List[int]) -> List[int]:
+        return [self.submit(destination_idx) for destination_idx in destinations]
+
+    def get_task(self, task_id: int) -> Optional[Task]:
+        return self.tasks.get(task_id)
+
+    def cancel(self, task_id: int) -> bool:
+        """Withdraw a queued task, or stop the robot carrying it out"""
+        task = self.tasks.get(task_id)
+        if task is None:
+            return False
+        if task.status == TaskStatus.PENDING:
+            task.status = TaskStatus.CANCELLED
+            self.pending.remove(task)
+            for _, row in self._cost_rows.values():
+                row.pop(task_id, None)
+            self._dirty = True
+            return True
+        if task.status == TaskStatus.ASSIGNED:
+            return self.fleet_manager.cancel_task(task.robot_id)
+        return False
+
+    def _on_arrived(self, event: RobotEvent):
+        task = self.active.pop(event.robot_id, None)
+        if task is not None:
+            task.status = TaskStatus.COMPLETED
+
+    def _on_cancelled(self, event: RobotEvent):
+        task = self.active.pop(event.robot_id, None)
+        if task is not None:
+            task.status = TaskStatus.CANCELLED
+            self._dirty = True
+
+    def _on_diverted(self, event: RobotEvent):
+        # A robot heading to or stopping at a charger drops its task; put it back in the queue
+        task = self.active.pop(event.robot_id, None)
+        if task is not None:
+            task.status = TaskStatus.PENDING
+            task.robot_id = None
+            self.pending.append(task)
+            self._dirty = True
+
+    def _is_idle(self, robot: Robot) -> bool:
+        return (robot.status in (RobotStatus.IDLE, RobotStatus.TASK_COMPLETE)
+                and robot.current_vertex_idx is not None
+                and robot.id not in self.active
+                and robot.id not in self.reserved)
+
+    def _stop_blocked(self, robot: Robot, task: Task) -> bool:
+        # A stop held by another robot would be rejected; leave it for a later tick
+        return (robot.current_vertex_idx != task.destination_idx
+                and not self.fleet_manager.nav_graph.vertices[task.destination_idx].is_charger
+                and self.fleet_manager.is_vertex_occupied(task.destination_idx))
+
+    def _cost(self, robot: Robot, task: Task) -> float:
+        """_route_cost through the cache, plus the occupancy check that changes every tick"""
+        key = (robot.current_vertex_idx, robot.battery)
+        cached = self._cost_rows.get(robot.id)
+        if cached is None or cached[0] != key:
+            cached = self._cost_rows[robot.id] = (key, {})
+        row = cached[1]
+        cost = row.get(task.id)
+        if cost is None:
+            cost = row[task.id] = self._route_cost(robot, task)
+        if cost != UNREACHABLE and self._stop_blocked(robot, task):
+            return UNREACHABLE
+        return cost
+
+    def _route_cost(self, robot: Robot, task: Task) -> float:
+        """Lanes to the first stop, or UNREACHABLE if the robot can't afford the whole task"""
+        nav_graph = self.fleet_manager.nav_graph
+        if not nav_graph.is_reachable(robot.current_vertex_idx, task.destination_idx):
+            return UNREACHABLE
+        to_first = nav_graph.path_lengths_from(robot.current_vertex_idx)[task.destination_idx]
+        if to_first == UNREACHABLE:
+            return UNREACHABLE
+        if task.tail_hops is None:
+            task.tail_hops = self.fleet_manager.task_hops(task.stops[0], task.stops[1:])
+        last_idx = task.stops[-1]
+        if (not nav_graph.vertices[last_idx].is_charger
+                and not robot.can_afford(to_first + task.tail_hops)):
+            return UNREACHABLE
+        return to_first
+
+    def dispatch(self) -> int:
+        """Assign pending tasks to idle robots; returns the number assigned"""
+        nav_graph = self.fleet_manager.nav_graph
+        if self._cost_version != nav_graph.topology_version:
+            # Lanes closed or reopened: every cached route is stale
+            self._cost_version = nav_graph.topology_version
+            self._cost_rows.clear()
+            for task in self.pending:
+                task.tail_hops = None
+            self._dirty = True
+        idle = [r for r in self.fleet_manager.robots if self._is_idle(r)]
+        # Occupied stops make pairs UNREACHABLE for now, so they are part of what the matching depends on
+        blocked = frozenset(task.id for task in self.pending
+                            if not nav_graph.vertices[task.destination_idx].is_charger
+                            and self.fleet_manager.is_vertex_occupied(task.destination_idx))
+        idle_key = (frozenset((r.id, r.current_vertex_idx) for r in idle), blocked)
+        if not self._dirty and idle_key == self._last_idle:
+            return 0
+        self._last_idle = idle_key
+        self._dirty = False
+        if not idle or not self.pending:
+            return 0
+
+        # The Hungarian solver needs rows <= cols, so put the smaller side in rows
+        robots_are_rows = len(idle) <= len(self.pending)
+        rows, cols = (idle, self.pending) if robots_are_rows else (self.pending, idle)
+        if robots_are_rows:
+            cost = [[self._cost(robot, task) for task in cols] for robot in rows]
+        else:
+            cost = [[self._cost(robot, task) for robot in cols] for task in rows]
+        # Unreachable pairs cost more than any set of real routes together, so the
+        # solver never trades a feasible pair for an unreachable one
+        longest = max((c for row in cost for c in row if c != UNREACHABLE), default=0)
+        big = len(rows) * longest + 1
+        finite_cost = [[c if c != UNREACHABLE else big for c in row] for row in cost]
+
+        matches = []
+        for row_idx, col_idx in enumerate(solve_assignment(finite_cost)):
+            if col_idx < 0 or cost[row_idx][col_idx] == UNREACHABLE:
+                continue
+            robot, task = (rows[row_idx], cols[col_idx]) if robots_are_rows else (cols[col_idx], rows[row_idx])
+            matches.append((robot, task, self._remaining_stops(robot, task)))
+        # First legs of the whole batch are planned together, see NavGraph.find_paths
+        first_legs = [(robot.current_vertex_idx, stops[0]) for robot, _, stops in matches if stops]
+        paths = iter(self.fleet_manager.nav_graph.find_paths(first_legs))
+
+        assigned = 0
+        for robot, task, stops in matches:
+            if self._start_task(robot, task, stops, next(paths) if stops else None):
+                assigned += 1
+                self._cost_rows.pop(robot.id, None)
+        # A solve that started nothing is not repeated until robots, tasks or stops change
+        if assigned:
+            self.pending = [task for task in self.pending if task.status == TaskStatus.PENDING]
+            for _, row in self._cost_rows.values():
+                for task in list(row):
+                    if self.tasks[task].status != TaskStatus.PENDING:
+                        del row[task]
+            # Robots that finished a task in place are still idle and can take another one
+            self._dirty = True
+        return assigned
+
+    @staticmethod
+    def _remaining_stops(robot: Robot, task: Task) -> List[int]:
+        # A robot already standing at the first stop skips it
+        if robot.current_vertex_idx == task.stops[0]:
+            return task.stops[1:]
+        return task.stops
+
+    def _start_task(self, robot: Robot, task: Task, stops: List[int], path: Optional[List[int]] = None) -> bool:
+        if not stops:
+            task.robot_id = robot.id
+            task.status = TaskStatus.COMPLETED
+            return True
+        if not self.fleet_manager.assign_sequence(robot.id, stops, path):
+            return False
+        task.robot_id = robot.id
+        task.status = TaskStatus.ASSIGNED
+        self.active[robot.id] = task
+        return True
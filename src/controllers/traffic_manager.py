@@ -1,61 +1,120 @@
-from typing import Dict, List, Optional
-from src.models.robot import Robot
+from collections import deque
+from typing import Dict, List, Optional, Set
+from src.models.robot import Robot, RobotStatus
 from src.models.nav_graph import NavGraph
 
 class TrafficManager:
-    def __init__(self, nav_graph: NavGraph):
+    """Admission control for junction vertices.
+
+    A junction is a vertex with three or more neighbours. A robot has to be
+    admitted before it drives into one; only one robot holds a junction at a
+    time and the others wait in a FIFO queue just before it. The holder keeps
+    the junction until it has driven out, even while it waits; the only
+    exception is a holder waiting for the lane another robot is coming down,
+    which lets that robot in to pass it. Releasing a junction is O(1): robots
+    that left a queue are dropped lazily when they reach its head.
+    """
+    def __init__(self, nav_graph: NavGraph, approach_progress: float = 0.7, exit_progress: float = 0.3):
         self.nav_graph = nav_graph
-        self.reservations: Dict[tuple, Robot] = {}  # (vertex_idx, time): robot
-        self.intersection_queues: Dict[int, List[Robot]] = {}  # vertex_idx: [robots]
-    
-    def request_path(self, robot: Robot, path: List[int]) -> bool:
-        """Check if path can be reserved without conflicts"""
-        if not path:
+        self.approach_progress = approach_progress  # Lane progress at which a robot asks to enter
+        self.exit_progress = exit_progress  # Progress on the outgoing lane at which it has left
+        self.junctions: Set[int] = set()
+        self.junction_holders: Dict[int, Robot] = {}  # vertex_idx: robot inside the junction
+        self.intersection_queues: Dict[int, deque] = {}  # vertex_idx: robots waiting to enter
+        self._queued_at: Dict[int, int] = {}  # robot_id: junction it is currently queued at
+        self.reset()
+
+    def reset(self):
+        self.junctions = {idx for idx, neighbours in enumerate(self.nav_graph.adjacency)
+                          if len(neighbours) >= 3}
+        self.junction_holders.clear()
+        self.intersection_queues.clear()
+        self._queued_at.clear()
+
+    def is_junction(self, vertex_idx: int) -> bool:
+        return vertex_idx in self.junctions
+
+    def junction_to_request(self, robot: Robot) -> Optional[int]:
+        """Junction the robot must be admitted to before moving this tick, if any"""
+        if robot.status != RobotStatus.MOVING or not robot.current_lane:
+            return None
+        start_idx, end_idx = robot.current_lane
+        if end_idx in self.junctions and robot.progress + robot.speed >= self.approach_progress:
+            return end_idx
+        # Robots that start inside a junction (spawned or assigned there) need it too
+        if start_idx in self.junctions and robot.progress < self.exit_progress:
+            return start_idx
+        return None
+
+    def request_entry(self, robot: Robot, vertex_idx: int) -> bool:
+        """Admit the robot into the junction, or queue it; returns True when admitted"""
+        holder = self.junction_holders.get(vertex_idx)
+        if holder is robot:
+            return True
+        queue = self.intersection_queues.setdefault(vertex_idx, deque())
+        self._drop_stale_heads(vertex_idx)
+        # The robot a stuck holder waits for goes ahead of the queue, nobody else can unblock it
+        swap = holder is not None and self._swaps_with(holder, robot)
+        if swap or (holder is None and (not queue or queue[0] is robot)):
+            if queue and queue[0] is robot:
+                queue.popleft()
+            self._queued_at.pop(robot.id, None)  # Any other entry of it in the queue is dropped lazily
+            self.junction_holders[vertex_idx] = robot
+            return True
+        if self._queued_at.get(robot.id) != vertex_idx:
+            self._queued_at[robot.id] = vertex_idx
+            queue.append(robot)
+        return False
+
+    @staticmethod
+    def _swaps_with(holder: Robot, robot: Robot) -> bool:
+        """The holder is stuck in the junction waiting for the lane the robot is coming down.
+
+        Neither can move until the other does, so the robot is let in to pass the
+        holder inside the junction. Any other holder keeps the junction until it
+        has driven out, even while it waits.
+        """
+        return (holder.status == RobotStatus.WAITING and bool(holder.current_lane) and bool(robot.current_lane)
+                and holder.current_lane == robot.current_lane[::-1])
+
+    def queue_position(self, robot: Robot) -> Optional[int]:
+        vertex_idx = self._queued_at.get(robot.id)
+        if vertex_idx is None:
+            return None
+        return self.intersection_queues[vertex_idx].index(robot) + 1
+
+    def release(self, robot: Robot, vertex_idx: int):
+        if self.junction_holders.get(vertex_idx) is robot:
+            del self.junction_holders[vertex_idx]
+
+    def _is_approaching(self, robot: Robot, vertex_idx: int) -> bool:
+        return (robot.status in (RobotStatus.MOVING, RobotStatus.WAITING)
+                and bool(robot.current_lane) and vertex_idx in robot.current_lane)
+
+    def _drop_stale_heads(self, vertex_idx: int):
+        queue = self.intersection_queues[vertex_idx]
+        while queue and (self._queued_at.get(queue[0].id) != vertex_idx
+                         or not self._is_approaching(queue[0], vertex_idx)):
+            robot = queue.popleft()
+            if self._queued_at.get(robot.id) == vertex_idx:
+                del self._queued_at[robot.id]
+
+    def _has_left(self, robot: Robot, vertex_idx: int) -> bool:
+        if robot.status not in (RobotStatus.MOVING, RobotStatus.WAITING) or not robot.current_lane:
+            return True
+        start_idx, end_idx = robot.current_lane
+        if end_idx == vertex_idx:
             return False
-            
-        # Check each step in the path
-        for i in range(len(path) - 1):
-            current = path[i]
-            next_vertex = path[i+1]
-            
-            # Check if the lane is available
-            lane_key = (current, next_vertex) if current < next_vertex else (next_vertex, current)
-            if lane_key in self.reservations and self.reservations[lane_key] != robot:
-                return False
-                
-            # Check if the next vertex is available (unless it's the destination)
-            if i < len(path) - 2:  # Not the last vertex in the path
-                if next_vertex in self.intersection_queues and self.intersection_queues[next_vertex]:
-                    return False
-        
-        # Reserve the path
-        for i in range(len(path) - 1):
-            current = path[i]
-            next_vertex = path[i+1]
-            lane_key = (current, next_vertex) if current < next_vertex else (next_vertex, current)
-            self.reservations[lane_key] = robot
-            
-            if i < len(path) - 2:  # Not the last vertex in the path
-                if next_vertex not in self.intersection_queues:
-                    self.intersection_queues[next_vertex] = []
-                self.intersection_queues[next_vertex].append(robot)
-        
+        if start_idx == vertex_idx:
+            return robot.progress >= self.exit_progress
         return True
-    
-    def release_path(self, robot: Robot, path: List[int]):
-        """Release reservations when robot completes its path"""
-        for i in range(len(path) - 1):
-            current = path[i]
-            next_vertex = path[i+1]
-            lane_key = (current, next_vertex) if current < next_vertex else (next_vertex, current)
-            if lane_key in self.reservations and self.reservations[lane_key] == robot:
-                del self.reservations[lane_key]
-            
-            if i < len(path) - 2:  # Not the last vertex in the path
-                if next_vertex in self.intersection_queues and robot in self.intersection_queues[next_vertex]:
-                    self.intersection_queues[next_vertex].remove(robot)
-    
+
     def update(self):
-        """Update traffic management state"""
-        # Clear expired reservations (simplified - in real implementation would track time)
-        pass
\ No newline at end of file
+        """Release junctions whose robot has driven out of them"""
+        for vertex_idx, robot in list(self.junction_holders.items()):
+            if self._has_left(robot, vertex_idx):
+                self.release(robot, vertex_idx)
+
+    def waiting_robots(self, vertex_idx: int) -> List[Robot]:
+        return [r for r in self.intersection_queues.get(vertex_idx, ())
+                if self._queued_at.get(r.id) == vertex_idx]
@@ -1,12 +1,20 @@
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, filedialog
 from pathlib import Path
 import json
 import math
 import logging
 from typing import Tuple, Optional, Dict, List
+from collections import deque
 from enum import Enum, auto
 import time
+import numpy as np
+from src.models.events import EventBus, EventType, RobotEvent
+from src.models.spatial_index import SpatialGrid
+from src.utlis.profiler import TickProfiler
+from src.utlis.helpers import as_points, interpolate_position, transform_points
+from src.controllers.session_recorder import SessionRecorder, SessionReplayer
+from src.controllers.collision_detector import CollisionDetector, CollisionKind
 
 # NavGraph class
 class Vertex:
@@ -28,6 +36,13 @@ class NavGraph:
         self.lanes: List[Lane] = []
         self.levels: Dict[str, Dict[str, List]] = {}
         self.current_level = "level1"
+        self.name_index: Dict[str, int] = {}
+        self.vertex_index = SpatialGrid()
+        self.lane_ends = np.zeros((0, 2), dtype=int)  # Vertex pair of every lane, once even if listed both ways
+        self.lane_index = SpatialGrid()  # Lane midpoints, keyed by row of lane_ends
+        self.lane_reach = 0.0  # Largest x or y distance from a lane's midpoint to its ends
+        self.points = as_points([])  # Vertex coordinates as an (N, 2) array for batched geometry
+        self.nearest_charger: List[Optional[int]] = []  # Closest charger of every vertex by lane hops
         
     def load_from_json(self, file_path: str):
         with open(file_path, 'r') as f:
@@ -53,12 +68,53 @@ class NavGraph:
             start_idx, end_idx, attributes = lane_data
             speed_limit = attributes.get('speed_limit', 0)
             self.lanes.append(Lane(start_idx, end_idx, speed_limit))
+        
+        self.name_index = {v.name: idx for idx, v in reversed(list(enumerate(self.vertices))) if v.name}
+        self.vertex_index = SpatialGrid.from_points((idx, v.x, v.y) for idx, v in enumerate(self.vertices))
+        self.points = as_points([(v.x, v.y) for v in self.vertices])
+        self.lane_ends = np.array(sorted({(min(lane.start_idx, lane.end_idx), max(lane.start_idx, lane.end_idx))
+                                          for lane in self.lanes}), dtype=int).reshape(-1, 2)
+        starts, ends = self.points[self.lane_ends[:, 0]], self.points[self.lane_ends[:, 1]]
+        midpoints = ((starts + ends) / 2).tolist()
+        self.lane_index = SpatialGrid.from_points(((row, x, y) for row, (x, y) in enumerate(midpoints)),
+                                                  self.vertex_index.cell_size)
+        self.lane_reach = float(np.abs(ends - starts).max()) / 2 if len(midpoints) else 0.0
+        self.nearest_charger = self._build_charger_field()
+        self.current_level = level_name
+    
+    def _build_charger_field(self) -> List[Optional[int]]:
+        """Multi-source BFS from all chargers at once"""
+        adjacency: List[List[int]] = [[] for _ in self.vertices]
+        for start_idx, end_idx in self.lane_ends.tolist():
+            adjacency[start_idx].append(end_idx)
+            adjacency[end_idx].append(start_idx)
+        nearest: List[Optional[int]] = [idx if v.is_charger else None for idx, v in enumerate(self.vertices)]
+        queue = deque(idx for idx, charger in enumerate(nearest) if charger is not None)
+        while queue:
+            current = queue.popleft()
+            for neighbor in adjacency[current]:
+                if nearest[neighbor] is None:
+                    nearest[neighbor] = nearest[current]
+                    queue.append(neighbor)
+        return nearest
     
     def get_vertex_by_name(self, name: str) -> Optional[Vertex]:
-        for vertex in self.vertices:
-            if vertex.name == name:
-                return vertex
-        return None
+        idx = self.name_index.get(name)
+        return self.vertices[idx] if idx is not None else None
+    
+    def nearest_vertex(self, x: float, y: float, max_distance: float = float('inf')) -> Optional[int]:
+        return self.vertex_index.nearest(x, y, max_distance)
+    
+    def lanes_in_box(self, min_x: float, min_y: float, max_x: float, max_y: float) -> np.ndarray:
+        """Vertex pairs of the lanes whose bounding box overlaps the box, as an (M, 2) array"""
+        reach = self.lane_reach
+        rows = self.lane_index.query_box(min_x - reach, min_y - reach, max_x + reach, max_y + reach)
+        lane_ends = self.lane_ends[np.array(rows, dtype=int)]
+        starts, ends = self.points[lane_ends[:, 0]], self.points[lane_ends[:, 1]]
+        low, high = np.minimum(starts, ends), np.maximum(starts, ends)
+        overlaps = ((low[:, 0] <= max_x) & (high[:, 0] >= min_x)
+                    & (low[:, 1] <= max_y) & (high[:, 1] >= min_y))
+        return lane_ends[overlaps]
     
     def get_adjacent_vertices(self, vertex_idx: int) -> List[int]:
         adjacent = []
@@ -103,6 +159,23 @@ class NavGraph:
         return path if distances[end_idx] != float('inf') else []
 
 # Robot class
+WAIT_TIMEOUT_TICKS = 50  # A waiting robot gives up after this many ticks (5 s at the default interval)
+
+# Robots in any other status are drawn green
+STATUS_COLORS = {
+    "MOVING": "#0000FF",  # Blue
+    "WAITING": "#FF00FF",  # Magenta
+}
+IDLE_COLOR = "#00FF00"
+
+# Level of detail, in pixels between neighbouring vertices at the current zoom
+LABEL_MIN_SPACING = 40  # Vertex names are hidden below this
+VERTEX_MIN_SPACING = 12  # Plain vertices are hidden and lanes merged onto a grid this coarse below this
+CLUSTER_CELL = 24  # Robots drawn within the same cell of this many pixels become one cluster marker
+CLUSTER_COLOR = "#A0A0A0"
+ZOOM_STEP = 1.25
+MIN_ZOOM, MAX_ZOOM = 0.5, 500.0  # Relative to the view that fits the whole level
+
 class RobotStatus(Enum):
     IDLE = auto()
     MOVING = auto()
@@ -111,6 +184,10 @@ class RobotStatus(Enum):
     TASK_COMPLETE = auto()
 
 class Robot:
+    __slots__ = ('id', 'x', 'y', 'status', 'current_vertex_idx', 'destination_vertex_idx', '_route', '_cursor',
+                 'progress', 'current_lane', '_lane_ends', 'bus', 'battery', 'speed', 'waiting_ticks',
+                 'seeking_charger', 'charger_unreachable')
+    
     def __init__(self, robot_id: int, x: float, y: float):
         self.id = robot_id
         self.x = x
@@ -118,25 +195,33 @@ class Robot:
         self.status = RobotStatus.IDLE
         self.current_vertex_idx: Optional[int] = None
         self.destination_vertex_idx: Optional[int] = None
-        self.path: List[int] = []
+        self._route: List[int] = []  # Read through _cursor instead of popping its head at every vertex
+        self._cursor = 0
         self.progress = 0.0
         self.current_lane: Optional[tuple] = None
-        self.log = []
+        self._lane_ends: tuple = (None, None, None)  # current_lane it was looked up for, its start and end Vertex
+        self.bus: Optional[EventBus] = None
         self.battery = 100
         self.speed = 0.05
-        self.waiting_since = None
+        self.waiting_ticks = 0  # Counted in ticks rather than wall clock so replays behave the same
+        self.seeking_charger = False
+        self.charger_unreachable = False  # Last charger search failed; not retried until the next task
+    
+    @property
+    def path(self) -> List[int]:
+        return self._route[self._cursor:]
+    
+    @path.setter
+    def path(self, path: List[int]):
+        self._route = path
+        self._cursor = 0
+    
+    def emit(self, event_type: EventType, **data):
+        if self.bus is not None:
+            self.bus.publish(RobotEvent(event_type, self.id, **data))
         
     def get_color(self):
-        if self.status == RobotStatus.MOVING:
-            return "#0000FF"  # Blue
-        elif self.status == RobotStatus.WAITING:
-            return "#FF00FF"  # Magenta
-        elif self.status == RobotStatus.IDLE:
-            return "#00FF00"  # Green
-        elif self.status == RobotStatus.CHARGING:
-            return "#00FF00"  # Green (same as idle)
-        elif self.status == RobotStatus.TASK_COMPLETE:
-            return "#00FF00"  # Green (same as idle)
+        return STATUS_COLORS.get(self.status.name, IDLE_COLOR)
     
     def assign_task(self, destination_idx: int, nav_graph):
         if self.status == RobotStatus.CHARGING:
@@ -145,35 +230,34 @@ class Robot:
         if self.current_vertex_idx is None:
             return False, "Robot has no current position"
             
-        self.destination_vertex_idx = destination_idx
-        self.path = nav_graph.find_shortest_path(self.current_vertex_idx, destination_idx)
-        
-        if not self.path:
+        path = nav_graph.find_shortest_path(self.current_vertex_idx, destination_idx)
+        if not path:
             return False, "No valid path to destination"
             
+        self.destination_vertex_idx = destination_idx
+        self.path = path
+        self.seeking_charger = False
+        self.charger_unreachable = False
         self.status = RobotStatus.MOVING
         self._move_to_next_vertex(nav_graph)
-        self.log.append(f"Robot {self.id} assigned task to vertex {destination_idx}")
+        self.emit(EventType.TASK_ASSIGNED, vertex=destination_idx)
         return True, "Task assigned successfully"
     
     def _move_to_next_vertex(self, nav_graph):
-        if len(self.path) < 2:
+        if len(self._route) - self._cursor < 2:
             self.status = RobotStatus.TASK_COMPLETE
             self.destination_vertex_idx = None
+            self.emit(EventType.ARRIVED, vertex=self.current_vertex_idx)
             return
             
-        start_idx = self.path[0]
-        end_idx = self.path[1]
-        
-        for lane in nav_graph.lanes:
-            if (lane.start_idx == start_idx and lane.end_idx == end_idx) or \
-               (lane.end_idx == start_idx and lane.start_idx == end_idx):
-                self.current_lane = (start_idx, end_idx)
-                break
+        # Consecutive path vertices are always joined by a lane
+        start_idx = self._route[self._cursor]
+        end_idx = self._route[self._cursor + 1]
+        self.current_lane = (start_idx, end_idx)
         
         self.progress = 0.0
         self.current_vertex_idx = start_idx
-        self.path.pop(0)
+        self._cursor += 1
     
     def update_position(self, nav_graph):
         if self.status != RobotStatus.MOVING:
@@ -184,8 +268,9 @@ class Robot:
             return
             
         start_idx, end_idx = self.current_lane
-        start_vertex = nav_graph.vertices[start_idx]
-        end_vertex = nav_graph.vertices[end_idx]
+        if self._lane_ends[0] is not self.current_lane:
+            self._lane_ends = (self.current_lane, nav_graph.vertices[start_idx], nav_graph.vertices[end_idx])
+        start_vertex, end_vertex = self._lane_ends[1], self._lane_ends[2]
         
         self.progress += self.speed
         if self.progress >= 1.0:
@@ -195,58 +280,80 @@ class Robot:
             self.y = end_vertex.y
             
             if end_vertex.is_charger and self.battery < 50:
+                self.seeking_charger = False
                 self.status = RobotStatus.CHARGING
-                self.log.append(f"Robot {self.id} started charging at vertex {end_idx}")
-            elif not self.path:
-                self.status = RobotStatus.TASK_COMPLETE
-                self.log.append(f"Robot {self.id} completed task at vertex {end_idx}")
+                self.emit(EventType.CHARGING_STARTED, vertex=end_idx)
+            elif self.battery < 20 and not self.seeking_charger and not self.charger_unreachable:
+                # On failure the robot carries on with its task
+                if not self.seek_charger(nav_graph):
+                    self._finish_lane(nav_graph)
             else:
-                self._move_to_next_vertex(nav_graph)
+                self._finish_lane(nav_graph)
         else:
-            self.x = start_vertex.x + (end_vertex.x - start_vertex.x) * self.progress
-            self.y = start_vertex.y + (end_vertex.y - start_vertex.y) * self.progress
+            self.x, self.y = interpolate_position((start_vertex.x, start_vertex.y),
+                                                  (end_vertex.x, end_vertex.y), self.progress)
         
         if self.status == RobotStatus.MOVING:
             self.battery = max(0, self.battery - 0.1)
-            if self.battery < 20:
-                chargers = [i for i, v in enumerate(nav_graph.vertices) if v.is_charger]
-                if chargers:
-                    nearest = min(chargers, key=lambda x: self._distance_to_vertex(nav_graph, x))
-                    success, message = self.assign_task(nearest, nav_graph)
-                    if success:
-                        self.log.append(f"Robot {self.id} low battery, rerouting to charger at vertex {nearest}")
-                    else:
-                        self.log.append(f"Robot {self.id} failed to reroute to charger: {message}")
     
-    def _distance_to_vertex(self, nav_graph, vertex_idx):
-        vertex = nav_graph.vertices[vertex_idx]
-        return ((self.x - vertex.x)**2 + (self.y - vertex.y)**2)**0.5
+    def _finish_lane(self, nav_graph):
+        """Complete the task at the end of the route, or start the next lane"""
+        if self._cursor >= len(self._route):
+            self.status = RobotStatus.TASK_COMPLETE
+            self.emit(EventType.ARRIVED, vertex=self.current_vertex_idx)
+        else:
+            self._move_to_next_vertex(nav_graph)
+    
+    def seek_charger(self, nav_graph) -> bool:
+        """Reroute to the nearest charger by lane hops; only called on reaching a vertex"""
+        nearest = nav_graph.nearest_charger[self.current_vertex_idx]
+        if nearest is None:
+            self.charger_unreachable = True
+            self.emit(EventType.REROUTE_FAILED, reason="no reachable charger")
+            return False
+        if nearest == self.current_vertex_idx:
+            self.seeking_charger = False
+            self.status = RobotStatus.CHARGING
+            self.emit(EventType.CHARGING_STARTED, vertex=nearest)
+            return True
+        success, message = self.assign_task(nearest, nav_graph)
+        if not success:
+            self.charger_unreachable = True
+            self.emit(EventType.REROUTE_FAILED, reason=message)
+            return False
+        self.seeking_charger = True
+        self.emit(EventType.LOW_BATTERY, vertex=nearest)
+        return True
     
     def update_charging(self):
         if self.status == RobotStatus.CHARGING:
             self.battery = min(100, self.battery + 1)
             if self.battery >= 95:
                 self.status = RobotStatus.IDLE
-                self.log.append(f"Robot {self.id} finished charging")
+                self.emit(EventType.CHARGING_FINISHED)
     
     def update_waiting(self):
         if self.status == RobotStatus.WAITING:
-            if self.waiting_since is None:
-                self.waiting_since = time.time()
-            elif time.time() - self.waiting_since > 5:  # 5 seconds timeout
+            self.waiting_ticks += 1
+            if self.waiting_ticks > WAIT_TIMEOUT_TICKS:
                 self.status = RobotStatus.IDLE
-                self.waiting_since = None
-                self.log.append(f"Robot {self.id} gave up waiting")
+                self.waiting_ticks = 0
+                self.emit(EventType.GAVE_UP)
 
 # FleetManager class
 class FleetManager:
     def __init__(self, nav_graph: NavGraph):
         self.nav_graph = nav_graph
         self.robots: List[Robot] = []
+        self.robots_by_id: Dict[int, Robot] = {}
+        self.robot_index = SpatialGrid(nav_graph.vertex_index.cell_size)
         self.robot_id_counter = 1
         self.occupied_vertices: Dict[int, List[Robot]] = {}
         self.occupied_lanes: Dict[tuple, Robot] = {}
-        self.conflicts: List[str] = []
+        self.conflicts: List[RobotEvent] = []
+        self.collision_detector = CollisionDetector()
+        self.yielding: List[Robot] = []  # Robots stopped for one tick by the collision detector
+        self.profiler = TickProfiler()
         
         logging.basicConfig(
             filename='src/logs/fleet_logs.txt',
@@ -254,13 +361,27 @@ class FleetManager:
             format='%(asctime)s - %(message)s'
         )
         self.logger = logging.getLogger('FleetManager')
+        self.event_bus = EventBus()
+        self.event_bus.subscribe(self._log_event)
+        self.event_bus.subscribe(self.conflicts.append, [EventType.CONFLICT])
+        self.event_bus.subscribe(lambda event: self.profiler.count('conflicts'), [EventType.CONFLICT])
+        self.event_bus.subscribe(lambda event: self.profiler.count('gave_up'), [EventType.GAVE_UP])
+        self.event_bus.subscribe(lambda event: self.profiler.count('yields'),
+                                 [EventType.NEAR_MISS, EventType.INTERSECTION_CONFLICT])
+    
+    def _log_event(self, event: RobotEvent):
+        self.profiler.count('log_records')
+        self.logger.info("%s", event)
     
     def reset_for_new_level(self):
         self.robots.clear()
+        self.robots_by_id.clear()
+        self.robot_index = SpatialGrid(self.nav_graph.vertex_index.cell_size)
         self.robot_id_counter = 1
         self.occupied_vertices.clear()
         self.occupied_lanes.clear()
         self.conflicts.clear()
+        self.yielding.clear()
     
     def spawn_robot(self, vertex_idx: int) -> Tuple[bool, str]:
         if vertex_idx < 0 or vertex_idx >= len(self.nav_graph.vertices):
@@ -272,14 +393,17 @@ class FleetManager:
         vertex = self.nav_graph.vertices[vertex_idx]
         robot = Robot(self.robot_id_counter, vertex.x, vertex.y)
         robot.current_vertex_idx = vertex_idx
+        robot.bus = self.event_bus
         self.robots.append(robot)
+        self.robots_by_id[robot.id] = robot
+        self.robot_index.insert(robot.id, robot.x, robot.y)
         self.robot_id_counter += 1
         
         if vertex_idx not in self.occupied_vertices:
             self.occupied_vertices[vertex_idx] = []
         self.occupied_vertices[vertex_idx].append(robot)
         
-        self.logger.info(f"Spawned robot {robot.id} at vertex {vertex_idx} ({vertex.name})")
+        robot.emit(EventType.SPAWNED, vertex=vertex_idx, name=vertex.name)
         return True, f"Robot spawned successfully at vertex {vertex_idx}"
     
     def is_vertex_occupied(self, vertex_idx: int) -> bool:
@@ -293,7 +417,7 @@ class FleetManager:
         return len(self.occupied_vertices[vertex_idx]) > 0
     
     def assign_task(self, robot_id: int, destination_idx: int) -> Tuple[bool, str]:
-        robot = next((r for r in self.robots if r.id == robot_id), None)
+        robot = self.robots_by_id.get(robot_id)
         if not robot or robot.current_vertex_idx is None:
             return False, "Robot not found or has no position"
             
@@ -302,9 +426,7 @@ class FleetManager:
             
         dest_vertex = self.nav_graph.vertices[destination_idx]
         if not dest_vertex.is_charger and self.is_vertex_occupied(destination_idx):
-            conflict_msg = f"Vertex {destination_idx} is occupied by another robot"
-            self.conflicts.append(conflict_msg)
-            return False, conflict_msg
+            return False, f"Vertex {destination_idx} is occupied by another robot"
             
         success, message = robot.assign_task(destination_idx, self.nav_graph)
         if success:
@@ -312,10 +434,22 @@ class FleetManager:
         return success, message
     
     def update(self):
-        self.occupied_vertices = {idx: [] for idx in range(len(self.nav_graph.vertices))}
-        self.occupied_lanes.clear()
-        self.conflicts.clear()
-        
+        with self.profiler.phase('tick'):
+            self.occupied_vertices = {}
+            self.occupied_lanes.clear()
+            self.conflicts.clear()
+            with self.profiler.phase('movement'):
+                self._move_robots()
+            with self.profiler.phase('occupancy'):
+                for robot in self.robots:
+                    if robot.current_vertex_idx is not None:
+                        self.occupied_vertices.setdefault(robot.current_vertex_idx, []).append(robot)
+                    self.robot_index.move(robot.id, robot.x, robot.y)
+            with self.profiler.phase('conflict_check'):
+                self._check_lane_conflicts()
+                self._check_collisions()
+    
+    def _move_robots(self):
         for robot in self.robots:
             if robot.current_vertex_idx is not None and robot.current_vertex_idx >= len(self.nav_graph.vertices):
                 robot.current_vertex_idx = None
@@ -328,11 +462,8 @@ class FleetManager:
                 robot.update_waiting()
             elif robot.status == RobotStatus.MOVING:
                 robot.update_position(self.nav_graph)
-            
-            if robot.current_vertex_idx is not None:
-                self.occupied_vertices[robot.current_vertex_idx].append(robot)
-        
-        # Check for lane conflicts
+    
+    def _check_lane_conflicts(self):
         for robot in self.robots:
             if robot.status == RobotStatus.MOVING and robot.current_lane:
                 lane_key = self.get_lane_key(robot.current_lane)
@@ -340,28 +471,45 @@ class FleetManager:
                     other_robot = self.occupied_lanes[lane_key]
                     if other_robot.id < robot.id:  # Let lower ID robot have priority
                         robot.status = RobotStatus.WAITING
-                        conflict_msg = f"Robot {robot.id} waiting for Robot {other_robot.id} on lane {lane_key}"
-                        robot.log.append(conflict_msg)
-                        self.conflicts.append(conflict_msg)
+                        robot.emit(EventType.CONFLICT, other_id=other_robot.id, lane=lane_key)
                     else:
                         other_robot.status = RobotStatus.WAITING
-                        conflict_msg = f"Robot {other_robot.id} waiting for Robot {robot.id} on lane {lane_key}"
-                        other_robot.log.append(conflict_msg)
-                        self.conflicts.append(conflict_msg)
+                        other_robot.emit(EventType.CONFLICT, other_id=robot.id, lane=lane_key)
                 else:
                     self.occupied_lanes[lane_key] = robot
-        
-        # Log all messages
-        for robot in self.robots:
-            for log_entry in robot.log:
-                self.logger.info(log_entry)
-            robot.log.clear()
+    
+    def _check_collisions(self):
+        """Near-misses and crossing traffic, found by the same detector as the headless fleet.
+
+        Unlike a lane conflict, which waits until the robot gives up, a yield
+        lasts one tick: the yielder is checked again against the next tick's traffic.
+        """
+        was_yielding = {robot.id for robot in self.yielding}
+        for robot in self.yielding:
+            if robot.status == RobotStatus.WAITING:
+                robot.status = RobotStatus.MOVING
+        self.yielding = []
+        moving = [r for r in self.robots if r.status == RobotStatus.MOVING and r.current_lane]
+        for collision in self.collision_detector.detect(moving, self.nav_graph):
+            yielder = collision.yielder
+            other = collision.other if yielder is collision.robot else collision.robot
+            # Never stop for a robot that is stopped itself, so yields can't form a cycle
+            if yielder is None or yielder.status != RobotStatus.MOVING or other.status != RobotStatus.MOVING:
+                continue
+            yielder.status = RobotStatus.WAITING
+            self.yielding.append(yielder)
+            if yielder.id in was_yielding:
+                continue
+            if collision.kind == CollisionKind.INTERSECTION:
+                yielder.emit(EventType.INTERSECTION_CONFLICT, other_id=other.id, vertex=collision.vertex_idx)
+            else:
+                yielder.emit(EventType.NEAR_MISS, other_id=other.id, distance=collision.distance)
     
     def get_lane_key(self, lane: tuple) -> tuple:
         return tuple(sorted(lane))
     
     def get_robot_info(self, robot_id: int) -> dict:
-        robot = next((r for r in self.robots if r.id == robot_id), None)
+        robot = self.robots_by_id.get(robot_id)
         if not robot:
             return {}
             
@@ -376,8 +524,12 @@ class FleetManager:
             'color': robot.get_color()
         }
     
-    def get_conflicts(self) -> List[str]:
+    def get_conflicts(self) -> List[RobotEvent]:
         return self.conflicts
+    
+    def nearest_robot(self, x: float, y: float, max_distance: float = float('inf')) -> Optional[Robot]:
+        robot_id = self.robot_index.nearest(x, y, max_distance)
+        return self.robots_by_id.get(robot_id) if robot_id is not None else None
 
 # FleetGUI class with enhanced notifications
 class FleetGUI:
@@ -390,6 +542,26 @@ class FleetGUI:
         self.fleet_manager = FleetManager(self.nav_graph)
         self.last_conflict_time = 0
         self.conflict_display_time = 3  # seconds
+        self.recent_events = deque(maxlen=50)
+        self.log_dirty = False
+        self.fleet_manager.event_bus.subscribe(self.on_fleet_event)
+        self.profiler = self.fleet_manager.profiler  # GUI phases are timed alongside the simulation's
+        self.show_stats = False
+        self.profile_path = 'src/logs/profile_stats.txt'
+        self.commands = self.fleet_manager  # Spawns and assignments go through the recorder while recording
+        self.recorder: Optional[SessionRecorder] = None
+        self.replayer: Optional[SessionReplayer] = None
+        self.replay_tick = 0
+        self._advancing_replay = False  # Set while update() moves the slider, so seek_replay doesn't draw too
+        self.record_path = 'src/logs/session.rec'
+        self.transform = (0.0, 0.0, 1.0, 1.0)
+        self.fit_scale = 1.0
+        self.view_level = None  # Level the view was last fitted to
+        self.view_fitted = True  # False once the user zooms or pans
+        self.graph_view = None  # View the static graph layer was drawn for
+        self.drawn_vertices: Dict[int, int] = {}  # Vertex index: radius, for vertices in the static layer
+        self.clusters: List[Tuple[int, int, int]] = []  # Canvas x, y and radius of drawn robot clusters
+        self.pan_anchor: Optional[Tuple[int, int]] = None
         
         try:
             current_dir = Path(__file__).parent
@@ -413,6 +585,7 @@ class FleetGUI:
         self.animation_running = True
         self.update_interval = 100
         self.animation_speed = 1.0
+        self.pick_radius = 13  # Click tolerance in pixels (robot radius plus selection ring)
         
         # Conflict notification label
         self.conflict_label = tk.Label(self.root, text="", fg="red", font=('Arial', 12, 'bold'))
@@ -428,6 +601,14 @@ class FleetGUI:
         self.canvas = tk.Canvas(self.root, bg='white')
         self.canvas.grid(row=0, column=0, sticky="nsew", padx=5, pady=5)
         self.canvas.bind("<Button-1>", self.on_canvas_click)
+        self.canvas.bind("<MouseWheel>", self.on_mouse_wheel)
+        self.canvas.bind("<Button-4>", lambda event: self.zoom_at(event.x, event.y, ZOOM_STEP))
+        self.canvas.bind("<Button-5>", lambda event: self.zoom_at(event.x, event.y, 1 / ZOOM_STEP))
+        for button in (2, 3):
+            self.canvas.bind(f"<ButtonPress-{button}>", self.start_pan)
+            self.canvas.bind(f"<B{button}-Motion>", self.on_pan)
+            self.canvas.bind(f"<ButtonRelease-{button}>", self.end_pan)
+        self.canvas.bind("<Configure>", self.on_canvas_resize)
         
         side_panel = ttk.Frame(self.root, width=300)
         side_panel.grid(row=0, column=1, sticky="nsew", padx=5, pady=5)
@@ -491,90 +672,262 @@ class FleetGUI:
         ttk.Button(frame, text="Assign Task", command=self.assign_task).grid(row=0, column=1, padx=2, pady=2, sticky="ew")
         ttk.Button(frame, text="Pause/Resume", command=self.toggle_animation).grid(row=1, column=0, padx=2, pady=2, sticky="ew")
         ttk.Button(frame, text="Clear Logs", command=self.clear_logs).grid(row=1, column=1, padx=2, pady=2, sticky="ew")
+        ttk.Button(frame, text="Show Stats", command=self.toggle_stats).grid(row=2, column=0, padx=2, pady=2, sticky="ew")
+        self.profile_button = ttk.Button(frame, text="Start Profiling", command=self.toggle_profiling)
+        self.profile_button.grid(row=2, column=1, padx=2, pady=2, sticky="ew")
+        self.record_button = ttk.Button(frame, text="Record", command=self.toggle_recording)
+        self.record_button.grid(row=3, column=0, padx=2, pady=2, sticky="ew")
+        self.replay_button = ttk.Button(frame, text="Replay", command=self.toggle_replay)
+        self.replay_button.grid(row=3, column=1, padx=2, pady=2, sticky="ew")
+        # Dragging the slider seeks through a loaded replay
+        self.replay_scale = ttk.Scale(frame, from_=0, to=1, orient=tk.HORIZONTAL, command=self.seek_replay)
+        self.replay_scale.grid(row=4, column=0, columnspan=2, padx=2, pady=2, sticky="ew")
+        ttk.Button(frame, text="Fit View", command=self.fit_view).grid(row=5, column=0, columnspan=2, padx=2, pady=2, sticky="ew")
     
     def change_level(self, selected_level):
         try:
-            self.nav_graph.load_level(selected_level)
-            self.fleet_manager.reset_for_new_level()
+            if self.recorder is not None:
+                self.recorder.change_level(selected_level)
+            else:
+                self.nav_graph.load_level(selected_level)
+                self.fleet_manager.reset_for_new_level()
             self.selected_robot = None
             self.selected_vertex = None
-            self.draw_nav_graph()
+            self.redraw()
             self.update_robot_info()
         except Exception as e:
             messagebox.showerror("Error", f"Failed to load level: {str(e)}")
     
     def draw_nav_graph(self):
-        self.canvas.delete("all")
-        
-        # Draw lanes
-        for lane in self.nav_graph.lanes:
-            start = self.nav_graph.vertices[lane.start_idx]
-            end = self.nav_graph.vertices[lane.end_idx]
-            x1, y1 = self.to_canvas_coords(start.x, start.y)
-            x2, y2 = self.to_canvas_coords(end.x, end.y)
-            self.canvas.create_line(x1, y1, x2, y2, fill="gray", width=2)
-        
-        # Draw vertices
-        for i, vertex in enumerate(self.nav_graph.vertices):
-            x, y = self.to_canvas_coords(vertex.x, vertex.y)
+        """Draw the part of the level inside the view.
+
+        Lanes, vertices and names only change with the level or the view, so
+        they are drawn once per view under the "graph" tag; each frame only
+        redraws the rings marking occupied vertices.
+        """
+        if self.view_level != self.nav_graph.current_level:
+            self.update_transform()
+        min_x, min_y, max_x, max_y = self.visible_box()
+        if self.graph_view != (self.nav_graph.current_level, self.transform):
+            self.canvas.delete("graph")
+            self.draw_graph_layer(min_x, min_y, max_x, max_y)
+            self.canvas.tag_lower("graph")
+            self.graph_view = (self.nav_graph.current_level, self.transform)
+        
+        self.canvas.delete("occupied")
+        for idx in self.fleet_manager.occupied_vertices:
+            radius = self.drawn_vertices.get(idx)
+            if radius is not None and self.fleet_manager.is_vertex_occupied(idx):
+                vertex = self.nav_graph.vertices[idx]
+                x, y = self.to_canvas_coords(vertex.x, vertex.y)
+                self.canvas.create_oval(x-radius, y-radius, x+radius, y+radius,
+                                      outline="red", width=2, tags="occupied")
+    
+    def draw_graph_layer(self, min_x: float, min_y: float, max_x: float, max_y: float):
+        vertices = self.nav_graph.vertices
+        points = self.nav_graph.points
+        spacing = self.nav_graph.vertex_index.cell_size * min(self.transform[2], self.transform[3])
+        detailed = spacing >= VERTEX_MIN_SPACING
+        
+        # Draw lanes; zoomed out, their ends snap to a coarse grid so overlapping ones are drawn once
+        lane_ends = self.nav_graph.lanes_in_box(min_x, min_y, max_x, max_y)
+        segments = np.hstack([self.to_canvas_points(points[lane_ends[:, 0]]),
+                              self.to_canvas_points(points[lane_ends[:, 1]])])
+        if not detailed:
+            segments = np.round(segments / VERTEX_MIN_SPACING).astype(int) * VERTEX_MIN_SPACING
+            segments = segments[(segments[:, :2] != segments[:, 2:]).any(axis=1)]
+            # The same segment drawn either way round counts once
+            flip = (segments[:, 0] > segments[:, 2]) | ((segments[:, 0] == segments[:, 2]) & (segments[:, 1] > segments[:, 3]))
+            segments[flip] = segments[flip][:, [2, 3, 0, 1]]
+            segments = np.unique(segments, axis=0)
+        for x1, y1, x2, y2 in segments.tolist():
+            self.canvas.create_line(x1, y1, x2, y2, fill="gray", width=2 if detailed else 1, tags="graph")
+        
+        # Draw vertices; zoomed out, only chargers and named vertices remain, one per grid cell
+        self.drawn_vertices = {}
+        visible = self.nav_graph.vertex_index.query_box(min_x, min_y, max_x, max_y)
+        if not detailed:
+            visible = sorted((i for i in visible if vertices[i].is_charger or vertices[i].name),
+                             key=lambda i: not vertices[i].is_charger)
+        drawn_cells = set()
+        for i, (x, y) in zip(visible, self.to_canvas_points(points[visible]).tolist()):
+            vertex = vertices[i]
+            landmark = vertex.is_charger or vertex.name
+            if not detailed:
+                cell = (x // VERTEX_MIN_SPACING, y // VERTEX_MIN_SPACING)
+                if cell in drawn_cells:
+                    continue
+                drawn_cells.add(cell)
             color = "#FFFF00" if vertex.is_charger else "#8B4513"  # Yellow for chargers, Brown for vertices
-            radius = 10 if vertex.is_charger or vertex.name else 6
-            outline = "red" if self.fleet_manager.is_vertex_occupied(i) else "black"
+            radius = (10 if landmark else 6) if detailed else 4
             self.canvas.create_oval(x-radius, y-radius, x+radius, y+radius, 
-                                  fill=color, outline=outline, width=2, tags=f"vertex_{i}")
-            if vertex.name:
+                                  fill=color, outline="black", width=2 if detailed else 1,
+                                  tags=("graph", f"vertex_{i}"))
+            self.drawn_vertices[i] = radius
+            if vertex.name and spacing >= LABEL_MIN_SPACING:
                 self.canvas.create_text(x, y-15, text=vertex.name, 
-                                      fill="black", font=('Arial', 10, 'bold'))
+                                      fill="black", font=('Arial', 10, 'bold'), tags="graph")
     
-    def to_canvas_coords(self, x: float, y: float) -> Tuple[int, int]:
-        min_x = min(v.x for v in self.nav_graph.vertices)
-        max_x = max(v.x for v in self.nav_graph.vertices)
-        min_y = min(v.y for v in self.nav_graph.vertices)
-        max_y = max(v.y for v in self.nav_graph.vertices)
-        padding = 0.1 * max(max_x - min_x, max_y - min_y)
+    def update_transform(self):
+        """Fit the whole level into the canvas and cache the world -> canvas mapping"""
+        min_x, min_y = self.nav_graph.points.min(axis=0).tolist()
+        max_x, max_y = self.nav_graph.points.max(axis=0).tolist()
+        padding = 0.1 * max(max_x - min_x, max_y - min_y) or 1.0
         min_x -= padding
         max_x += padding
         min_y -= padding
         max_y += padding
         
-        canvas_width = self.canvas.winfo_width() or 1000
-        canvas_height = self.canvas.winfo_height() or 600
-        scaled_x = ((x - min_x) / (max_x - min_x)) * (canvas_width - 20) + 10
-        scaled_y = ((y - min_y) / (max_y - min_y)) * (canvas_height - 20) + 10
-        return int(scaled_x), int(scaled_y)
+        # Before the window is mapped the canvas reports a 1x1 size
+        canvas_width = self.canvas.winfo_width()
+        canvas_height = self.canvas.winfo_height()
+        if canvas_width <= 20 or canvas_height <= 20:
+            canvas_width, canvas_height = 1000, 600
+        self.transform = (min_x, min_y,
+                          (canvas_width - 20) / (max_x - min_x),
+                          (canvas_height - 20) / (max_y - min_y))
+        self.fit_scale = min(self.transform[2], self.transform[3])
+        self.view_level = self.nav_graph.current_level
+        self.view_fitted = True
+    
+    def visible_box(self) -> Tuple[float, float, float, float]:
+        """World coordinates of the canvas corners, as min_x, min_y, max_x, max_y"""
+        min_x, min_y = self.to_world_coords(0, 0)
+        max_x, max_y = self.to_world_coords(self.canvas.winfo_width() or 1000, self.canvas.winfo_height() or 600)
+        return min_x, min_y, max_x, max_y
+    
+    def to_canvas_coords(self, x: float, y: float) -> Tuple[int, int]:
+        min_x, min_y, scale_x, scale_y = self.transform
+        return int((x - min_x) * scale_x + 10), int((y - min_y) * scale_y + 10)
+    
+    def to_canvas_points(self, points):
+        """to_canvas_coords for an (N, 2) array of world points at once"""
+        min_x, min_y, scale_x, scale_y = self.transform
+        return transform_points(points, (min_x, min_y), (scale_x, scale_y), 10)
+    
+    def to_world_coords(self, canvas_x: float, canvas_y: float) -> Tuple[float, float]:
+        min_x, min_y, scale_x, scale_y = self.transform
+        return (canvas_x - 10) / scale_x + min_x, (canvas_y - 10) / scale_y + min_y
+    
+    def zoom_at(self, canvas_x: int, canvas_y: int, factor: float):
+        """Scale the view by factor, keeping the world point under (canvas_x, canvas_y) in place"""
+        min_x, min_y, scale_x, scale_y = self.transform
+        zoom = min(scale_x, scale_y) / self.fit_scale
+        factor = max(MIN_ZOOM / zoom, min(MAX_ZOOM / zoom, factor))
+        world_x, world_y = self.to_world_coords(canvas_x, canvas_y)
+        scale_x *= factor
+        scale_y *= factor
+        self.transform = (world_x - (canvas_x - 10) / scale_x, world_y - (canvas_y - 10) / scale_y, scale_x, scale_y)
+        self.view_fitted = False
+        self.redraw()
+    
+    def on_mouse_wheel(self, event):
+        self.zoom_at(event.x, event.y, ZOOM_STEP if event.delta > 0 else 1 / ZOOM_STEP)
+    
+    def start_pan(self, event):
+        self.pan_anchor = (event.x, event.y)
+    
+    def on_pan(self, event):
+        if self.pan_anchor is None:
+            return
+        min_x, min_y, scale_x, scale_y = self.transform
+        dx, dy = event.x - self.pan_anchor[0], event.y - self.pan_anchor[1]
+        self.pan_anchor = (event.x, event.y)
+        self.transform = (min_x - dx / scale_x, min_y - dy / scale_y, scale_x, scale_y)
+        self.view_fitted = False
+        # Shift what is drawn while dragging; the uncovered edges are filled in on release
+        for tag in ("graph", "occupied", "robot"):
+            self.canvas.move(tag, dx, dy)
+        self.clusters = [(x + dx, y + dy, size) for x, y, size in self.clusters]
+        self.graph_view = (self.nav_graph.current_level, self.transform)
+    
+    def end_pan(self, event):
+        self.pan_anchor = None
+        self.graph_view = None
+        self.redraw()
+    
+    def fit_view(self):
+        self.update_transform()
+        self.redraw()
+    
+    def on_canvas_resize(self, event):
+        # A fitted view refits to the new size; a zoomed one keeps its scale and shows more or less
+        if self.view_fitted:
+            self.update_transform()
+        self.graph_view = None
+        self.redraw()
+    
+    def redraw(self):
+        self.draw_nav_graph()
+        if self.replayer is not None:
+            self.draw_replay()
+        else:
+            self.draw_robots()
     
     def draw_robots(self):
+        min_x, min_y, max_x, max_y = self.visible_box()
+        robots = self.fleet_manager.robots_by_id
+        self.draw_robot_markers([(robot_id, robots[robot_id].x, robots[robot_id].y, robots[robot_id].get_color())
+                                 for robot_id in self.fleet_manager.robot_index.query_box(min_x, min_y, max_x, max_y)])
+    
+    def draw_robot_markers(self, markers: List[Tuple[int, float, float, str]]):
+        """Draw (robot_id, x, y, color) markers, merging robots that would overlap into clusters"""
         self.canvas.delete("robot")
-        for robot in self.fleet_manager.robots:
-            x, y = self.to_canvas_coords(robot.x, robot.y)
-            radius = 10
-            self.canvas.create_oval(x-radius, y-radius, x+radius, y+radius, 
-                                  fill=robot.get_color(), outline="black", 
-                                  tags=("robot", f"robot_{robot.id}"))
-            self.canvas.create_text(x, y, text=str(robot.id), 
-                                  tags=("robot", f"robot_{robot.id}"))
-            if self.selected_robot == robot.id:
+        radius = 10
+        cells: Dict[Tuple[int, int], list] = {}
+        positions = self.to_canvas_points([(x, y) for _, x, y, _ in markers]).tolist()
+        for (robot_id, _, _, color), (x, y) in zip(markers, positions):
+            if robot_id == self.selected_robot:
+                # The selected robot is always drawn on its own
                 self.canvas.create_oval(x-radius-3, y-radius-3, x+radius+3, y+radius+3,
                                       outline="red", width=2, 
-                                      tags=("robot", f"robot_{robot.id}"))
+                                      tags=("robot", f"robot_{robot_id}"))
+                cells[(x, y, robot_id)] = [(robot_id, x, y, color)]
+            else:
+                cells.setdefault((x // CLUSTER_CELL, y // CLUSTER_CELL), []).append((robot_id, x, y, color))
+        
+        self.clusters = []
+        for group in cells.values():
+            if len(group) == 1:
+                robot_id, x, y, color = group[0]
+                self.canvas.create_oval(x-radius, y-radius, x+radius, y+radius, 
+                                      fill=color, outline="black", 
+                                      tags=("robot", f"robot_{robot_id}"))
+                self.canvas.create_text(x, y, text=str(robot_id), 
+                                      tags=("robot", f"robot_{robot_id}"))
+                continue
+            x = sum(m[1] for m in group) // len(group)
+            y = sum(m[2] for m in group) // len(group)
+            size = radius + 2 * int(math.log2(len(group)))
+            colors = {m[3] for m in group}
+            color = colors.pop() if len(colors) == 1 else CLUSTER_COLOR
+            self.canvas.create_oval(x-size, y-size, x+size, y+size, fill=color, outline="black",
+                                  width=2, tags=("robot", "cluster"))
+            self.canvas.create_text(x, y, text=str(len(group)), font=('Arial', 9, 'bold'),
+                                  tags=("robot", "cluster"))
+            self.clusters.append((x, y, size))
     
     def on_canvas_click(self, event):
-        item = self.canvas.find_closest(event.x, event.y)[0]
-        tags = self.canvas.gettags(item)
+        # Clicking a robot cluster zooms in on it until its robots separate
+        for cluster_x, cluster_y, size in self.clusters:
+            if (event.x - cluster_x) ** 2 + (event.y - cluster_y) ** 2 <= size * size:
+                self.zoom_at(cluster_x, cluster_y, 2)
+                return
         
-        robot_clicked = any(t.startswith("robot_") for t in tags)
-        if robot_clicked:
-            robot_id = int(next(t for t in tags if t.startswith("robot_")).split("_")[1])
-            self.selected_robot = robot_id
+        # Hit-test against the spatial indexes rather than every canvas item
+        x, y = self.to_world_coords(event.x, event.y)
+        min_x, min_y, scale_x, scale_y = self.transform
+        reach = self.pick_radius / min(scale_x, scale_y)
+        
+        robot = self.fleet_manager.nearest_robot(x, y, reach)
+        if robot is not None:
+            self.selected_robot = robot.id
             self.selected_vertex = None
             self.update_robot_info()
             return
         
-        vertex_clicked = any(t.startswith("vertex_") for t in tags)
-        if vertex_clicked:
-            vertex_idx = int(next(t for t in tags if t.startswith("vertex_")).split("_")[1])
-            if vertex_idx >= len(self.nav_graph.vertices):
-                return
+        vertex_idx = self.nav_graph.nearest_vertex(x, y, reach)
+        if vertex_idx is not None:
             self.selected_vertex = vertex_idx
             if self.selected_robot is None:
                 self.spawn_robot(vertex_idx)
@@ -596,11 +949,11 @@ class FleetGUI:
             messagebox.showerror("Error", "Invalid vertex index")
             return
             
-        success, message = self.fleet_manager.spawn_robot(idx)
+        success, message = self.commands.spawn_robot(idx)
         if success:
             messagebox.showinfo("Success", message)
             self.update_robot_info()
-            self.draw_nav_graph()  # Redraw to show occupied vertex
+            self.redraw()  # Redraw to show the robot and occupied vertex
         else:
             self.show_conflict(message)
     
@@ -618,7 +971,7 @@ class FleetGUI:
             messagebox.showerror("Error", "Invalid destination vertex")
             return
             
-        success, message = self.fleet_manager.assign_task(self.selected_robot, dest_idx)
+        success, message = self.commands.assign_task(self.selected_robot, dest_idx)
         if success:
             messagebox.showinfo("Success", message)
         else:
@@ -626,6 +979,93 @@ class FleetGUI:
         
         self.update_robot_info()
     
+    def toggle_stats(self):
+        self.show_stats = not self.show_stats
+        if not self.show_stats:
+            self.canvas.delete("stats")
+    
+    def toggle_profiling(self):
+        """Start or stop a cProfile capture; the report is written to the logs folder"""
+        if self.profiler.toggle_capture(self.profile_path):
+            self.profile_button.config(text="Stop Profiling")
+        else:
+            self.profile_button.config(text="Start Profiling")
+            messagebox.showinfo("Profiling", f"Profile written to {self.profile_path}")
+    
+    def draw_stats(self):
+        """Overlay phase timings and counters in the top-left corner of the canvas"""
+        self.canvas.delete("stats")
+        if not self.show_stats:
+            return
+        lines = self.profiler.summary_lines()
+        if not lines:
+            return
+        width = 7 * max(len(line) for line in lines) + 10
+        height = 14 * len(lines) + 10
+        self.canvas.create_rectangle(5, 5, 5 + width, 5 + height, fill="white", outline="gray", tags="stats")
+        self.canvas.create_text(10, 10, text="\n".join(lines), anchor=tk.NW,
+                                font=('Courier', 9), fill="black", tags="stats")
+    
+    def toggle_recording(self):
+        """Record the session from a fresh copy of the current level until pressed again"""
+        if self.recorder is None:
+            if self.replayer is not None:
+                self.toggle_replay()
+            self.recorder = SessionRecorder(self.fleet_manager, self.record_path)
+            self.commands = self.recorder
+            self.selected_robot = None
+            self.selected_vertex = None
+            self.record_button.config(text="Stop Recording")
+            self.redraw()
+            self.update_robot_info()
+        else:
+            self.recorder.close()
+            self.recorder = None
+            self.commands = self.fleet_manager
+            self.record_button.config(text="Record")
+            messagebox.showinfo("Recording", f"Session saved to {self.record_path}")
+    
+    def toggle_replay(self):
+        """Load a recorded session and play it back on the canvas, or leave replay mode"""
+        if self.replayer is not None:
+            self.replayer = None
+            self.replay_button.config(text="Replay")
+            self.redraw()
+            return
+        if self.recorder is not None:
+            self.toggle_recording()
+        path = filedialog.askopenfilename(initialdir='src/logs', title="Open session",
+                                          filetypes=[("Fleet sessions", "*.rec"), ("All files", "*.*")])
+        if not path:
+            return
+        try:
+            self.replayer = SessionReplayer(path)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Error", f"Failed to load session: {str(e)}")
+            return
+        if self.replayer.level is not None and self.replayer.level != self.nav_graph.current_level:
+            self.nav_graph.load_level(self.replayer.level)
+            self.fleet_manager.reset_for_new_level()
+            self.level_var.set(self.replayer.level)
+        self.replay_tick = 0
+        self.replay_scale.config(to=max(1, self.replayer.last_tick))
+        self.replay_button.config(text="Stop Replay")
+        self.redraw()
+    
+    def seek_replay(self, value):
+        if self.replayer is not None and not self._advancing_replay:
+            self.replay_tick = int(float(value))
+            self.draw_replay()
+    
+    def draw_replay(self):
+        """Draw the recorded robots at replay_tick instead of the live fleet"""
+        min_x, min_y, max_x, max_y = self.visible_box()
+        self.draw_robot_markers([(robot.id, robot.x, robot.y, STATUS_COLORS.get(robot.status, IDLE_COLOR))
+                                 for robot in self.replayer.state_at(self.replay_tick).values()
+                                 if min_x <= robot.x <= max_x and min_y <= robot.y <= max_y])
+        self.robot_info_text.delete(1.0, tk.END)
+        self.robot_info_text.insert(tk.END, f"Replay tick {self.replay_tick} / {self.replayer.last_tick}")
+    
     def toggle_animation(self):
         self.animation_running = not self.animation_running
         if self.animation_running:
@@ -635,6 +1075,7 @@ class FleetGUI:
         try:
             with open('src/logs/fleet_logs.txt', 'w') as f:
                 pass
+            self.recent_events.clear()
             self.log_text.delete(1.0, tk.END)
         except Exception as e:
             messagebox.showerror("Error", f"Failed to clear logs: {str(e)}")
@@ -658,14 +1099,19 @@ class FleetGUI:
         info_str += f"Destination: {robot_info['destination'] if robot_info['destination'] is not None else 'None'}\n"
         self.robot_info_text.insert(tk.END, info_str)
     
+    def on_fleet_event(self, event: RobotEvent):
+        self.recent_events.append(event)
+        self.log_dirty = True
+    
     def update_log(self):
-        try:
-            with open('src/logs/fleet_logs.txt', 'r') as f:
-                logs = f.readlines()
-                self.log_text.delete(1.0, tk.END)
-                self.log_text.insert(tk.END, "".join(logs[-50:]))
-        except FileNotFoundError:
-            pass
+        """Refresh the log panel from the event bus, only when new events arrived"""
+        if not self.log_dirty:
+            return
+        lines = [f"{time.strftime('%H:%M:%S', time.localtime(e.timestamp))} - {e}\n"
+                 for e in self.recent_events]
+        self.log_text.delete(1.0, tk.END)
+        self.log_text.insert(tk.END, "".join(lines))
+        self.log_dirty = False
     
     def show_conflict(self, message):
         """Show a conflict notification that disappears after a few seconds"""
@@ -679,17 +1125,34 @@ class FleetGUI:
             self.conflict_label.config(text="")
     
     def update(self):
-        if self.animation_running:
-            self.fleet_manager.update()
+        if self.animation_running and self.replayer is not None:
+            if self.replay_tick < self.replayer.last_tick:
+                self.replay_tick += 1
+                # Scale.set() calls seek_replay; the frame is drawn once below instead
+                self._advancing_replay = True
+                try:
+                    self.replay_scale.set(self.replay_tick)
+                finally:
+                    self._advancing_replay = False
             self.draw_nav_graph()
-            self.draw_robots()
-            self.update_robot_info()
-            self.update_log()
+            self.draw_replay()
+            self.root.after(int(self.update_interval / self.animation_speed), self.update)
+        elif self.animation_running:
+            with self.profiler.phase('frame'):
+                self.commands.update()
+                with self.profiler.phase('rendering'):
+                    self.draw_nav_graph()
+                    self.draw_robots()
+                    self.draw_stats()
+                with self.profiler.phase('robot_info'):
+                    self.update_robot_info()
+                with self.profiler.phase('log_panel'):
+                    self.update_log()
             
             # Show any new conflicts
             conflicts = self.fleet_manager.get_conflicts()
             if conflicts and time.time() - self.last_conflict_time > self.conflict_display_time:
-                self.show_conflict(conflicts[-1])
+                self.show_conflict(str(conflicts[-1]))
             
             delay = int(self.update_interval / self.animation_speed)
             self.root.after(delay, self.update)
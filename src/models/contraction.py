@@ -0,0 +1,219 @@
+import hashlib
+import heapq
+import json
+import struct
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+
+MAGIC = b'FLEETCH1'
+WITNESS_SETTLE_LIMIT = 60  # Vertices a witness search may settle before a shortcut is added anyway
+
+def level_signature(level_data: dict) -> bytes:
+    """Fingerprint of a level's vertices and lanes; a stored hierarchy must match it"""
+    lanes = sorted((min(a, b), max(a, b)) for a, b, _ in level_data['lanes'])
+    payload = json.dumps([len(level_data['vertices']), lanes]).encode()
+    return hashlib.sha1(payload).digest()
+
+class ContractionHierarchy:
+    """Contraction hierarchy over a level's lanes, for fast exact shortest paths.
+
+    Preprocessing contracts the vertices one by one, least important first,
+    adding shortcut lanes so that distances between the remaining vertices
+    don't change. A query then only searches upwards in that order from both
+    ends, which settles a few hundred vertices even on very large maps, and
+    unpacks the shortcuts back into the lane-by-lane path.
+    """
+    def __init__(self, rank: array, offsets: array, targets: array, costs: array, middles: array,
+                 signature: bytes = b''):
+        self.rank = rank
+        # Upward lanes and shortcuts in CSR form; middles[i] is the contracted vertex of a shortcut, -1 for a lane
+        self.offsets = offsets
+        self.targets = targets
+        self.costs = costs
+        self.middles = middles
+        self.signature = signature
+        self._middle: Dict[Tuple[int, int], int] = {}
+        for source in range(len(rank)):
+            for i in range(offsets[source], offsets[source + 1]):
+                if middles[i] >= 0:
+                    self._middle[(source, targets[i])] = middles[i]
+
+    @classmethod
+    def build(cls, vertex_count: int, lanes: Iterable[Tuple[int, int, float]],
+              signature: bytes = b'') -> 'ContractionHierarchy':
+        adjacency: List[Dict[int, float]] = [{} for _ in range(vertex_count)]
+        for a, b, cost in lanes:
+            if a != b and cost < adjacency[a].get(b, float('inf')):
+                adjacency[a][b] = cost
+                adjacency[b][a] = cost
+        middle: Dict[Tuple[int, int], int] = {}
+        contracted = [False] * vertex_count
+        deleted_neighbours = [0] * vertex_count
+
+        def shortcuts_for(vertex: int) -> List[Tuple[int, int, float]]:
+            neighbours = [(n, c) for n, c in adjacency[vertex].items() if not contracted[n]]
+            needed = []
+            for i, (u, cost_u) in enumerate(neighbours):
+                targets = {w: cost_u + cost_w for w, cost_w in neighbours[i + 1:]}
+                if not targets:
+                    continue
+                reached = cls._witness_search(adjacency, contracted, u, vertex, targets)
+                needed.extend((u, w, cost) for w, cost in targets.items() if reached.get(w, float('inf')) > cost)
+            return needed
+
+        def priority(vertex: int) -> int:
+            degree = sum(1 for n in adjacency[vertex] if not contracted[n])
+            return len(shortcuts_for(vertex)) - degree + deleted_neighbours[vertex]
+
+        heap = [(priority(v), v) for v in range(vertex_count)]
+        heapq.heapify(heap)
+        rank = array('i', [0] * vertex_count)
+        order = 0
+        while heap:
+            _, vertex = heapq.heappop(heap)
+            # Priorities go stale as neighbours are contracted; recheck before committing
+            current = priority(vertex)
+            if heap and current > heap[0][0]:
+                heapq.heappush(heap, (current, vertex))
+                continue
+            for u, w, cost in shortcuts_for(vertex):
+                if cost < adjacency[u].get(w, float('inf')):
+                    adjacency[u][w] = cost
+                    adjacency[w][u] = cost
+                    middle[(u, w)] = middle[(w, u)] = vertex
+            contracted[vertex] = True
+            rank[vertex] = order
+            order += 1
+            for n in adjacency[vertex]:
+                deleted_neighbours[n] += 1
+
+        offsets = array('i', [0])
+        targets = array('i')
+        costs = array('d')
+        middles = array('i')
+        for source in range(vertex_count):
+            for target, cost in sorted(adjacency[source].items()):
+                if rank[target] > rank[source]:
+                    targets.append(target)
+                    costs.append(cost)
+                    middles.append(middle.get((source, target), -1))
+            offsets.append(len(targets))
+        return cls(rank, offsets, targets, costs, middles, signature)
+
+    @staticmethod
+    def _witness_search(adjacency: List[Dict[int, float]], contracted: List[bool], source: int,
+                        skip: int, targets: Dict[int, float]) -> Dict[int, float]:
+        """Distances from source to the targets that avoid skip, within the largest target cost"""
+        limit = max(targets.values())
+        dist = {source: 0.0}
+        heap = [(0.0, source)]
+        remaining = set(targets)
+        settled = 0
+        while heap and remaining and settled < WITNESS_SETTLE_LIMIT:
+            d, current = heapq.heappop(heap)
+            if d > dist[current]:
+                continue
+            if d > limit:
+                break
+            remaining.discard(current)
+            settled += 1
+            for neighbor, cost in adjacency[current].items():
+                if neighbor == skip or contracted[neighbor]:
+                    continue
+                new_dist = d + cost
+                if new_dist < dist.get(neighbor, float('inf')):
+                    dist[neighbor] = new_dist
+                    heapq.heappush(heap, (new_dist, neighbor))
+        return dist
+
+    def shortest_path(self, start_idx: int, end_idx: int) -> List[int]:
+        """Vertex path from start to end, [] if unreachable"""
+        if start_idx == end_idx:
+            return [start_idx]
+        offsets, targets, costs = self.offsets, self.targets, self.costs
+        dists = ({start_idx: 0.0}, {end_idx: 0.0})
+        previous = ({start_idx: -1}, {end_idx: -1})
+        heaps = ([(0.0, start_idx)], [(0.0, end_idx)])
+        best = float('inf')
+        meeting = -1
+        side = 0
+        while heaps[0] or heaps[1]:
+            # Alternate directions; a direction is done once its closest vertex is past the best meeting
+            if not heaps[side] or heaps[side][0][0] >= best:
+                side = 1 - side
+                if not heaps[side] or heaps[side][0][0] >= best:
+                    break
+            d, current = heapq.heappop(heaps[side])
+            dist = dists[side]
+            if d > dist[current]:
+                continue
+            other = dists[1 - side].get(current)
+            if other is not None and d + other < best:
+                best = d + other
+                meeting = current
+            for i in range(offsets[current], offsets[current + 1]):
+                neighbor = targets[i]
+                new_dist = d + costs[i]
+                if new_dist < dist.get(neighbor, float('inf')):
+                    dist[neighbor] = new_dist
+                    previous[side][neighbor] = current
+                    heapq.heappush(heaps[side], (new_dist, neighbor))
+            side = 1 - side
+        if meeting < 0:
+            return []
+
+        up = [meeting]
+        while previous[0][up[-1]] != -1:
+            up.append(previous[0][up[-1]])
+        up.reverse()
+        down = [meeting]
+        while previous[1][down[-1]] != -1:
+            down.append(previous[1][down[-1]])
+        route = up + down[1:]
+        path = [route[0]]
+        for a, b in zip(route, route[1:]):
+            self._unpack(a, b, path)
+        return path
+
+    def _unpack(self, a: int, b: int, path: List[int]):
+        """Append the lanes a shortcut from a to b stands for, without a"""
+        stack = [(a, b)]
+        while stack:
+            a, b = stack.pop()
+            low, high = (a, b) if self.rank[a] < self.rank[b] else (b, a)
+            middle = self._middle.get((low, high), -1)
+            if middle < 0:
+                path.append(b)
+            else:
+                # Pushed in reverse so a -> middle is expanded first
+                stack.append((middle, b))
+                stack.append((a, middle))
+
+    def save(self, path: str):
+        with open(path, 'wb') as f:
+            f.write(MAGIC + struct.pack('<II', len(self.rank), len(self.targets)))
+            f.write(struct.pack('<B', len(self.signature)) + self.signature)
+            for values in (self.rank, self.offsets, self.targets, self.costs, self.middles):
+                values.tofile(f)
+
+    @classmethod
+    def load(cls, path: str, signature: Optional[bytes] = None) -> Optional['ContractionHierarchy']:
+        """Read a saved hierarchy; None if it is missing or was built for a different level"""
+        try:
+            with open(path, 'rb') as f:
+                if f.read(len(MAGIC)) != MAGIC:
+                    return None
+                vertex_count, edge_count = struct.unpack('<II', f.read(8))
+                (length,) = struct.unpack('<B', f.read(1))
+                stored = f.read(length)
+                if signature is not None and stored != signature:
+                    return None
+                arrays = []
+                for typecode, count in (('i', vertex_count), ('i', vertex_count + 1), ('i', edge_count),
+                                        ('d', edge_count), ('i', edge_count)):
+                    values = array(typecode)
+                    values.fromfile(f, count)
+                    arrays.append(values)
+        except (OSError, EOFError, struct.error):
+            return None
+        return cls(*arrays, signature=stored)
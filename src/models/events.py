@@ -0,0 +1,93 @@
+from enum import Enum, auto
+from typing import Callable, Dict, List, Optional
+import time
+
+class EventType(Enum):
+    SPAWNED = auto()
+    TASK_ASSIGNED = auto()
+    TASK_CANCELLED = auto()
+    STOP_REACHED = auto()
+    ARRIVED = auto()
+    WAITING = auto()
+    GAVE_UP = auto()
+    LOW_BATTERY = auto()
+    INSUFFICIENT_BATTERY = auto()
+    UNREACHABLE = auto()
+    REROUTE_FAILED = auto()
+    CHARGER_QUEUED = auto()
+    CHARGING_STARTED = auto()
+    CHARGING_FINISHED = auto()
+    CONFLICT = auto()
+    NEAR_MISS = auto()
+    INTERSECTION_CONFLICT = auto()
+    INTERSECTION_QUEUED = auto()
+    REPLANNED = auto()
+    NO_ROUTE = auto()
+    OFF_LEVEL = auto()
+
+# Message templates are only filled in when an event is actually rendered
+_TEMPLATES: Dict[EventType, str] = {
+    EventType.SPAWNED: "Spawned robot {robot_id} at vertex {vertex} ({name})",
+    EventType.TASK_ASSIGNED: "Robot {robot_id} assigned task to vertex {vertex}",
+    EventType.TASK_CANCELLED: "Robot {robot_id} task cancelled, stopping at vertex {vertex}",
+    EventType.STOP_REACHED: "Robot {robot_id} reached stop at vertex {vertex}",
+    EventType.ARRIVED: "Robot {robot_id} completed task at vertex {vertex}",
+    EventType.WAITING: "Robot {robot_id} waiting at lane {lane}",
+    EventType.GAVE_UP: "Robot {robot_id} gave up waiting",
+    EventType.LOW_BATTERY: "Robot {robot_id} low battery, rerouting to charger at vertex {vertex}",
+    EventType.INSUFFICIENT_BATTERY: "Robot {robot_id} rejected task to vertex {vertex}: needs {needed:.1f}% battery, has {battery:.1f}%",
+    EventType.UNREACHABLE: "Robot {robot_id} rejected task to vertex {vertex}: no route from vertex {start}",
+    EventType.REROUTE_FAILED: "Robot {robot_id} failed to reroute to charger: {reason}",
+    EventType.CHARGER_QUEUED: "Robot {robot_id} queued at charger {vertex} (position {position})",
+    EventType.CHARGING_STARTED: "Robot {robot_id} started charging at vertex {vertex}",
+    EventType.CHARGING_FINISHED: "Robot {robot_id} finished charging",
+    EventType.CONFLICT: "Robot {robot_id} waiting for Robot {other_id} on lane {lane}",
+    EventType.NEAR_MISS: "Robot {robot_id} yielding to Robot {other_id}, {distance:.2f} apart",
+    EventType.INTERSECTION_CONFLICT: "Robot {robot_id} yielding to Robot {other_id} at vertex {vertex}",
+    EventType.INTERSECTION_QUEUED: "Robot {robot_id} queued at intersection {vertex} (position {position})",
+    EventType.REPLANNED: "Robot {robot_id} replanned after lane {lane} changed, {hops} lanes to vertex {vertex}",
+    EventType.NO_ROUTE: "Robot {robot_id} has no route to vertex {vertex} while lane {lane} is unavailable",
+    EventType.OFF_LEVEL: "Robot {robot_id} stopped: vertex {vertex} is not on level {level}",
+}
+
+class RobotEvent:
+    """Typed event record; the human readable message is built lazily"""
+    __slots__ = ('type', 'robot_id', 'timestamp', 'data')
+
+    def __init__(self, event_type: EventType, robot_id: int, **data):
+        self.type = event_type
+        self.robot_id = robot_id
+        self.timestamp = time.time()
+        self.data = data
+
+    @property
+    def message(self) -> str:
+        return _TEMPLATES[self.type].format(robot_id=self.robot_id, **self.data)
+
+    def __str__(self) -> str:
+        return self.message
+
+    def __repr__(self) -> str:
+        return f"RobotEvent({self.type.name}, robot={self.robot_id}, {self.data})"
+
+Subscriber = Callable[[RobotEvent], None]
+
+class EventBus:
+    """Synchronous publish/subscribe bus for robot events"""
+    def __init__(self):
+        self._subscribers: List[tuple] = []  # (subscriber, event types or None for all)
+
+    def subscribe(self, subscriber: Subscriber, event_types: Optional[List[EventType]] = None):
+        types = frozenset(event_types) if event_types else None
+        self._subscribers.append((subscriber, types))
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self._subscribers = [(s, t) for s, t in self._subscribers if s != subscriber]
+
+    def publish(self, event: RobotEvent):
+        for subscriber, types in self._subscribers:
+            if types is None or event.type in types:
+                subscriber(event)
+
+    def has_subscribers(self) -> bool:
+        return bool(self._subscribers)
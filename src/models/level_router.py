@@ -0,0 +1,154 @@
+import heapq
+from typing import Dict, List, Optional, Tuple
+from src.models.nav_graph import NavGraph, CompactGraph, _paths_from
+
+DEFAULT_CONNECTOR_COST = 5.0  # Cost of a lift ride, in lanes, when no vertex on it sets one
+
+Node = Tuple[str, int]  # (level, vertex_idx)
+Route = List[Tuple[str, List[int]]]  # Per-level vertex paths, with a connector ride between each two
+
+class LevelRouter:
+    """Routes between levels through connector vertices (lifts, ramps).
+
+    A vertex joins a connector by carrying "connector": "<id>" in its
+    attributes, and may set "connector_cost"; vertices sharing an id are
+    linked across levels. A route is first searched on a small abstract
+    graph of connector vertices, whose edges are rides between levels and
+    the distances between connectors on one level. Each level's part is then
+    refined into a lane path. Paths between connectors are cached per level
+    until that level's lanes change.
+    """
+    def __init__(self, graphs: Dict[str, NavGraph]):
+        self.graphs = graphs  # level: NavGraph with that level loaded
+        self.connectors: Dict[str, List[Node]] = {}  # connector id: its vertices on every level
+        self.level_connectors: Dict[str, List[int]] = {}  # level: its connector vertices
+        for level, nav_graph in graphs.items():
+            self.level_connectors[level] = []
+            for idx, vertex in enumerate(nav_graph.vertices):
+                if vertex.connector:
+                    self.connectors.setdefault(vertex.connector, []).append((level, idx))
+                    self.level_connectors[level].append(idx)
+        self._routes: Dict[Node, Dict[int, List[int]]] = {}  # connector node: paths to the level's connectors
+        self._seen: Dict[str, CompactGraph] = {}  # level: graph the cached paths were computed on
+
+    @staticmethod
+    def load_level_graph(levels: Dict[str, dict], level: str) -> NavGraph:
+        nav_graph = NavGraph()
+        nav_graph.levels = levels
+        nav_graph.current_level = level
+        nav_graph.load_level(level)
+        return nav_graph
+
+    @classmethod
+    def from_levels(cls, levels: Dict[str, dict]) -> 'LevelRouter':
+        return cls({level: cls.load_level_graph(levels, level) for level in levels})
+
+    @classmethod
+    def from_nav_graph(cls, nav_graph: NavGraph) -> 'LevelRouter':
+        """Router over all levels of a NavGraph; its loaded level keeps its closed lanes"""
+        return cls({level: nav_graph if level == nav_graph.current_level
+                    else cls.load_level_graph(nav_graph.levels, level)
+                    for level in nav_graph.levels})
+
+    def _graph(self, level: str) -> CompactGraph:
+        graph = self.graphs[level].compact_graph()
+        if self._seen.get(level) is not graph:
+            # Lanes were closed, reopened or re-weighted since the paths were cached
+            self._seen[level] = graph
+            for node in [node for node in self._routes if node[0] == level]:
+                del self._routes[node]
+        return graph
+
+    def _path_cost(self, level: str, path: List[int]) -> float:
+        if not path:
+            return float('inf')
+        lane_cost = self.graphs[level].lane_cost
+        return sum(lane_cost(a, b) for a, b in zip(path, path[1:]))
+
+    def _connector_paths(self, node: Node) -> Dict[int, List[int]]:
+        level, idx = node
+        graph = self._graph(level)
+        paths = self._routes.get(node)
+        if paths is None:
+            paths = self._routes[node] = _paths_from(graph, idx, self.level_connectors[level])
+        return paths
+
+    def _ride_cost(self, a: Node, b: Node) -> float:
+        costs = [self.graphs[level].vertices[idx].connector_cost for level, idx in (a, b)]
+        return max(costs) or DEFAULT_CONNECTOR_COST
+
+    def route(self, start: Node, goal: Node) -> Route:
+        """Shortest route from start to goal as [(level, path), ...]; [] if unreachable.
+
+        Consecutive parts are joined by a ride: the last vertex of one part
+        and the first of the next are the same connector on two levels.
+        """
+        start_level, start_idx = start
+        goal_level, goal_idx = goal
+        if start_level not in self.graphs or goal_level not in self.graphs:
+            return []
+        start_goals = list(self.level_connectors[start_level])
+        if start_level == goal_level:
+            start_goals.append(goal_idx)
+        from_start = _paths_from(self._graph(start_level), start_idx, start_goals)
+        # Lanes are undirected, so paths out of the goal reversed are paths into it
+        to_goal = _paths_from(self._graph(goal_level), goal_idx, self.level_connectors[goal_level])
+
+        best_cost = float('inf')
+        best: Optional[Route] = None
+        if start_level == goal_level and from_start[goal_idx]:
+            best_cost = self._path_cost(start_level, from_start[goal_idx])
+            best = [(start_level, from_start[goal_idx])]
+
+        # Dijkstra over connector vertices
+        dist: Dict[Node, float] = {}
+        previous: Dict[Node, Optional[Node]] = {}
+        heap = []
+        for idx in self.level_connectors[start_level]:
+            cost = self._path_cost(start_level, from_start[idx])
+            if cost < dist.get((start_level, idx), float('inf')):
+                dist[(start_level, idx)] = cost
+                previous[(start_level, idx)] = None
+                heapq.heappush(heap, (cost, (start_level, idx)))
+        goal_node = None
+        while heap:
+            d, node = heapq.heappop(heap)
+            if d > dist[node] or d >= best_cost:
+                continue
+            level, idx = node
+            if level == goal_level:
+                total = d + self._path_cost(goal_level, to_goal[idx])
+                if total < best_cost:
+                    best_cost = total
+                    goal_node = node
+                    best = None
+            neighbours = [((level, other), self._path_cost(level, path))
+                          for other, path in self._connector_paths(node).items() if other != idx]
+            neighbours.extend((peer, self._ride_cost(node, peer))
+                              for peer in self.connectors[self.graphs[level].vertices[idx].connector]
+                              if peer[0] != level)
+            for neighbor, cost in neighbours:
+                new_dist = d + cost
+                if new_dist < dist.get(neighbor, float('inf')):
+                    dist[neighbor] = new_dist
+                    previous[neighbor] = node
+                    heapq.heappush(heap, (new_dist, neighbor))
+
+        if best is not None or goal_node is None:
+            return best or []
+        nodes = [goal_node]
+        while previous[nodes[-1]] is not None:
+            nodes.append(previous[nodes[-1]])
+        nodes.reverse()
+        return self._refine(start, nodes, from_start, to_goal)
+
+    def _refine(self, start: Node, nodes: List[Node], from_start: Dict[int, List[int]], to_goal: Dict[int, List[int]]) -> Route:
+        """Expand the connector sequence into per-level lane paths"""
+        route: Route = [(start[0], list(from_start[nodes[0][1]]))]
+        for node, next_node in zip(nodes, nodes[1:]):
+            if next_node[0] == node[0]:
+                route[-1][1].extend(self._connector_paths(node)[next_node[1]][1:])
+            else:
+                route.append((next_node[0], [next_node[1]]))
+        route[-1][1].extend(list(reversed(to_goal[nodes[-1][1]]))[1:])
+        return route
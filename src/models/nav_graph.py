@@ -1,12 +1,75 @@
 import json
-from typing import Dict, List, Tuple, Optional
+import heapq
+import os
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Iterable, List, Set, Tuple, Optional
+from src.models.spatial_index import SpatialGrid
+from src.models.contraction import ContractionHierarchy, level_signature
+from src.utlis.profiler import TickProfiler
+
+DISTANCE_CACHE_SIZE = 256  # Max number of cached single-source distance lists
+PARALLEL_MIN_BATCH = 64  # Smaller find_paths batches are solved in the calling process
+
+# Open lanes in CSR form: neighbours of v are targets[offsets[v]:offsets[v + 1]]
+CompactGraph = Tuple[array, array, array]  # (offsets, targets, costs)
+
+def _paths_from(graph: CompactGraph, source: int, goals: List[int]) -> Dict[int, List[int]]:
+    """Dijkstra from one source, stopping once every goal is settled"""
+    offsets, targets, costs = graph
+    dist = {source: 0.0}
+    previous: Dict[int, int] = {}
+    remaining = set(goals)
+    heap = [(0.0, source)]
+    while heap and remaining:
+        d, current = heapq.heappop(heap)
+        if d > dist[current]:
+            continue
+        remaining.discard(current)
+        for i in range(offsets[current], offsets[current + 1]):
+            neighbor = targets[i]
+            new_dist = d + costs[i]
+            if new_dist < dist.get(neighbor, float('inf')):
+                dist[neighbor] = new_dist
+                previous[neighbor] = current
+                heapq.heappush(heap, (new_dist, neighbor))
+    
+    paths = {}
+    for goal in goals:
+        if goal not in dist:
+            paths[goal] = []
+            continue
+        path = [goal]
+        while path[-1] != source:
+            path.append(previous[path[-1]])
+        path.reverse()
+        paths[goal] = path
+    return paths
+
+_worker_graph: Optional[CompactGraph] = None
+
+def _init_worker(graph: CompactGraph):
+    # Each worker receives the compact arrays once, not with every chunk
+    global _worker_graph
+    _worker_graph = graph
+
+def _solve_chunk(chunk: List[Tuple[int, List[int]]]) -> List[Dict[int, List[int]]]:
+    return [_paths_from(_worker_graph, source, goals) for source, goals in chunk]
 
 class Vertex:
-    def __init__(self, x: float, y: float, name: str = "", is_charger: bool = False):
+    def __init__(self, x: float, y: float, name: str = "", is_charger: bool = False,
+                 charger_capacity: int = 1, charge_rate: float = 1.0,
+                 connector: Optional[str] = None, connector_cost: float = 0.0):
         self.x = x
         self.y = y
         self.name = name
         self.is_charger = is_charger
+        self.charger_capacity = charger_capacity  # Robots that can charge here at once
+        self.charge_rate = charge_rate  # Battery percent added per tick
+        self.connector = connector  # Lift or ramp id shared with vertices on other levels
+        self.connector_cost = connector_cost  # Cost of riding it, in lanes
 
 class Lane:
     def __init__(self, start_idx: int, end_idx: int, speed_limit: int = 0):
@@ -20,11 +83,33 @@ class NavGraph:
         self.lanes: List[Lane] = []
         self.levels: Dict[str, Dict[str, List]] = {}
         self.current_level = "level1"
+        self.adjacency: List[List[int]] = []
+        self.name_index: Dict[str, int] = {}
+        self.vertex_index = SpatialGrid()
+        # Hop distance to, and index of, the nearest charger for every vertex
+        self.charger_distance: List[float] = []
+        self.nearest_charger: List[Optional[int]] = []
+        self.components: List[int] = []  # Connected component label of every vertex over open lanes
+        self._charger_fields: Dict[str, Tuple[List[float], List[Optional[int]]]] = {}
+        self._distance_cache: Dict[int, List[float]] = {}
+        # Lanes closed by an operator are left out of the adjacency lists until reopened
+        self.lane_keys: Set[Tuple[int, int]] = set()
+        self.blocked_lanes: Set[Tuple[int, int]] = set()
+        self.lane_penalties: Dict[Tuple[int, int], float] = {}  # Extra cost of congested lanes
+        self._compact: Optional[CompactGraph] = None
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_graph: Optional[CompactGraph] = None  # Graph the pool's workers were started with
+        self._pool_workers = 0
+        self.profiler = TickProfiler(enabled=False)  # Replaced by the fleet manager's profiler
+        self.source_path: Optional[str] = None
+        self.hierarchies: Dict[str, ContractionHierarchy] = {}  # level: preprocessed routes, see prepare_contraction
+        self.topology_version = 0  # Bumped whenever the level or its open lanes change
         
     def load_from_json(self, file_path: str):
         with open(file_path, 'r') as f:
             data = json.load(f)
             self.levels = data['levels']
+            self.source_path = file_path
             self.load_level(self.current_level)
     
     def load_level(self, level_name: str):
@@ -40,33 +125,259 @@ class NavGraph:
             x, y, attributes = vertex_data
             name = attributes.get('name', '')
             is_charger = attributes.get('is_charger', False)
-            self.vertices.append(Vertex(x, y, name, is_charger))
+            self.vertices.append(Vertex(x, y, name, is_charger,
+                                        attributes.get('charger_capacity', 1),
+                                        attributes.get('charge_rate', 1.0),
+                                        attributes.get('connector'),
+                                        attributes.get('connector_cost', 0.0)))
         
         # Load lanes
         for lane_data in level_data['lanes']:
             start_idx, end_idx, attributes = lane_data
             speed_limit = attributes.get('speed_limit', 0)
             self.lanes.append(Lane(start_idx, end_idx, speed_limit))
+        
+        # Build adjacency lists once so neighbour lookups don't scan every lane
+        self.adjacency = [[] for _ in self.vertices]
+        for lane in self.lanes:
+            if lane.end_idx not in self.adjacency[lane.start_idx]:
+                self.adjacency[lane.start_idx].append(lane.end_idx)
+            if lane.start_idx not in self.adjacency[lane.end_idx]:
+                self.adjacency[lane.end_idx].append(lane.start_idx)
+        self.lane_keys = {self.lane_key(lane.start_idx, lane.end_idx) for lane in self.lanes}
+        self.blocked_lanes.clear()
+        self.lane_penalties.clear()
+        
+        self.name_index = {v.name: idx for idx, v in reversed(list(enumerate(self.vertices))) if v.name}
+        self.vertex_index = SpatialGrid.from_points((idx, v.x, v.y) for idx, v in enumerate(self.vertices))
+        
+        self.current_level = level_name
+        self.topology_version += 1
+        self._distance_cache.clear()
+        self._compact = None
+        self.components = self._label_components()
+        if level_name not in self._charger_fields:
+            self._charger_fields[level_name] = self._build_charger_field()
+        self.charger_distance, self.nearest_charger = self._charger_fields[level_name]
+    
+    def _build_charger_field(self) -> Tuple[List[float], List[Optional[int]]]:
+        """Multi-source BFS from all chargers at once"""
+        distances = [float('inf')] * len(self.vertices)
+        nearest: List[Optional[int]] = [None] * len(self.vertices)
+        queue = deque()
+        for idx, vertex in enumerate(self.vertices):
+            if vertex.is_charger:
+                distances[idx] = 0
+                nearest[idx] = idx
+                queue.append(idx)
+        while queue:
+            current = queue.popleft()
+            for neighbor in self.adjacency[current]:
+                if distances[neighbor] == float('inf'):
+                    distances[neighbor] = distances[current] + 1
+                    nearest[neighbor] = nearest[current]
+                    queue.append(neighbor)
+        return distances, nearest
+    
+    def _label_components(self) -> List[int]:
+        """BFS labelling; lanes run both ways, so connected components are also strongly connected"""
+        labels = [-1] * len(self.vertices)
+        label = 0
+        for root in range(len(self.vertices)):
+            if labels[root] >= 0:
+                continue
+            labels[root] = label
+            queue = deque([root])
+            while queue:
+                current = queue.popleft()
+                for neighbor in self.adjacency[current]:
+                    if labels[neighbor] < 0:
+                        labels[neighbor] = label
+                        queue.append(neighbor)
+            label += 1
+        return labels
+    
+    def is_reachable(self, start_idx: int, end_idx: int) -> bool:
+        """O(1) check whether any open route connects two vertices"""
+        return self.components[start_idx] == self.components[end_idx]
+    
+    def lint(self) -> Dict[str, list]:
+        """Problems in the loaded level's data that make parts of it unusable"""
+        degree = [0] * len(self.vertices)
+        seen = set()
+        directed = set()  # Maps list a lane once per direction; only a repeat in one direction is a duplicate
+        duplicates = []
+        self_loops = []
+        for lane in self.lanes:
+            key = self.lane_key(lane.start_idx, lane.end_idx)
+            if lane.start_idx == lane.end_idx:
+                self_loops.append(key)
+            elif (lane.start_idx, lane.end_idx) in directed:
+                duplicates.append(key)
+            else:
+                directed.add((lane.start_idx, lane.end_idx))
+                if key not in seen:
+                    seen.add(key)
+                    degree[lane.start_idx] += 1
+                    degree[lane.end_idx] += 1
+        sizes: Dict[int, int] = {}
+        charged = set()
+        for idx, label in enumerate(self.components):
+            sizes[label] = sizes.get(label, 0) + 1
+            if self.vertices[idx].is_charger:
+                charged.add(label)
+        return {
+            'components': sorted(sizes.values(), reverse=True),
+            'isolated_vertices': [idx for idx, d in enumerate(degree) if d == 0],
+            # Lanes leading to a vertex with no other lane; robots can only turn around there
+            'dead_end_lanes': sorted(key for key in seen if degree[key[0]] == 1 or degree[key[1]] == 1),
+            'duplicate_lanes': duplicates,
+            'self_loops': self_loops,
+            # Robots in these parts can never recharge
+            'vertices_without_charger': [idx for idx, label in enumerate(self.components)
+                                         if label not in charged and degree[idx] > 0],
+        }
+    
+    @staticmethod
+    def lane_key(start_idx: int, end_idx: int) -> Tuple[int, int]:
+        return (start_idx, end_idx) if start_idx <= end_idx else (end_idx, start_idx)
+    
+    def block_lane(self, start_idx: int, end_idx: int) -> bool:
+        """Close a lane in both directions; False if there is no such open lane"""
+        key = self.lane_key(start_idx, end_idx)
+        if key not in self.lane_keys or key in self.blocked_lanes:
+            return False
+        self.blocked_lanes.add(key)
+        self.adjacency[key[0]].remove(key[1])
+        self.adjacency[key[1]].remove(key[0])
+        self._topology_changed()
+        return True
+    
+    def unblock_lane(self, start_idx: int, end_idx: int) -> bool:
+        key = self.lane_key(start_idx, end_idx)
+        if key not in self.blocked_lanes:
+            return False
+        self.blocked_lanes.discard(key)
+        self.adjacency[key[0]].append(key[1])
+        self.adjacency[key[1]].append(key[0])
+        self._topology_changed()
+        return True
+    
+    def _topology_changed(self):
+        # Distances depend on which lanes are open, the cached level field is rebuilt on reload
+        self.topology_version += 1
+        self._distance_cache.clear()
+        self._compact = None
+        self.components = self._label_components()
+        self._charger_fields.pop(self.current_level, None)
+        self.charger_distance, self.nearest_charger = self._build_charger_field()
+    
+    def set_lane_penalty(self, start_idx: int, end_idx: int, penalty: float):
+        """Make a lane cost 1 + penalty for routing, 0 clears it"""
+        key = self.lane_key(start_idx, end_idx)
+        if penalty > 0:
+            self.lane_penalties[key] = penalty
+        else:
+            self.lane_penalties.pop(key, None)
+        self._compact = None
+    
+    def lane_cost(self, start_idx: int, end_idx: int) -> float:
+        key = self.lane_key(start_idx, end_idx)
+        if key in self.blocked_lanes:
+            return float('inf')
+        return 1 + self.lane_penalties.get(key, 0)
     
     def get_vertex_by_name(self, name: str) -> Optional[Vertex]:
-        for vertex in self.vertices:
-            if vertex.name == name:
-                return vertex
-        return None
+        idx = self.name_index.get(name)
+        return self.vertices[idx] if idx is not None else None
+    
+    def get_vertex_idx_by_name(self, name: str) -> Optional[int]:
+        return self.name_index.get(name)
+    
+    def nearest_vertex(self, x: float, y: float, max_distance: float = float('inf')) -> Optional[int]:
+        return self.vertex_index.nearest(x, y, max_distance)
+    
+    def vertices_in_radius(self, x: float, y: float, radius: float) -> List[int]:
+        return self.vertex_index.query_radius(x, y, radius)
+    
+    def vertices_in_box(self, min_x: float, min_y: float, max_x: float, max_y: float) -> List[int]:
+        return self.vertex_index.query_box(min_x, min_y, max_x, max_y)
     
     def get_adjacent_vertices(self, vertex_idx: int) -> List[int]:
-        adjacent = []
-        for lane in self.lanes:
-            if lane.start_idx == vertex_idx:
-                adjacent.append(lane.end_idx)
-            elif lane.end_idx == vertex_idx:
-                adjacent.append(lane.start_idx)
-        return adjacent
+        return self.adjacency[vertex_idx]
+    
+    def path_lengths_from(self, start_idx: int) -> List[float]:
+        """Hop count from start_idx to every vertex (inf if unreachable).
+
+        Results are cached until the next level load, so callers must not modify them.
+        """
+        if start_idx in self._distance_cache:
+            self.profiler.count('distance_cache_hits')
+            return self._distance_cache[start_idx]
+        self.profiler.count('distance_cache_misses')
+        distances = [float('inf')] * len(self.vertices)
+        distances[start_idx] = 0
+        queue = deque([start_idx])
+        while queue:
+            current = queue.popleft()
+            for neighbor in self.adjacency[current]:
+                if distances[neighbor] == float('inf'):
+                    distances[neighbor] = distances[current] + 1
+                    queue.append(neighbor)
+        if len(self._distance_cache) >= DISTANCE_CACHE_SIZE:
+            del self._distance_cache[next(iter(self._distance_cache))]
+        self._distance_cache[start_idx] = distances
+        return distances
+    
+    def route_hops(self, start_idx: int, stops: List[int]) -> float:
+        """Total hop count to visit the stops in order, starting from start_idx"""
+        hops = 0
+        current = start_idx
+        for stop in stops:
+            if not self.is_reachable(current, stop):
+                return float('inf')
+            hops += self.path_lengths_from(current)[stop]
+            current = stop
+        return hops
+    
+    def contraction_path(self, level_name: Optional[str] = None) -> Optional[str]:
+        """File a level's contraction hierarchy is stored in, next to the graph JSON"""
+        if self.source_path is None:
+            return None
+        base = self.source_path[:-5] if self.source_path.endswith('.json') else self.source_path
+        return f"{base}.{level_name or self.current_level}.ch"
+    
+    def prepare_contraction(self, level_name: Optional[str] = None, save: bool = True) -> ContractionHierarchy:
+        """Load a level's contraction hierarchy from disk, or build (and save) it.
+
+        Worth it for levels with many thousands of vertices, where building
+        takes a while but every route after that is found almost instantly.
+        """
+        level_name = level_name or self.current_level
+        level_data = self.levels[level_name]
+        signature = level_signature(level_data)
+        path = self.contraction_path(level_name)
+        hierarchy = ContractionHierarchy.load(path, signature) if path else None
+        if hierarchy is None:
+            lanes = ((start_idx, end_idx, 1.0) for start_idx, end_idx, _ in level_data['lanes'])
+            hierarchy = ContractionHierarchy.build(len(level_data['vertices']), lanes, signature)
+            if save and path:
+                hierarchy.save(path)
+        self.hierarchies[level_name] = hierarchy
+        return hierarchy
     
     def find_shortest_path(self, start_idx: int, end_idx: int) -> List[int]:
         """Find shortest path using Dijkstra's algorithm"""
+        self.profiler.count('routes_computed')
         if start_idx == end_idx:
             return [start_idx]
+        if not self.is_reachable(start_idx, end_idx):
+            return []
+        
+        # The hierarchy only knows the plain lanes, closed or congested ones need a full search
+        hierarchy = self.hierarchies.get(self.current_level)
+        if hierarchy is not None and not self.blocked_lanes and not self.lane_penalties:
+            return hierarchy.shortest_path(start_idx, end_idx)
         
         # Initialize distances and previous nodes
         distances = [float('inf')] * len(self.vertices)
@@ -86,7 +397,7 @@ class NavGraph:
             # Update distances for neighbors
             for neighbor in self.get_adjacent_vertices(current):
                 if neighbor in unvisited:
-                    new_dist = distances[current] + 1  # All edges have equal weight
+                    new_dist = distances[current] + self.lane_cost(current, neighbor)  # One per lane plus congestion
                     if new_dist < distances[neighbor]:
                         distances[neighbor] = new_dist
                         previous[neighbor] = current
@@ -100,4 +411,72 @@ class NavGraph:
         path.append(start_idx)
         path.reverse()
         
-        return path if distances[end_idx] != float('inf') else []
\ No newline at end of file
+        return path if distances[end_idx] != float('inf') else []
+    
+    def compact_graph(self) -> CompactGraph:
+        """Read-only CSR arrays of the open lanes and their costs, rebuilt after lane changes"""
+        if self._compact is None:
+            offsets = array('i', [0])
+            targets = array('i')
+            costs = array('d')
+            for idx, neighbours in enumerate(self.adjacency):
+                for neighbor in neighbours:
+                    targets.append(neighbor)
+                    costs.append(self.lane_cost(idx, neighbor))
+                offsets.append(len(targets))
+            self._compact = (offsets, targets, costs)
+        return self._compact
+    
+    def find_paths(self, pairs: Iterable[Tuple[int, int]], workers: Optional[int] = None) -> List[List[int]]:
+        """Shortest paths for many (start, end) pairs, in the order given.
+
+        Pairs are grouped by start so each start is searched once. Batches of
+        PARALLEL_MIN_BATCH pairs or more are spread over a process pool; smaller
+        ones, or workers=1, run in the calling process. Paths are the same as
+        find_shortest_path would give ([] if unreachable), though ties between
+        equally short paths may be broken differently.
+        """
+        pairs = list(pairs)
+        self.profiler.count('routes_computed', len(pairs))
+        by_source: Dict[int, List[int]] = {}
+        for start_idx, end_idx in pairs:
+            by_source.setdefault(start_idx, []).append(end_idx)
+        groups = list(by_source.items())
+        graph = self.compact_graph()
+        
+        workers = workers or os.cpu_count() or 1
+        results = None
+        if len(pairs) >= PARALLEL_MIN_BATCH and workers > 1 and len(groups) > 1:
+            # A few chunks per worker keeps them busy when some sources take longer
+            chunk_count = min(len(groups), workers * 4)
+            chunks = [groups[i::chunk_count] for i in range(chunk_count)]
+            try:
+                pool = self._get_pool(graph, workers)
+                results = {}
+                for chunk, chunk_paths in zip(chunks, pool.map(_solve_chunk, chunks)):
+                    for (source, _), paths in zip(chunk, chunk_paths):
+                        results[source] = paths
+            except (OSError, BrokenProcessPool):
+                # No usable pool on this machine, fall back to solving here
+                self.shutdown_pool()
+                results = None
+        if results is None:
+            results = {source: _paths_from(graph, source, goals) for source, goals in groups}
+        
+        # Copies, since robots consume their path as they drive it
+        return [list(results[start_idx][end_idx]) for start_idx, end_idx in pairs]
+    
+    def _get_pool(self, graph: CompactGraph, workers: int) -> ProcessPoolExecutor:
+        if self._pool is not None and (self._pool_graph is not graph or self._pool_workers != workers):
+            self.shutdown_pool()
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(graph,))
+            self._pool_graph = graph
+            self._pool_workers = workers
+        return self._pool
+    
+    def shutdown_pool(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+            self._pool_graph = None
@@ -1,16 +1,47 @@
 from enum import Enum, auto
 from typing import List, Optional
 import time
-import random
+from src.models.events import EventBus, EventType, RobotEvent
+from src.utlis.helpers import interpolate_position
+
+LOW_BATTERY = 20  # Robots head to a charger below this level
+BATTERY_DRAIN = 0.1  # Battery used per tick while moving
+ENERGY_RESERVE = 5  # Battery that must be left after reaching a charger
+CHARGED = 95  # Charging stops at this level
 
 class RobotStatus(Enum):
     IDLE = auto()
     MOVING = auto()
     WAITING = auto()
     CHARGING = auto()
+    QUEUED = auto()  # Waiting for a free slot at a charger
     TASK_COMPLETE = auto()
 
+def robot_color(robot_id: int) -> str:
+    """Consistent color for a robot id, mixed from the id alone so no RNG is needed"""
+    h = (robot_id * 0x9E3779B1) & 0xFFFFFFFF
+    h ^= h >> 15
+    h = (h * 0x85EBCA6B) & 0xFFFFFFFF
+    h ^= h >> 13
+    return "#{:06x}".format(h & 0xFFFFFF)
+
+# Fields of robot_state's tuple, as named in streamed and merged robot states
+STATE_FIELDS = ('x', 'y', 'status', 'battery', 'current_vertex', 'destination')
+
+def robot_state(robot) -> tuple:
+    """Compact state for change detection across processes and clients.
+
+    Rounded so that sub-millimetre jitter doesn't count as a change.
+    """
+    return (round(robot.x, 3), round(robot.y, 3), robot.status.name, round(robot.battery, 2),
+            robot.current_vertex_idx, robot.destination_vertex_idx)
+
 class Robot:
+    # Fleets can hold many thousands of robots; slots drop the per-instance dict
+    __slots__ = ('id', 'x', 'y', 'status', 'current_vertex_idx', 'destination_vertex_idx', '_route', '_cursor',
+                 'legs', 'progress', 'current_lane', '_lane_ends', 'bus', 'battery', 'speed',
+                 'seeking_charger', 'charger_unreachable', 'charging_manager')
+    
     def __init__(self, robot_id: int, x: float, y: float):
         self.id = robot_id
         self.x = x
@@ -18,56 +49,153 @@ class Robot:
         self.status = RobotStatus.IDLE
         self.current_vertex_idx: Optional[int] = None
         self.destination_vertex_idx: Optional[int] = None
-        self.path: List[int] = []
+        # The route is read through a cursor instead of popping its head at every vertex
+        self._route: List[int] = []
+        self._cursor = 0
+        # Remaining stops as [destination_idx, planned path or None]; a handful at most, and an
+        # empty list is a tenth the size of an empty deque
+        self.legs: List[list] = []
         self.progress = 0.0  # Progress along current lane (0 to 1)
         self.current_lane: Optional[tuple] = None
-        self.color = self._generate_color()
-        self.log = []
+        self._lane_ends: tuple = (None, None, None)  # current_lane it was looked up for, its start and end Vertex
+        self.bus: Optional[EventBus] = None
         self.battery = 100
         self.speed = 0.05  # Movement speed (progress per update)
-        
-    def _generate_color(self):
-        # Generate a random but consistent color based on robot ID
-        random.seed(self.id)
-        return "#{:06x}".format(random.randint(0, 0xFFFFFF))
+        self.seeking_charger = False
+        self.charger_unreachable = False  # Last charger search failed; not retried until the task or map changes
+        self.charging_manager = None  # Picks chargers by wait + travel time when set
+    
+    @property
+    def color(self) -> str:
+        return robot_color(self.id)
+    
+    @property
+    def path(self) -> List[int]:
+        """Vertices still ahead on this leg, starting with the end of the current lane"""
+        return self._route[self._cursor:]
+    
+    @path.setter
+    def path(self, path: List[int]):
+        self._route = path
+        self._cursor = 0
+    
+    def _lane_vertices(self, nav_graph) -> tuple:
+        """Start and end Vertex of current_lane, looked up again only when the lane changes"""
+        if self._lane_ends[0] is not self.current_lane:
+            start_idx, end_idx = self.current_lane
+            self._lane_ends = (self.current_lane, nav_graph.vertices[start_idx], nav_graph.vertices[end_idx])
+        return self._lane_ends[1], self._lane_ends[2]
+    
+    def __hash__(self):
+        # Robots are kept in sets (e.g. charger slots); hashing by id instead of
+        # memory address keeps their iteration order the same from run to run
+        return self.id
+    
+    def emit(self, event_type: EventType, **data):
+        if self.bus is not None:
+            self.bus.publish(RobotEvent(event_type, self.id, **data))
     
     def assign_task(self, destination_idx: int, nav_graph):
-        if self.status == RobotStatus.CHARGING:
+        return self.assign_sequence([destination_idx], nav_graph)
+    
+    def assign_sequence(self, destinations: List[int], nav_graph, path: Optional[List[int]] = None):
+        """Visit several stops in order (e.g. pick -> drop -> park) without stopping in between.
+
+        path is the route to the first stop if the caller already planned it.
+        """
+        # Robots at a charger hold a slot or a queue place until they are charged
+        if self.status in (RobotStatus.CHARGING, RobotStatus.QUEUED):
             return False
         
-        if self.current_vertex_idx is None:
+        if self.current_vertex_idx is None or not destinations:
             return False
             
-        self.destination_vertex_idx = destination_idx
-        self.path = nav_graph.find_shortest_path(self.current_vertex_idx, destination_idx)
+        if path is None:
+            path = nav_graph.find_shortest_path(self.current_vertex_idx, destinations[0])
         
-        if not self.path:
+        if not path:
             return False
             
+        self.destination_vertex_idx = destinations[0]
+        self.seeking_charger = False
+        self.charger_unreachable = False
+        self.path = path
+        # Later legs are planned while the first one is driven, see _plan_next_leg
+        self.legs = [[destination_idx, None] for destination_idx in destinations[1:]]
         self.status = RobotStatus.MOVING
+        self.emit(EventType.TASK_ASSIGNED, vertex=destinations[-1])
         self._move_to_next_vertex(nav_graph)
-        self.log.append(f"Robot {self.id} assigned task to vertex {destination_idx}")
+        return True
+    
+    def _plan_next_leg(self, nav_graph):
+        """Compute the route of the first leg that has not been planned yet"""
+        previous = self.destination_vertex_idx
+        for leg in self.legs:
+            if leg[1] is None:
+                leg[1] = nav_graph.find_shortest_path(previous, leg[0])
+                return
+            previous = leg[0]
+    
+    def _start_next_leg(self, nav_graph):
+        self.emit(EventType.STOP_REACHED, vertex=self.current_vertex_idx)
+        destination_idx, path = self.legs.pop(0)
+        if path is None:
+            path = nav_graph.find_shortest_path(self.current_vertex_idx, destination_idx)
+        self.destination_vertex_idx = destination_idx
+        self.path = path
+    
+    def is_committed(self) -> bool:
+        """Whether the robot has started driving down its current lane"""
+        return bool(self.current_lane) and self.progress > 0
+    
+    def remaining_route(self) -> List[int]:
+        """Vertices still to visit on this leg, starting where the route can still change"""
+        if self.current_lane and not self.is_committed():
+            return [self.current_lane[0]] + self.path
+        return self.path
+    
+    def reroute(self, path: List[int]):
+        """Replace the rest of this leg; path starts at the vertex remaining_route starts at"""
+        if not self.is_committed():
+            # Not in the lane yet, so the next lane is picked again from the new path
+            self.current_lane = None
+        self.path = path
+    
+    def cancel(self) -> bool:
+        """Drop the current task. A robot already driving down a lane stops at its end."""
+        if self.status not in (RobotStatus.MOVING, RobotStatus.WAITING) or self.seeking_charger:
+            return False
+        self.legs.clear()
+        if self.is_committed():
+            self.path = [self._route[self._cursor]]
+            self.destination_vertex_idx = self.path[0]
+        else:
+            self.current_lane = None
+            self.progress = 0.0
+            self.path = []
+            self.destination_vertex_idx = None
+            self.status = RobotStatus.IDLE
+        self.emit(EventType.TASK_CANCELLED, vertex=self.path[0] if self.path else self.current_vertex_idx)
         return True
     
     def _move_to_next_vertex(self, nav_graph):
-        if len(self.path) < 2:
+        while len(self._route) - self._cursor < 2 and self.legs:
+            self._start_next_leg(nav_graph)
+        
+        if len(self._route) - self._cursor < 2:
             self.status = RobotStatus.TASK_COMPLETE
             self.destination_vertex_idx = None
+            self.emit(EventType.ARRIVED, vertex=self.current_vertex_idx)
             return
             
-        start_idx = self.path[0]
-        end_idx = self.path[1]
-        
-        # Find the lane that connects these vertices
-        for lane in nav_graph.lanes:
-            if (lane.start_idx == start_idx and lane.end_idx == end_idx) or \
-               (lane.end_idx == start_idx and lane.start_idx == end_idx):
-                self.current_lane = (start_idx, end_idx)
-                break
+        # Consecutive path vertices are always joined by a lane, the planner only walks lanes
+        start_idx = self._route[self._cursor]
+        end_idx = self._route[self._cursor + 1]
+        self.current_lane = (start_idx, end_idx)
         
         self.progress = 0.0
         self.current_vertex_idx = start_idx
-        self.path.pop(0)
+        self._cursor += 1
     
     def update_position(self, nav_graph):
         if self.status != RobotStatus.MOVING:
@@ -77,9 +205,8 @@ class Robot:
             self._move_to_next_vertex(nav_graph)
             return
             
-        start_idx, end_idx = self.current_lane
-        start_vertex = nav_graph.vertices[start_idx]
-        end_vertex = nav_graph.vertices[end_idx]
+        end_idx = self.current_lane[1]
+        start_vertex, end_vertex = self._lane_vertices(nav_graph)
         
         self.progress += self.speed
         if self.progress >= 1.0:
@@ -89,36 +216,79 @@ class Robot:
             self.y = end_vertex.y
             
             if end_vertex.is_charger and self.battery < 50:
-                self.status = RobotStatus.CHARGING
-                self.log.append(f"Robot {self.id} started charging at vertex {end_idx}")
-            elif not self.path:
-                self.status = RobotStatus.TASK_COMPLETE
-                self.log.append(f"Robot {self.id} completed task at vertex {end_idx}")
+                self.start_charging(end_idx)
+            elif self.battery < LOW_BATTERY and not self.seeking_charger and not self.charger_unreachable:
+                # On failure the robot carries on with its task
+                if not self.seek_charger(nav_graph):
+                    self._finish_lane(nav_graph)
             else:
-                self._move_to_next_vertex(nav_graph)
+                self._finish_lane(nav_graph)
         else:
-            # Interpolate position
-            self.x = start_vertex.x + (end_vertex.x - start_vertex.x) * self.progress
-            self.y = start_vertex.y + (end_vertex.y - start_vertex.y) * self.progress
+            self.x, self.y = interpolate_position((start_vertex.x, start_vertex.y),
+                                                  (end_vertex.x, end_vertex.y), self.progress)
+            if self.legs:
+                self._plan_next_leg(nav_graph)
         
         # Battery consumption
         if self.status == RobotStatus.MOVING:
-            self.battery = max(0, self.battery - 0.1)
-            if self.battery < 20:
-                # Find nearest charger
-                chargers = [i for i, v in enumerate(nav_graph.vertices) if v.is_charger]
-                if chargers:
-                    nearest = min(chargers, key=lambda x: self._distance_to_vertex(nav_graph, x))
-                    self.assign_task(nearest, nav_graph)
-                    self.log.append(f"Robot {self.id} low battery, rerouting to charger at vertex {nearest}")
-    
-    def _distance_to_vertex(self, nav_graph, vertex_idx):
-        vertex = nav_graph.vertices[vertex_idx]
-        return ((self.x - vertex.x)**2 + (self.y - vertex.y)**2)**0.5
-    
-    def update_charging(self):
+            self.battery = max(0, self.battery - BATTERY_DRAIN)
+    
+    def _finish_lane(self, nav_graph):
+        """Complete the task at the end of the route, or start the next lane"""
+        if self._cursor >= len(self._route):
+            self.status = RobotStatus.TASK_COMPLETE
+            self.emit(EventType.ARRIVED, vertex=self.current_vertex_idx)
+        else:
+            self._move_to_next_vertex(nav_graph)
+    
+    def seek_charger(self, nav_graph) -> bool:
+        """Reroute to a charger: the one with the lowest expected wait plus travel time
+        if a charging manager is attached, otherwise the nearest by graph distance.
+
+        Called when the robot reaches a vertex, so it never turns around mid-lane.
+        On failure the robot keeps its task and charger_unreachable is set.
+        """
+        if self.charging_manager is not None:
+            nearest = self.charging_manager.choose_charger(self)
+        else:
+            nearest = nav_graph.nearest_charger[self.current_vertex_idx]
+        if nearest is None:
+            self.charger_unreachable = True
+            self.emit(EventType.REROUTE_FAILED, reason="no reachable charger")
+            return False
+        
+        self.emit(EventType.LOW_BATTERY, vertex=nearest)
+        if nearest == self.current_vertex_idx:
+            self.start_charging(nearest)
+            return True
+        if not self.assign_task(nearest, nav_graph):
+            self.charger_unreachable = True
+            self.emit(EventType.REROUTE_FAILED, reason="no valid path to charger")
+            return False
+        self.seeking_charger = True
+        return True
+    
+    def start_charging(self, vertex_idx: int):
+        self.seeking_charger = False
+        self.charger_unreachable = False
+        self.legs.clear()
+        # The charging manager queues the robot instead if every slot is taken
+        if self.charging_manager is not None and not self.charging_manager.admit(self, vertex_idx):
+            return
+        self.status = RobotStatus.CHARGING
+        self.emit(EventType.CHARGING_STARTED, vertex=vertex_idx)
+    
+    def energy_for_hops(self, hops: float) -> float:
+        # Every lane takes 1 / speed ticks regardless of its length
+        return hops * BATTERY_DRAIN / self.speed
+    
+    def can_afford(self, hops: float) -> bool:
+        """Whether the robot can drive this many lanes and keep its reserve"""
+        return self.battery - self.energy_for_hops(hops) >= ENERGY_RESERVE
+    
+    def update_charging(self, charge_rate: float = 1.0):
         if self.status == RobotStatus.CHARGING:
-            self.battery = min(100, self.battery + 1)
-            if self.battery >= 95:
+            self.battery = min(100, self.battery + charge_rate)
+            if self.battery >= CHARGED:
                 self.status = RobotStatus.IDLE
-                self.log.append(f"Robot {self.id} finished charging")
\ No newline at end of file
+                self.emit(EventType.CHARGING_FINISHED)
\ No newline at end of file
@@ -0,0 +1,156 @@
+import math
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+
+class SpatialGrid:
+    """Uniform grid over 2D points for nearest, radius and box queries.
+
+    Keys are arbitrary hashables (vertex indices, robot ids). Moving a point
+    only touches the grid when it crosses into another cell.
+    """
+    def __init__(self, cell_size: float = 1.0):
+        if cell_size <= 0:
+            raise ValueError("cell_size must be positive")
+        self.cell_size = cell_size
+        self.cells: Dict[Tuple[int, int], List[Hashable]] = {}
+        self.positions: Dict[Hashable, Tuple[float, float]] = {}
+        # Cell range ever occupied; only grows, which keeps it a valid bound for ring searches
+        self._bounds: Optional[List[int]] = None
+
+    @classmethod
+    def from_points(cls, points: Iterable[Tuple[Hashable, float, float]],
+                    cell_size: Optional[float] = None) -> 'SpatialGrid':
+        """Build a grid, picking a cell size of about one point per cell if none is given"""
+        points = list(points)
+        if cell_size is None:
+            cell_size = cls.suggest_cell_size([(x, y) for _, x, y in points])
+        grid = cls(cell_size)
+        for key, x, y in points:
+            grid.insert(key, x, y)
+        return grid
+
+    @staticmethod
+    def suggest_cell_size(coords: List[Tuple[float, float]]) -> float:
+        if len(coords) < 2:
+            return 1.0
+        xs = [x for x, _ in coords]
+        ys = [y for _, y in coords]
+        area = (max(xs) - min(xs)) * (max(ys) - min(ys))
+        if area <= 0:
+            return max(max(xs) - min(xs), max(ys) - min(ys), 1.0) / len(coords)
+        return math.sqrt(area / len(coords))
+
+    def _cell(self, x: float, y: float) -> Tuple[int, int]:
+        return (math.floor(x / self.cell_size), math.floor(y / self.cell_size))
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.positions
+
+    def clear(self):
+        self.cells.clear()
+        self.positions.clear()
+        self._bounds = None
+
+    def _add_to_cell(self, cell: Tuple[int, int], key: Hashable):
+        self.cells.setdefault(cell, []).append(key)
+        if self._bounds is None:
+            self._bounds = [cell[0], cell[1], cell[0], cell[1]]
+        else:
+            bounds = self._bounds
+            bounds[0] = min(bounds[0], cell[0])
+            bounds[1] = min(bounds[1], cell[1])
+            bounds[2] = max(bounds[2], cell[0])
+            bounds[3] = max(bounds[3], cell[1])
+
+    def insert(self, key: Hashable, x: float, y: float):
+        if key in self.positions:
+            self.move(key, x, y)
+            return
+        self.positions[key] = (x, y)
+        self._add_to_cell(self._cell(x, y), key)
+
+    def remove(self, key: Hashable):
+        position = self.positions.pop(key, None)
+        if position is None:
+            return
+        cell = self._cell(*position)
+        bucket = self.cells[cell]
+        bucket.remove(key)
+        if not bucket:
+            del self.cells[cell]
+
+    def move(self, key: Hashable, x: float, y: float):
+        old = self.positions.get(key)
+        if old is None:
+            self.insert(key, x, y)
+            return
+        old_cell = self._cell(*old)
+        new_cell = self._cell(x, y)
+        self.positions[key] = (x, y)
+        if old_cell != new_cell:
+            bucket = self.cells[old_cell]
+            bucket.remove(key)
+            if not bucket:
+                del self.cells[old_cell]
+            self._add_to_cell(new_cell, key)
+
+    def query_box(self, min_x: float, min_y: float, max_x: float, max_y: float) -> List[Hashable]:
+        """Keys whose point lies inside the axis-aligned box"""
+        cx0, cy0 = self._cell(min_x, min_y)
+        cx1, cy1 = self._cell(max_x, max_y)
+        result = []
+        if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > len(self.cells):
+            # Box covers more cells than exist, walk the occupied ones instead
+            candidate_cells = [c for c in self.cells if cx0 <= c[0] <= cx1 and cy0 <= c[1] <= cy1]
+        else:
+            candidate_cells = [(cx, cy) for cx in range(cx0, cx1 + 1) for cy in range(cy0, cy1 + 1)]
+        for cell in candidate_cells:
+            for key in self.cells.get(cell, ()):
+                x, y = self.positions[key]
+                if min_x <= x <= max_x and min_y <= y <= max_y:
+                    result.append(key)
+        return result
+
+    def query_radius(self, x: float, y: float, radius: float) -> List[Hashable]:
+        """Keys within radius of (x, y)"""
+        radius_sq = radius * radius
+        return [key for key in self.query_box(x - radius, y - radius, x + radius, y + radius)
+                if (self.positions[key][0] - x) ** 2 + (self.positions[key][1] - y) ** 2 <= radius_sq]
+
+    def nearest(self, x: float, y: float, max_distance: float = float('inf')) -> Optional[Hashable]:
+        """Closest key to (x, y), searching rings of cells outwards from the query cell"""
+        if not self.positions:
+            return None
+        cx, cy = self._cell(x, y)
+        # Furthest ring that can still contain an occupied cell
+        min_cx, min_cy, max_cx, max_cy = self._bounds
+        max_ring = max(cx - min_cx, max_cx - cx, cy - min_cy, max_cy - cy, 0)
+        best = None
+        best_dist_sq = max_distance * max_distance
+        for ring in range(max_ring + 1):
+            # Every point in this ring or beyond is at least (ring - 1) cells away
+            if best is not None and (ring - 1) * self.cell_size > math.sqrt(best_dist_sq):
+                break
+            if (ring - 1) * self.cell_size > max_distance:
+                break
+            for cell in self._ring_cells(cx, cy, ring):
+                for key in self.cells.get(cell, ()):
+                    px, py = self.positions[key]
+                    dist_sq = (px - x) ** 2 + (py - y) ** 2
+                    if dist_sq <= best_dist_sq:
+                        best, best_dist_sq = key, dist_sq
+        return best
+
+    @staticmethod
+    def _ring_cells(cx: int, cy: int, ring: int):
+        if ring == 0:
+            yield (cx, cy)
+            return
+        for dx in range(-ring, ring + 1):
+            yield (cx + dx, cy - ring)
+            yield (cx + dx, cy + ring)
+        for dy in range(-ring + 1, ring):
+            yield (cx - ring, cy + dy)
+            yield (cx + ring, cy + dy)
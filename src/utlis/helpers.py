@@ -1,24 +1,79 @@
-from typing import List, Tuple
-import math
+from typing import Tuple
+import numpy as np
 
-def calculate_distance(p1: Tuple[float, float], p2: Tuple[float, float]) -> float:
-    """Calculate Euclidean distance between two points"""
-    return math.sqrt((p2[0] - p1[0])**2 + (p2[1] - p1[1])**2)
+Point = Tuple[float, float]
 
-def interpolate_position(p1: Tuple[float, float], p2: Tuple[float, float], ratio: float) -> Tuple[float, float]:
+# Geometry shared by robot motion, rendering and collision checks.
+# interpolate_position serves one robot at a time; the batched functions take
+# (N, 2) arrays of points and do the work for the whole fleet or level in one NumPy call.
+
+def interpolate_position(p1: Point, p2: Point, ratio: float) -> Point:
     """Interpolate between two points based on ratio (0 to 1)"""
     return (
         p1[0] + (p2[0] - p1[0]) * ratio,
         p1[1] + (p2[1] - p1[1]) * ratio
     )
 
-def path_length(path: List[Tuple[float, float]]) -> float:
-    """Calculate total length of a path"""
-    if len(path) < 2:
-        return 0.0
-    
-    total = 0.0
-    for i in range(len(path) - 1):
-        total += calculate_distance(path[i], path[i+1])
-    
-    return total
\ No newline at end of file
+def as_points(points) -> np.ndarray:
+    """Points as a float (N, 2) array; accepts arrays, lists of pairs and empty sequences"""
+    return np.asarray(points, dtype=float).reshape(-1, 2)
+
+def point_distances(a, b) -> np.ndarray:
+    """Distance between a[i] and b[i] for every i"""
+    a, b = as_points(a), as_points(b)
+    return np.hypot(b[:, 0] - a[:, 0], b[:, 1] - a[:, 1])
+
+def _cross_pairs(starts_a: np.ndarray, sizes_a: np.ndarray, starts_b: np.ndarray,
+                 sizes_b: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Every (a, b) position pair between group k of a and group k of b, for all k at once"""
+    counts = sizes_a * sizes_b
+    group = np.repeat(np.arange(len(counts)), counts)
+    local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return starts_a[group] + local // sizes_b[group], starts_b[group] + local % sizes_b[group]
+
+def pairs_within(points, radius: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Every pair of points at most radius apart, as index arrays i < j and their distances.
+
+    Points are hashed into square cells of side radius, so only points in the
+    same or a neighbouring cell are compared; O(N) on average however the
+    points line up.
+    """
+    points = as_points(points)
+    empty = np.zeros(0, dtype=int), np.zeros(0, dtype=int), np.zeros(0)
+    if len(points) < 2:
+        return empty
+    cells = np.floor(points / radius).astype(np.int64)
+    cells -= cells.min(axis=0) - 1  # Keep neighbour offsets of -1 inside the key range
+    height = int(cells[:, 1].max()) + 2
+    keys = cells[:, 0] * height + cells[:, 1]
+    order = np.argsort(keys, kind='stable')
+    unique_keys, starts, sizes = np.unique(keys[order], return_index=True, return_counts=True)
+
+    candidates_a, candidates_b = [], []
+    # Half of the neighbourhood, so each pair of cells is visited once
+    for dx, dy in ((0, 0), (0, 1), (1, -1), (1, 0), (1, 1)):
+        slots = np.searchsorted(unique_keys, unique_keys + dx * height + dy)
+        slots = np.minimum(slots, len(unique_keys) - 1)
+        hit = unique_keys[slots] == unique_keys + dx * height + dy
+        a, b = _cross_pairs(starts[hit], sizes[hit], starts[slots[hit]], sizes[slots[hit]])
+        if dx == dy == 0:
+            keep = a < b
+            a, b = a[keep], b[keep]
+        candidates_a.append(order[a])
+        candidates_b.append(order[b])
+    a, b = np.concatenate(candidates_a), np.concatenate(candidates_b)
+    dist_sq = (points[a, 0] - points[b, 0]) ** 2 + (points[a, 1] - points[b, 1]) ** 2
+    close = dist_sq <= radius * radius
+    if not close.any():
+        return empty
+    i, j = np.minimum(a[close], b[close]), np.maximum(a[close], b[close])
+    d = np.sqrt(dist_sq[close])
+    # Sorted by index pair so callers see the same order whatever the coordinates
+    pair_order = np.lexsort((j, i))
+    return i[pair_order], j[pair_order], d[pair_order]
+
+def transform_points(points, origin: Point, scale: Tuple[float, float], margin: float = 0.0) -> np.ndarray:
+    """Map world points to integer screen coordinates, (p - origin) * scale + margin"""
+    points = as_points(points)
+    screen = (points - np.asarray(origin, dtype=float)) * np.asarray(scale, dtype=float) + margin
+    return screen.astype(int)
@@ -0,0 +1,133 @@
+import cProfile
+import io
+import pstats
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+class PhaseStats:
+    def __init__(self, window: int):
+        self.calls = 0
+        self.total = 0.0
+        self.last = 0.0
+        self.max = 0.0
+        self.recent = deque(maxlen=window)  # Latest durations, for a moving average
+
+    def add(self, duration: float):
+        self.calls += 1
+        self.total += duration
+        self.last = duration
+        self.max = max(self.max, duration)
+        self.recent.append(duration)
+
+    def average(self) -> float:
+        return sum(self.recent) / len(self.recent) if self.recent else 0.0
+
+class _Timer:
+    __slots__ = ('stats', 'start')
+
+    def __init__(self, stats: PhaseStats):
+        self.stats = stats
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.stats.add(time.perf_counter() - self.start)
+        return False
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_TIMER = _NullTimer()
+
+class TickProfiler:
+    """Per-phase timers and counters for the simulation and GUI loops.
+
+    Phases may nest (e.g. movement runs inside tick), so their times are not
+    meant to add up. When disabled, phase() and count() do nothing.
+    """
+    def __init__(self, enabled: bool = True, window: int = 100):
+        self.enabled = enabled
+        self.window = window
+        self.phases: Dict[str, PhaseStats] = {}
+        self.counters: Dict[str, int] = {}
+        self._profile: Optional[cProfile.Profile] = None
+
+    def phase(self, name: str):
+        """Context manager timing one run of a phase"""
+        if not self.enabled:
+            return _NULL_TIMER
+        stats = self.phases.get(name)
+        if stats is None:
+            stats = self.phases[name] = PhaseStats(self.window)
+        return _Timer(stats)
+
+    def count(self, name: str, amount: int = 1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def reset(self):
+        self.phases.clear()
+        self.counters.clear()
+
+    def snapshot(self) -> dict:
+        """Plain dict of all timings (in milliseconds) and counters"""
+        return {
+            'phases': {name: {'calls': s.calls,
+                              'last_ms': s.last * 1000,
+                              'avg_ms': s.average() * 1000,
+                              'max_ms': s.max * 1000,
+                              'total_ms': s.total * 1000}
+                       for name, s in self.phases.items()},
+            'counters': dict(self.counters),
+            'capturing': self.is_capturing(),
+        }
+
+    def summary_lines(self) -> List[str]:
+        """Short text summary, e.g. for an on-screen overlay"""
+        lines = [f"{name:<20} {s.average() * 1000:7.2f} ms  (max {s.max * 1000:.2f})"
+                 for name, s in self.phases.items()]
+        lines.extend(f"{name:<20} {value}" for name, value in sorted(self.counters.items()))
+        if self.is_capturing():
+            lines.append("cProfile capture running")
+        return lines
+
+    def is_capturing(self) -> bool:
+        return self._profile is not None
+
+    def start_capture(self):
+        """Start a cProfile capture of everything that runs until stop_capture"""
+        if self._profile is None:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+
+    def stop_capture(self, path: Optional[str] = None, limit: int = 30) -> str:
+        """Stop the capture and return the top functions by cumulative time.
+
+        If path is given the report is also written there.
+        """
+        if self._profile is None:
+            return ""
+        self._profile.disable()
+        out = io.StringIO()
+        pstats.Stats(self._profile, stream=out).sort_stats('cumulative').print_stats(limit)
+        self._profile = None
+        report = out.getvalue()
+        if path:
+            with open(path, 'w') as f:
+                f.write(report)
+        return report
+
+    def toggle_capture(self, path: Optional[str] = None) -> bool:
+        """Start or stop a capture; returns True if one is now running"""
+        if self.is_capturing():
+            self.stop_capture(path)
+            return False
+        self.start_capture()
+        return True
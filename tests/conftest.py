@@ -0,0 +1,65 @@
+import heapq
+import logging
+import os
+import random
+import sys
+
+import pytest
+
+# Tests import the app as src.*, the way it is run from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.models.nav_graph import NavGraph
+from src.controllers.fleet_manager import FleetManager
+
+# FleetManager logs to the tracked src/logs/fleet_logs.txt; keep test runs out of it
+logging.disable(logging.CRITICAL)
+
+def make_graph(vertices, lanes, level='test') -> NavGraph:
+    """NavGraph with a single level built from [x, y, attributes] vertices and [start, end] lanes"""
+    nav_graph = NavGraph()
+    nav_graph.levels = {level: {'vertices': vertices, 'lanes': [[start, end, {}] for start, end in lanes]}}
+    nav_graph.load_level(level)
+    return nav_graph
+
+def grid_graph(size: int, keep: float, seed: int) -> NavGraph:
+    """size x size grid with a random share of its lanes left out, so some routes detour"""
+    rng = random.Random(seed)
+    vertices = [[x, y, {'is_charger': True} if (x, y) == (0, 0) else {}] for x in range(size) for y in range(size)]
+    lanes = []
+    for x in range(size):
+        for y in range(size):
+            idx = x * size + y
+            if x + 1 < size and rng.random() < keep:
+                lanes.append((idx, idx + size))
+            if y + 1 < size and rng.random() < keep:
+                lanes.append((idx, idx + 1))
+    return make_graph(vertices, lanes)
+
+def dijkstra(nav_graph: NavGraph, start_idx: int) -> list:
+    """Reference route costs from start over nav_graph.lane_cost"""
+    dist = [float('inf')] * len(nav_graph.vertices)
+    dist[start_idx] = 0.0
+    heap = [(0.0, start_idx)]
+    while heap:
+        d, idx = heapq.heappop(heap)
+        if d > dist[idx]:
+            continue
+        for neighbor in nav_graph.adjacency[idx]:
+            new_dist = d + nav_graph.lane_cost(idx, neighbor)
+            if new_dist < dist[neighbor]:
+                dist[neighbor] = new_dist
+                heapq.heappush(heap, (new_dist, neighbor))
+    return dist
+
+def path_cost(nav_graph: NavGraph, path: list) -> float:
+    """Cost of a vertex path; fails the test if it uses a lane that doesn't exist"""
+    for a, b in zip(path, path[1:]):
+        assert b in nav_graph.adjacency[a], f"no lane {a} -> {b}"
+    return sum(nav_graph.lane_cost(a, b) for a, b in zip(path, path[1:]))
+
+@pytest.fixture
+def line_fleet():
+    """Three vertices in a row with a single-slot charger at the end"""
+    nav_graph = make_graph([[0, 0, {}], [1, 0, {}], [2, 0, {'is_charger': True}]], [(0, 1), (1, 2)])
+    return FleetManager(nav_graph)
@@ -0,0 +1,63 @@
+from src.models.robot import RobotStatus
+
+def queue_at_charger(fleet_manager):
+    """One robot charging at vertex 2 and a second one queued behind it"""
+    fleet_manager.spawn_robot(2)
+    fleet_manager.spawn_robot(0)
+    charging, queued = fleet_manager.robots
+    charging.battery = 30
+    charging.start_charging(2)
+    queued.battery = 40
+    assert fleet_manager.assign_task(queued.id, 2)
+    for _ in range(100):
+        fleet_manager.update()
+        if queued.status == RobotStatus.QUEUED:
+            break
+    assert queued.status == RobotStatus.QUEUED
+    return charging, queued
+
+def test_robot_queues_when_slot_taken(line_fleet):
+    charging, queued = queue_at_charger(line_fleet)
+    charger = line_fleet.charging_manager.chargers[2]
+    assert charger.charging == {charging}
+    assert list(charger.queue) == [queued]
+    assert charger.expected_wait() > 0
+
+def test_queued_robot_rejects_tasks(line_fleet):
+    _, queued = queue_at_charger(line_fleet)
+    for _ in range(5):
+        assert not line_fleet.assign_task(queued.id, 0)
+    assert queued.status == RobotStatus.QUEUED
+    assert list(line_fleet.charging_manager.chargers[2].queue) == [queued]
+
+def test_queued_robot_charges_once_slot_frees(line_fleet):
+    charging, queued = queue_at_charger(line_fleet)
+    charger = line_fleet.charging_manager.chargers[2]
+    for _ in range(200):
+        line_fleet.update()
+        if queued.status == RobotStatus.CHARGING:
+            break
+    assert charging.status == RobotStatus.IDLE
+    assert charger.charging == {queued}
+    assert not charger.queue
+    assert charger.queued_work == 0
+
+def test_admit_skips_robots_that_left(line_fleet):
+    charging, queued = queue_at_charger(line_fleet)
+    charger = line_fleet.charging_manager.chargers[2]
+    # A robot that is no longer standing at the charger must not take its slot
+    queued.status = RobotStatus.IDLE
+    queued.current_vertex_idx = 1
+    charging.battery = 94.5
+    line_fleet.update()
+    assert not charger.charging
+    assert queued.status == RobotStatus.IDLE
+
+def test_fallback_charger_is_reserved(line_fleet):
+    line_fleet.spawn_robot(0)
+    robot = line_fleet.robots[0]
+    robot.battery = 0.1  # Too little to reach any charger
+    assert line_fleet.charging_manager.choose_charger(robot) == 2
+    charger = line_fleet.charging_manager.chargers[2]
+    assert robot in charger.inbound
+    assert charger.queued_work > 0
@@ -0,0 +1,26 @@
+import math
+import random
+
+import pytest
+
+from src.utlis.helpers import pairs_within
+
+@pytest.mark.parametrize('seed', range(10))
+def test_pairs_within_matches_brute_force(seed):
+    rng = random.Random(seed)
+    # Half of the points share an aisle, where a sweep along one axis degrades
+    points = [(rng.uniform(0, 20), rng.uniform(0, 20)) for _ in range(150)]
+    points += [(rng.uniform(0, 20), 5.0) for _ in range(150)]
+    radius = rng.uniform(0.2, 1.5)
+    first, second, dists = pairs_within(points, radius)
+    found = {(i, j): d for i, j, d in zip(first.tolist(), second.tolist(), dists.tolist())}
+    expected = {(i, j): math.dist(points[i], points[j])
+                for i in range(len(points)) for j in range(i + 1, len(points))
+                if math.dist(points[i], points[j]) <= radius}
+    assert found.keys() == expected.keys()
+    for pair, distance in expected.items():
+        assert found[pair] == pytest.approx(distance)
+
+def test_pairs_within_small_inputs():
+    assert all(len(part) == 0 for part in pairs_within([], 1.0))
+    assert all(len(part) == 0 for part in pairs_within([(0, 0)], 1.0))
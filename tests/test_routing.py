@@ -0,0 +1,59 @@
+import random
+
+import pytest
+
+from conftest import dijkstra, grid_graph, path_cost
+from src.models.contraction import ContractionHierarchy
+from src.controllers.replanner import DStarLite
+
+@pytest.mark.parametrize('seed', range(5))
+def test_contraction_hierarchy_matches_dijkstra(seed):
+    nav_graph = grid_graph(8, 0.75, seed)
+    lanes = [(lane.start_idx, lane.end_idx, 1.0) for lane in nav_graph.lanes]
+    hierarchy = ContractionHierarchy.build(len(nav_graph.vertices), lanes)
+    rng = random.Random(seed)
+    for _ in range(40):
+        start_idx, end_idx = rng.randrange(64), rng.randrange(64)
+        expected = dijkstra(nav_graph, start_idx)[end_idx]
+        path = hierarchy.shortest_path(start_idx, end_idx)
+        if expected == float('inf'):
+            assert path == []
+        else:
+            assert path[0] == start_idx and path[-1] == end_idx
+            assert path_cost(nav_graph, path) == expected
+
+@pytest.mark.parametrize('seed', range(5))
+def test_dstar_lite_matches_dijkstra_after_lane_changes(seed):
+    nav_graph = grid_graph(8, 0.85, seed)
+    rng = random.Random(seed)
+    start_idx, goal_idx = 0, 63
+    planner = DStarLite(nav_graph, start_idx, goal_idx)
+    for _ in range(6):
+        expected = dijkstra(nav_graph, start_idx)[goal_idx]
+        path = planner.path()
+        if expected == float('inf'):
+            assert path == []
+        else:
+            assert path[0] == start_idx and path[-1] == goal_idx
+            assert path_cost(nav_graph, path) == expected
+            if len(path) > 2:
+                # Drive one lane, then close or slow down a lane on the rest of the route
+                start_idx = path[1]
+                planner.move_start(start_idx)
+                a = rng.randrange(1, len(path) - 1)
+                if rng.random() < 0.5:
+                    nav_graph.block_lane(path[a], path[a + 1])
+                else:
+                    nav_graph.set_lane_penalty(path[a], path[a + 1], 3)
+                planner.lane_changed(path[a], path[a + 1])
+
+def test_find_shortest_path_uses_hierarchy_when_prepared():
+    nav_graph = grid_graph(8, 0.75, 1)
+    nav_graph.prepare_contraction(save=False)
+    expected = dijkstra(nav_graph, 0)
+    for end_idx in range(64):
+        path = nav_graph.find_shortest_path(0, end_idx)
+        if expected[end_idx] == float('inf'):
+            assert path == []
+        else:
+            assert path_cost(nav_graph, path) == expected[end_idx]
@@ -0,0 +1,51 @@
+import random
+
+import pytest
+
+from conftest import grid_graph
+from src.controllers.fleet_manager import FleetManager
+from src.controllers.session_recorder import SessionRecorder, SessionReplayer
+
+def record_session(path, seed=0, ticks=120):
+    fleet_manager = FleetManager(grid_graph(6, 0.9, seed))
+    rng = random.Random(seed)
+    with SessionRecorder(fleet_manager, str(path), keyframe_interval=25) as recorder:
+        for vertex_idx in rng.sample(range(36), 6):
+            recorder.spawn_robot(vertex_idx)
+        recorder.submit_task([rng.randrange(36), rng.randrange(36)])
+        for tick in range(ticks):
+            if tick == 10:
+                recorder.assign_task(fleet_manager.robots[0].id, rng.randrange(36))
+            if tick == 30:
+                idle = next(robot for robot in fleet_manager.robots if robot.status.name in ('IDLE', 'TASK_COMPLETE'))
+                assert recorder.remove_robot(idle.id) is not None
+            recorder.update()
+    return fleet_manager
+
+def test_replay_reproduces_recording(tmp_path):
+    path = tmp_path / 'session.rec'
+    record_session(path)
+    replayer = SessionReplayer(str(path))
+    assert replayer.keyframes and replayer.last_tick > 30
+    replayed = FleetManager(grid_graph(6, 0.9, 0))
+    assert replayer.replay_into(replayed) is None
+
+def test_state_at_matches_live_fleet(tmp_path):
+    path = tmp_path / 'session.rec'
+    fleet_manager = record_session(path)
+    states = SessionReplayer(str(path)).state_at(120)
+    assert sorted(states) == sorted(robot.id for robot in fleet_manager.robots)
+    for robot in fleet_manager.robots:
+        assert (states[robot.id].x, states[robot.id].y) == (robot.x, robot.y)
+        assert states[robot.id].status == robot.status.name
+
+def test_removed_robot_leaves_state(tmp_path):
+    path = tmp_path / 'session.rec'
+    record_session(path)
+    replayer = SessionReplayer(str(path))
+    assert len(replayer.state_at(29)) == 6
+    assert len(replayer.state_at(31)) == 5
+
+def test_keyframe_interval_must_be_positive(tmp_path):
+    with pytest.raises(ValueError):
+        SessionRecorder(FleetManager(grid_graph(3, 1.0, 0)), str(tmp_path / 'session.rec'), keyframe_interval=0)
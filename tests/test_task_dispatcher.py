@@ -0,0 +1,22 @@
+import itertools
+import random
+
+import pytest
+
+from src.controllers.task_dispatcher import solve_assignment
+
+@pytest.mark.parametrize('seed', range(20))
+def test_solve_assignment_is_optimal(seed):
+    rng = random.Random(seed)
+    rows = rng.randint(1, 5)
+    cols = rng.randint(rows, 6)
+    cost = [[rng.randint(0, 20) for _ in range(cols)] for _ in range(rows)]
+    assignment = solve_assignment(cost)
+    assert len(set(assignment)) == rows
+    best = min(sum(cost[row][col] for row, col in enumerate(cols_used))
+               for cols_used in itertools.permutations(range(cols), rows))
+    assert sum(cost[row][col] for row, col in enumerate(assignment)) == best
+
+def test_solve_assignment_needs_enough_columns():
+    with pytest.raises(ValueError):
+        solve_assignment([[1], [2]])